@@ -0,0 +1,403 @@
+import os
+import sys
+import zlib
+from array import array
+
+from profiling import span
+from version import __version__
+
+# Artifacts are pickled, and unpickling runs code chosen by whoever wrote
+# the file, so the cache is only as trustworthy as its directory: it is
+# created private (0700) and ignored, with a warning, when the root or the
+# entry is not owned by this user or is writable by group or others.
+CACHE_DIR = os.environ.get(
+    "CHIHIRO_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "chihiro")
+)
+CACHE_MAX_BYTES = int(os.environ.get("CHIHIRO_CACHE_MAX", 1 << 30))
+
+MAGIC = b"CHC\x05"
+_MISS = object()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ---------------- Codecs ----------------
+# Each artifact is reduced to plain columns (arrays, joined blobs) before
+# pickling, so the on-disk form stays small and loads without per-item objects.
+
+def _encode_symbols(symbols):
+    return [(s['name'], s['addr'], s['type'], s['size']) for s in symbols]
+
+
+def _decode_symbols(payload, **ctx):
+    return [{'name': n, 'addr': a, 'type': t, 'size': z} for n, a, t, z in payload]
+
+
+def _encode_symbol_index(index):
+    return _encode_symbols(index.symbols), index.regions
+
+
+def _decode_symbol_index(payload, **ctx):
+    from symbol_extractor import SymbolIndex
+
+    symbols, regions = payload
+    return SymbolIndex(_decode_symbols(symbols), regions)
+
+
+def _encode_instructions(table):
+    return (
+        table.addresses.tobytes(),
+        table.sizes.tobytes(),
+        list(table.mnemonics),
+        table.mnemonic_ids.tobytes(),
+        "\n".join(table.op_strs),
+    )
+
+
+def _decode_instructions(payload, **ctx):
+    from disassembler import InstructionTable
+
+    addr_bytes, size_bytes, mnemonics, id_bytes, op_blob = payload
+    table = InstructionTable(mnemonics, {m: i for i, m in enumerate(mnemonics)})
+    table.addresses.frombytes(addr_bytes)
+    table.sizes.frombytes(size_bytes)
+    table.mnemonic_ids.frombytes(id_bytes)
+    table.op_strs = op_blob.split("\n") if table.addresses else []
+    return table
+
+
+def _encode_cfg(cfg):
+    sources = array('I')
+    targets = array('I')
+    for src, dst in cfg.edges():
+        sources.append(src)
+        targets.append(dst)
+    return (
+        cfg.rows.tobytes(), cfg.counts.tobytes(), sources.tobytes(), targets.tobytes(),
+        array('I', cfg.entries).tobytes(),
+    )
+
+
+def _decode_cfg(payload, instructions=None, **ctx):
+    from graph.block_graph import BlockGraph
+
+    rows, counts, sources, targets, entries = payload
+    return BlockGraph(
+        instructions, array('I', rows), array('I', counts),
+        array('I', sources), array('I', targets), array('I', entries),
+    )
+
+
+def _encode_texts(texts):
+    return "\0".join(texts), len(texts)
+
+
+def _decode_texts(payload, **ctx):
+    blob, count = payload
+    return blob.split("\0") if count else []
+
+
+def _encode_strings(records):
+    offsets = array('Q')
+    vaddrs = array('q')
+    section_ids = array('H')
+    encoding_ids = array('B')
+    sections = {}
+    encodings = {}
+    for r in records:
+        offsets.append(r.offset)
+        vaddrs.append(-1 if r.vaddr is None else r.vaddr)
+        section_ids.append(sections.setdefault(r.section, len(sections)))
+        encoding_ids.append(encodings.setdefault(r.encoding, len(encodings)))
+    return (
+        offsets.tobytes(), vaddrs.tobytes(),
+        list(sections), section_ids.tobytes(),
+        list(encodings), encoding_ids.tobytes(),
+        _encode_texts([r.text for r in records]),
+    )
+
+
+def _decode_strings(payload, **ctx):
+    from string_extractor import StringRecord
+
+    offsets, vaddrs, sections, section_ids, encodings, encoding_ids, texts = payload
+    return [
+        StringRecord(o, None if v < 0 else v, sections[s], encodings[e], t)
+        for o, v, s, e, t in zip(
+            array('Q', offsets), array('q', vaddrs), array('H', section_ids),
+            array('B', encoding_ids), _decode_texts(texts),
+        )
+    ]
+
+
+def _encode_xrefs(index):
+    return index.targets.tobytes(), index.sites.tobytes(), index.kinds.tobytes()
+
+
+def _decode_xrefs(payload, **ctx):
+    from xref_analyzer import XrefIndex
+
+    targets, sites, kinds = payload
+    return XrefIndex(array('Q', targets), array('Q', sites), array('B', kinds))
+
+
+def _encode_discovery(result):
+    entries = array('Q', result.functions)
+    counts = array('I', (len(blocks) for blocks in result.functions.values()))
+    blocks = array('Q')
+    for addrs in result.functions.values():
+        blocks.extend(addrs)
+    edges = array('Q')
+    for src, dst in result.edges:
+        edges.append(src)
+        edges.append(dst)
+    return (
+        _encode_instructions(result.instructions),
+        array('I', result.block_ids).tobytes(),
+        edges.tobytes(),
+        (entries.tobytes(), counts.tobytes(), blocks.tobytes()),
+        result.jump_tables,
+        result.unresolved,
+        result.unreached,
+        result.seeds,
+    )
+
+
+def _decode_discovery(payload, **ctx):
+    from graph.discovery import Discovery
+
+    table, block_ids, edge_bytes, (entries, counts, blocks), jump_tables, unresolved, unreached, seeds = payload
+    functions = {}
+    blocks = array('Q', blocks)
+    pos = 0
+    for entry, count in zip(array('Q', entries), array('I', counts)):
+        functions[entry] = blocks[pos:pos + count]
+        pos += count
+    edges = array('Q', edge_bytes)
+    return Discovery(
+        _decode_instructions(table), list(array('I', block_ids)), list(zip(edges[0::2], edges[1::2])),
+        functions, jump_tables, unresolved, unreached, seeds,
+    )
+
+
+def _encode_layout(boxes):
+    # node -> (x, y, width, height)
+    nodes = array('Q', boxes)
+    columns = [array('d', (boxes[n][c] for n in nodes)).tobytes() for c in range(4)]
+    return nodes.tobytes(), columns
+
+
+def _decode_layout(payload, **ctx):
+    nodes, columns = payload
+    return dict(zip(array('Q', nodes), zip(*(array('d', c) for c in columns))))
+
+
+# Modules the decoders import lazily. They are loaded in an "import" span of
+# their own before "cache load" starts, so that cache timings do not include
+# (for instructions) pulling in Capstone.
+DECODER_IMPORTS = {
+    'symindex': 'symbol_extractor',
+    'instructions': 'disassembler',
+    'cfg': 'graph.block_graph',
+    'xrefs': 'xref_analyzer',
+    'discovery': 'graph.discovery',
+    'strings': 'string_extractor',
+}
+
+CODECS = {
+    'symbols': (_encode_symbols, _decode_symbols),
+    'symindex': (_encode_symbol_index, _decode_symbol_index),
+    'instructions': (_encode_instructions, _decode_instructions),
+    'cfg': (_encode_cfg, _decode_cfg),
+    'xrefs': (_encode_xrefs, _decode_xrefs),
+    'discovery': (_encode_discovery, _decode_discovery),
+    'strings': (_encode_strings, _decode_strings),
+    'rodata': (_encode_texts, _decode_texts),
+    'layout': (_encode_layout, _decode_layout),
+}
+
+
+def _import_decoder(kind):
+    # pickle (~15 ms) is only imported by runs that touch the cache
+    modules = [m for m in ('pickle', DECODER_IMPORTS.get(kind)) if m and m not in sys.modules]
+    if modules:
+        import importlib
+
+        with span(f"import {', '.join(modules)}"):
+            for module in modules:
+                importlib.import_module(module)
+
+
+# ---------------- Cache ----------------
+
+class AnalysisCache:
+    def __init__(self, path, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, enabled=True, rebuild=False):
+        self.path = path
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.rebuild = rebuild
+        self._digest = None
+        self._memo = {}
+        self._trusted = None
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = file_digest(self.path)
+        return self._digest
+
+    @property
+    def entry_dir(self):
+        return os.path.join(self.root, f"{self.digest}-{__version__}")
+
+    def get(self, name, compute, **ctx):
+        value = self._lookup(name, ctx)
+        if value is _MISS:
+            value = compute()
+            self.put(name, value)
+        return value
+
+    def lookup(self, name, default=None, **ctx):
+        # Cached artifact or `default`; never computes. For callers that
+        # produce the value asynchronously and put() it later.
+        value = self._lookup(name, ctx)
+        return default if value is _MISS else value
+
+    def put(self, name, value):
+        if self.enabled and self._is_trusted():
+            self._store(name, value)
+        self._memo[name] = value
+
+    def _lookup(self, name, ctx):
+        value = self._memo.get(name, _MISS)
+        if value is _MISS and self.enabled and not self.rebuild:
+            value = self._load(name, ctx)
+            if value is not _MISS:
+                self._memo[name] = value
+        return value
+
+    def _artifact_path(self, name):
+        # Parametrised artifacts are named "kind:param:..."
+        safe = name.replace(":", "-").replace("/", "_")
+        return os.path.join(self.entry_dir, f"{safe}.bin")
+
+    def _load(self, name, ctx):
+        if not self._is_trusted():
+            return _MISS
+        _import_decoder(name.partition(':')[0])
+        with span(f"cache load {name}") as s:
+            value = self._read(name, ctx)
+            s.count(hit=int(value is not _MISS))
+        return value
+
+    def _is_trusted(self):
+        if self._trusted is None:
+            self._trusted = True
+            for path in (self.root, self.entry_dir):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # nothing to load from there
+                if st.st_uid != os.getuid() or st.st_mode & 0o022:
+                    print(f"[!] Ignoring analysis cache in {path}: writable by other users", file=sys.stderr)
+                    self._trusted = False
+                    break
+        return self._trusted
+
+    def _read(self, name, ctx):
+        import pickle
+
+        path = self._artifact_path(name)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            if raw[:4] != MAGIC:
+                return _MISS
+            payload = pickle.loads(zlib.decompress(raw[4:]))
+            value = CODECS[name.partition(':')[0]][1](payload, **ctx)
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError, KeyError, TypeError, ValueError):
+            return _MISS
+
+        # Touching the entry keeps it at the young end of the LRU order
+        try:
+            os.utime(self.entry_dir)
+        except OSError:
+            pass
+        return value
+
+    def _store(self, name, value):
+        with span(f"cache store {name}"):
+            self._write(name, value)
+
+    def _write(self, name, value):
+        import pickle
+
+        path = self._artifact_path(name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            os.makedirs(self.entry_dir, mode=0o700, exist_ok=True)
+            payload = pickle.dumps(CODECS[name.partition(':')[0]][0](value), protocol=pickle.HIGHEST_PROTOCOL)
+            with open(tmp, 'wb') as f:
+                f.write(MAGIC + zlib.compress(payload, 6))
+            os.replace(tmp, path)
+            os.utime(self.entry_dir)
+        except OSError as e:
+            print(f"[!] Could not write analysis cache: {e}", file=sys.stderr)
+            return
+        evict(self.root, self.max_bytes, keep=self.entry_dir)
+
+
+def _entry_size(path):
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+def _remove_entry(path):
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return
+    for name in names:
+        try:
+            os.remove(os.path.join(path, name))
+        except OSError:
+            pass
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def evict(root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=None):
+    entries = []
+    try:
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), _entry_size(path), path))
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        _remove_entry(path)
+        total -= size
@@ -0,0 +1,249 @@
+import bisect
+import os
+import sqlite3
+
+from profiling import span
+from symbol_extractor import SymbolIndex
+from version import __version__
+from xref_analyzer import REF_NAMES
+
+# Addresses are unsigned 64-bit but SQLite INTEGER is signed, so one at or
+# above 2**63 (kernel images, wrapped rip-relative targets) is stored as its
+# two's-complement value: equality and ordering within either half still
+# hold, printf('%x') shows it right and run_query() hands it back unsigned.
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE symbols (name TEXT, addr INTEGER, type TEXT, size INTEGER);
+CREATE TABLE functions (start INTEGER PRIMARY KEY, end INTEGER, name TEXT);
+CREATE TABLE instructions (addr INTEGER PRIMARY KEY, size INTEGER, mnemonic TEXT, op_str TEXT, function INTEGER);
+CREATE TABLE blocks (start INTEGER PRIMARY KEY, insn_count INTEGER, function INTEGER);
+CREATE TABLE edges (src INTEGER, dst INTEGER);
+CREATE TABLE xrefs (target INTEGER, site INTEGER, kind TEXT, function INTEGER);
+CREATE TABLE strings (offset INTEGER, vaddr INTEGER, section TEXT, encoding TEXT, text TEXT);
+"""
+
+# Built after the bulk insert, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX symbols_name ON symbols(name);
+CREATE INDEX symbols_addr ON symbols(addr);
+CREATE INDEX functions_name ON functions(name);
+CREATE INDEX instructions_function ON instructions(function);
+CREATE INDEX blocks_function ON blocks(function);
+CREATE INDEX edges_src ON edges(src);
+CREATE INDEX edges_dst ON edges(dst);
+CREATE INDEX xrefs_target ON xrefs(target);
+CREATE INDEX xrefs_function ON xrefs(function);
+CREATE INDEX strings_vaddr ON strings(vaddr);
+"""
+
+
+def function_ranges(symbols):
+    # Sorted (start, end, name) for FUNC symbols; sizeless ones end at the
+    # next start, or at their section's end when `symbols` is a SymbolIndex
+    if not isinstance(symbols, SymbolIndex):
+        symbols = SymbolIndex(symbols)
+    return symbols.functions()
+
+
+_HIGH = 1 << 63
+
+
+def _signed(addr):
+    return addr - (1 << 64) if addr is not None and addr >= _HIGH else addr
+
+
+def _unsigned(value):
+    return value + (1 << 64) if isinstance(value, int) and value < 0 else value
+
+
+def export_db(path, symbols, instructions, cfg, xrefs, strings, meta=()):
+    # Writes every artifact into a fresh SQLite file in a single transaction;
+    # symbols: a SymbolIndex or a list of symbol dicts
+    if os.path.exists(path):
+        os.remove(path)
+    ranges = function_ranges(symbols)
+    starts = [r[0] for r in ranges]
+    ends = [r[1] for r in ranges]
+
+    # Converting is only paid for when some address needs it
+    wide = max(
+        max((s['addr'] for s in symbols), default=0), max(ends, default=0),
+        instructions.addresses[-1] if len(instructions) else 0,
+        max(xrefs.targets, default=0), max(xrefs.sites, default=0),
+        max((r.vaddr for r in strings if r.vaddr is not None), default=0),
+    ) >= _HIGH
+
+    def column(values):
+        return [_signed(v) for v in values] if wide else values
+
+    owners = column(starts)
+
+    def owner(addr):
+        i = bisect.bisect_right(starts, addr) - 1
+        return owners[i] if i >= 0 and addr < ends[i] else None
+
+    db = sqlite3.connect(path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(SCHEMA)
+        with span("export_db", instructions=len(instructions), blocks=len(cfg)), db:
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [("version", __version__), *meta])
+            db.executemany(
+                "INSERT INTO symbols VALUES (?, ?, ?, ?)",
+                ((s['name'], _signed(s['addr']), s['type'], s['size']) for s in symbols),
+            )
+            db.executemany("INSERT INTO functions VALUES (?, ?, ?)", zip(owners, column(ends), (r[2] for r in ranges)))
+            mnemonics = instructions.mnemonics
+            db.executemany(
+                "INSERT INTO instructions VALUES (?, ?, ?, ?, ?)",
+                (
+                    (d, s, mnemonics[m], o, owner(a))
+                    for a, d, s, m, o in zip(
+                        instructions.addresses, column(instructions.addresses), instructions.sizes,
+                        instructions.mnemonic_ids, instructions.op_strs,
+                    )
+                ),
+            )
+            db.executemany(
+                "INSERT INTO blocks VALUES (?, ?, ?)",
+                ((d, n, owner(a)) for a, d, n in zip(cfg.starts, column(cfg.starts), cfg.counts)),
+            )
+            edges = cfg.address_edges()
+            if wide:
+                edges = ((_signed(src), _signed(dst)) for src, dst in edges)
+            db.executemany("INSERT INTO edges VALUES (?, ?)", edges)
+            db.executemany(
+                "INSERT INTO xrefs VALUES (?, ?, ?, ?)",
+                (
+                    (t, d, REF_NAMES[k], owner(s))
+                    for t, s, d, k in zip(column(xrefs.targets), xrefs.sites, column(xrefs.sites), xrefs.kinds)
+                ),
+            )
+            db.executemany(
+                "INSERT INTO strings VALUES (?, ?, ?, ?, ?)",
+                ((r.offset, _signed(r.vaddr), r.section, r.encoding, r.text) for r in strings),
+            )
+            with span("create_indexes"):
+                db.executescript(INDEXES)
+    finally:
+        db.close()
+
+
+# ---------------- Queries ----------------
+# name -> (argument help, SQL, column headers). :addr binds the argument
+# resolved to an address, :like binds it as a substring pattern.
+
+QUERIES = {
+    "callers": (
+        "FUNCTION",
+        "SELECT x.site, f.name FROM xrefs x LEFT JOIN functions f ON f.start = x.function "
+        "WHERE x.target = :addr AND x.kind = 'call' ORDER BY x.site",
+        ("site", "caller"),
+    ),
+    "callees": (
+        "FUNCTION",
+        "SELECT DISTINCT x.target, f.name FROM xrefs x LEFT JOIN functions f ON f.start = x.target "
+        "WHERE x.function = :addr AND x.kind = 'call' ORDER BY x.target",
+        ("target", "callee"),
+    ),
+    "xrefs": (
+        "ADDR|SYMBOL",
+        "SELECT x.site, x.kind, f.name FROM xrefs x LEFT JOIN functions f ON f.start = x.function "
+        "WHERE x.target = :addr ORDER BY x.site",
+        ("site", "kind", "function"),
+    ),
+    "string-refs": (
+        "TEXT",
+        "SELECT DISTINCT f.name, x.site, s.text FROM strings s "
+        "JOIN xrefs x ON x.target = s.vaddr LEFT JOIN functions f ON f.start = x.function "
+        "WHERE s.vaddr IS NOT NULL AND s.text LIKE :like ORDER BY x.site",
+        ("function", "site", "string"),
+    ),
+    "strings": (
+        "TEXT",
+        "SELECT offset, vaddr, section, encoding, text FROM strings WHERE text LIKE :like ORDER BY offset",
+        ("offset", "vaddr", "section", "encoding", "text"),
+    ),
+    "function-at": (
+        "ADDR",
+        "SELECT start, end, name FROM functions WHERE start <= :addr AND :addr < end "
+        "ORDER BY start DESC LIMIT 1",
+        ("start", "end", "name"),
+    ),
+    "blocks": (
+        "FUNCTION",
+        "SELECT b.start, b.insn_count, (SELECT group_concat(printf('0x%x', e.dst), ' ') "
+        "FROM edges e WHERE e.src = b.start) FROM blocks b WHERE b.function = :addr ORDER BY b.start",
+        ("block", "insns", "successors"),
+    ),
+    "stats": (
+        None,
+        "SELECT 'symbols', COUNT(*) FROM symbols UNION ALL SELECT 'functions', COUNT(*) FROM functions "
+        "UNION ALL SELECT 'instructions', COUNT(*) FROM instructions UNION ALL SELECT 'blocks', COUNT(*) FROM blocks "
+        "UNION ALL SELECT 'edges', COUNT(*) FROM edges UNION ALL SELECT 'xrefs', COUNT(*) FROM xrefs "
+        "UNION ALL SELECT 'strings', COUNT(*) FROM strings",
+        ("table", "rows"),
+    ),
+}
+
+ADDRESS_COLUMNS = {"site", "target", "vaddr", "start", "end", "block"}
+
+
+def resolve(db, spec):
+    # Address for a number or symbol name, or None
+    try:
+        return _signed(int(spec, 0))
+    except ValueError:
+        pass
+    # An import is found at its PLT stub, or its GOT slot without one
+    for name in (spec, f"{spec}@plt", f"{spec}@got"):
+        row = db.execute("SELECT start FROM functions WHERE name = ? LIMIT 1", (name,)).fetchone()
+        if row is None:
+            row = db.execute("SELECT addr FROM symbols WHERE name = ? AND addr != 0 LIMIT 1", (name,)).fetchone()
+        if row is not None:
+            return row[0]
+    return None
+
+
+def run_query(path, name, arg=None):
+    # (headers, rows) of a canned query; "sql" runs `arg` as-is. Address
+    # columns come back unsigned.
+    headers, rows = _run_query(path, name, arg)
+    wide = [i for i, h in enumerate(headers) if h in ADDRESS_COLUMNS]
+    if wide:
+        rows = [
+            tuple(_unsigned(v) if i in wide else v for i, v in enumerate(row))
+            for row in rows
+        ]
+    return headers, rows
+
+
+def _run_query(path, name, arg):
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if name == "sql":
+            cursor = db.execute(arg)
+            return tuple(d[0] for d in cursor.description or ()), cursor.fetchall()
+        _, sql, headers = QUERIES[name]
+        params = {}
+        if ":addr" in sql:
+            params["addr"] = resolve(db, arg)
+            if params["addr"] is None:
+                raise KeyError(f"Unknown symbol or address: {arg}")
+        if ":like" in sql:
+            params["like"] = f"%{arg}%"
+        return headers, db.execute(sql, params).fetchall()
+    finally:
+        db.close()
+
+
+def format_rows(headers, rows):
+    # Tab-separated lines; address-like columns are printed in hex
+    hex_cols = [h in ADDRESS_COLUMNS for h in headers]
+    yield "\t".join(headers)
+    for row in rows:
+        yield "\t".join(
+            f"0x{v:x}" if is_hex and isinstance(v, int) else "-" if v is None else str(v)
+            for v, is_hex in zip(row, hex_cols)
+        )
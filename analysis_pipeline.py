@@ -0,0 +1,279 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from profiling import attached, current_span, span
+from string_extractor import ENCODINGS
+
+# Named analysis outputs of one binary. Every stage declares the outputs it
+# is computed from (symbols -> symindex -> instructions -> cfg/xrefs, ...);
+# Pipeline.get(name) schedules the stage and whatever it needs, and each
+# stage is submitted to a small thread pool as soon as its inputs are done,
+# so independent ones (strings, rodata, symbols, disassembly) overlap.
+# Results are kept for the life of the pipeline and, for stages with a
+# codec, go through the AnalysisCache as well.
+#
+# Stages run on threads rather than processes: they share the mmapped
+# binary and each other's results. The heavy ones fan out to forked process
+# pools themselves with --jobs, and forking from a threaded process is
+# unsafe, so with jobs > 1 there is no thread pool: each stage runs on the
+# thread that asks for it (the CLI's main thread). pyelftools reads through
+# one shared stream, so the stages that walk ELF structures hold a lock.
+#
+# A stage that raises is not memoized: the next get() runs it again.
+
+# inputs: outputs passed to compute(pipeline, *values); cached: stored in
+# the AnalysisCache under the output name; elf: walks binary.elf
+Stage = namedtuple("Stage", "inputs compute cached elf")
+
+# Capstone (through ctypes), zlib and hashing release the GIL, so a few
+# threads overlap on several cores; on one core they would only contend
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _info(p):
+    from binary_info import binary_info_lines
+
+    return list(binary_info_lines(p.binary.elf))
+
+
+def _symbols(p):
+    from symbol_extractor import extract_symbols
+
+    return extract_symbols(p.binary.elf)
+
+
+def _symbol_index(p, symbols):
+    from symbol_extractor import SymbolIndex
+
+    return SymbolIndex.build(p.binary, symbols)
+
+
+def _text(p):
+    text = p.binary.section('.text')
+    if not text:
+        raise KeyError(".text section not found in binary.")
+    return text
+
+
+def _ranges(p):
+    return p.binary.address_ranges()
+
+
+def _instructions(p, text, index):
+    from disassembler import disassemble
+
+    boundaries = index.starts if p.jobs > 1 else ()
+    return disassemble(text.data, text.vaddr, jobs=p.jobs, boundaries=boundaries, progress=p.report)
+
+
+def _cfg(p, instructions, text):
+    from graph.cfg_builder import build_cfg
+
+    return build_cfg(instructions, text.data, text.vaddr)
+
+
+def _xrefs(p, instructions, text, ranges):
+    from xref_analyzer import XrefIndex
+
+    return XrefIndex.build(instructions, text.data, text.vaddr, ranges)
+
+
+def _function_graphs(p, index):
+    from graph.cfg_builder import FunctionGraphs
+
+    return FunctionGraphs(p.binary, index)
+
+
+def _discovery(p, index):
+    from graph.discovery import discover
+
+    return discover(p.binary, index)
+
+
+def _call_graph(p, discovery, index):
+    from graph.call_graph import build_call_graph
+
+    return build_call_graph(discovery, index)
+
+
+def _strings(p, param):
+    # param: "<section>:<encoding,...>:<min length>", see strings_output()
+    from string_extractor import iter_strings
+
+    section, encodings, min_len = param.rsplit(":", 2)
+    records = []
+    for r in iter_strings(p.binary, section, int(min_len), tuple(encodings.split(",")), p.jobs):
+        records.append(r)
+        if len(records) % 4096 == 0:
+            p.report(r.offset, len(p.binary))
+    return records
+
+
+def _rodata(p):
+    from graph.rodata_extractor import extract_rodata
+
+    return extract_rodata(p.binary)
+
+
+STAGES = {
+    'info': Stage((), _info, False, True),
+    'symbols': Stage((), _symbols, True, True),
+    'symindex': Stage(('symbols',), _symbol_index, True, True),
+    'text': Stage((), _text, False, False),
+    'ranges': Stage((), _ranges, False, True),
+    'instructions': Stage(('text', 'symindex'), _instructions, True, False),
+    'cfg': Stage(('instructions', 'text'), _cfg, True, False),
+    'xrefs': Stage(('instructions', 'text', 'ranges'), _xrefs, True, False),
+    'function_graphs': Stage(('symindex',), _function_graphs, False, False),
+    'discovery': Stage(('symindex',), _discovery, True, True),
+    'call_graph': Stage(('discovery', 'symindex'), _call_graph, False, False),
+    # Parametrised: "strings:<section>:<encodings>:<min length>"
+    'strings': Stage((), _strings, True, False),
+    'rodata': Stage((), _rodata, True, False),
+}
+
+
+def strings_output(section="all", encodings=ENCODINGS, min_len=4):
+    return f"strings:{section}:{','.join(encodings)}:{min_len}"
+
+
+class Pipeline:
+    def __init__(self, binary, cache, jobs=1, workers=DEFAULT_WORKERS, progress=None, stages=STAGES):
+        # progress(done, total) is called from the stages that report it
+        self.binary = binary
+        self.cache = cache
+        self.jobs = jobs
+        self.progress = progress
+        self.stages = stages
+        # None: stages run inline, on the caller's thread
+        self._executor = None if jobs > 1 else ThreadPoolExecutor(workers, thread_name_prefix="chihiro-stage")
+        self._closed = False
+        self._futures = {}
+        self._lock = threading.RLock()
+        self._elf_lock = threading.Lock()
+        # Parsed once here so that the stages only read the section and
+        # segment tables, never build them concurrently
+        binary.sections()
+        binary.segments()
+
+    def __contains__(self, name):
+        future = self._futures.get(name)
+        return future is not None and future.done() and not future.cancelled() and future.exception() is None
+
+    def report(self, done, total=None):
+        if self.progress is not None:
+            self.progress(done, total)
+
+    def prefetch(self, *names):
+        # Starts computing `names` in the background; inline stages wait
+        # for get()
+        if self._executor is None:
+            return
+        with self._lock:
+            self._forget_failures()
+            for name in names:
+                self._schedule(name)
+
+    def get(self, name, task=None):
+        # Waits for one output. With a ui.tasks.Task, the wait (not the stage,
+        # whose result is kept for the next caller) ends on cancellation.
+        with self._lock:
+            self._forget_failures()
+            future = self._schedule(name)
+        if task is not None:
+            while not wait([future], timeout=0.1).done:
+                task.check()
+        return future.result()
+
+    def lookup(self, name, default=None):
+        # A finished output or `default`; never schedules anything
+        return self._futures[name].result() if name in self else default
+
+    def close(self, block=True):
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=block, cancel_futures=True)
+
+    def _forget_failures(self):
+        # Caller holds self._lock. Failures (and cancellations) are kept
+        # until the request they failed is over, so a stage's dependents
+        # see its error instead of running it again, then dropped: the
+        # next request tries again.
+        for name, future in list(self._futures.items()):
+            if future.done() and (future.cancelled() or future.exception() is not None):
+                del self._futures[name]
+
+    def _stage(self, name):
+        kind, _, param = name.partition(":")
+        stage = self.stages.get(kind)
+        if stage is None:
+            raise KeyError(f"Unknown analysis output: {name}")
+        return stage, param
+
+    def _schedule(self, name):
+        # Caller holds self._lock
+        future = self._futures.get(name)
+        if future is not None:
+            return future
+        stage, param = self._stage(name)
+        future = self._futures[name] = Future()
+        inputs = [self._schedule(i) for i in stage.inputs]
+        pending = [len(inputs)]
+        # Profiling spans of the stage nest under whatever asked for it
+        parent = current_span()
+
+        def input_done(_):
+            with self._lock:
+                pending[0] -= 1
+                ready = pending[0] == 0
+            if ready:
+                self._submit(name, stage, param, inputs, future, parent)
+
+        if not inputs:
+            self._submit(name, stage, param, inputs, future, parent)
+        for i in inputs:
+            i.add_done_callback(input_done)
+        return future
+
+    def _submit(self, name, stage, param, inputs, future, parent):
+        if self._executor is None:
+            if self._closed:
+                future.cancel()
+            else:
+                self._run(name, stage, param, inputs, future, parent)
+            return
+        try:
+            self._executor.submit(self._run, name, stage, param, inputs, future, parent)
+        except RuntimeError:
+            # The pipeline was closed while the inputs were still running
+            future.cancel()
+
+    def _run(self, name, stage, param, inputs, future, parent):
+        try:
+            failed = next((i.exception() for i in inputs if i.exception() is not None), None)
+            if failed is not None:
+                raise failed
+            values = [i.result() for i in inputs]
+            if param:
+                values.append(param)
+            with attached(parent):
+                value = self._compute(name, stage, values)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(value)
+
+    def _compute(self, name, stage, values):
+        def compute():
+            with span(f"stage {name}"):
+                if stage.elf:
+                    with self._elf_lock:
+                        return stage.compute(self, *values)
+                return stage.compute(self, *values)
+
+        if not stage.cached or self.cache is None:
+            return compute()
+        # Decoders take the inputs they need by name (cfg: instructions)
+        return self.cache.get(name, compute, **dict(zip(stage.inputs, values)))
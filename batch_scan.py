@@ -0,0 +1,240 @@
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from analysis_cache import file_digest
+from binary_loader import load_binary
+from string_extractor import iter_strings
+from symbol_extractor import SymbolIndex
+
+ELF_MAGIC = b"\x7fELF"
+DEFAULT_TIMEOUT = 60
+DEFAULT_MEMORY_MB = 2048
+
+
+class ScanTimeout(Exception):
+    pass
+
+
+def is_elf(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == ELF_MAGIC
+    except OSError:
+        return False
+
+
+def iter_elf_files(roots):
+    # Regular files under `roots` (files or directories) starting with the
+    # ELF magic, in a stable order; symlinks are not followed
+    for root in roots:
+        if os.path.isfile(root):
+            if is_elf(root):
+                yield root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if not os.path.islink(path) and os.path.isfile(path) and is_elf(path):
+                    yield path
+
+
+def analyze_file(path, min_len=4):
+    # One NDJSON record summarising a binary
+    with load_binary(path) as binary:
+        elf = binary.elf
+        header = elf.header
+        symbols = SymbolIndex.build(binary).symbols
+        strings = Counter(r.encoding for r in iter_strings(binary, "all", min_len))
+        text = binary.section(".text")
+        interp = binary.section(".interp")
+
+        return {
+            "path": path,
+            "size": len(binary),
+            "sha256": file_digest(path),
+            "info": {
+                "class": "ELF64" if header['e_ident']['EI_CLASS'] == 'ELFCLASS64' else "ELF32",
+                "machine": header['e_machine'],
+                "type": header['e_type'],
+                "entry": header['e_entry'],
+                "sections": elf.num_sections(),
+                "segments": len(binary.segments()),
+                "interp": bytes(interp.data).rstrip(b"\0").decode(errors="replace") if interp else None,
+            },
+            "stripped": binary.section(".symtab") is None,
+            "text_size": text.size if text else 0,
+            "symbols": len(symbols),
+            "functions": len({s['addr'] for s in symbols if s['type'] == "FUNC" and s['addr']}),
+            "imports": len({s['name'] for s in symbols if s['type'] == "FUNC" and not s['addr']}),
+            "strings": dict(strings),
+        }
+
+
+# Set in each worker by _init_worker: paths are put here as they start, so
+# that after a crash the parent knows which files were actually running
+_started = None
+
+
+def _init_worker(memory_mb, started=None):
+    # Address-space cap per worker; blowing it raises MemoryError in the task
+    global _started
+    _started = started
+    if memory_mb:
+        try:
+            import resource
+            limit = memory_mb << 20
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+
+def _alarm(signum, frame):
+    raise ScanTimeout()
+
+
+def _scan_one(path, timeout, min_len):
+    if _started is not None:
+        _started.put(path)
+    signal.signal(signal.SIGALRM, _alarm)
+    if timeout:
+        signal.alarm(math.ceil(timeout))
+    try:
+        return analyze_file(path, min_len)
+    except ScanTimeout:
+        return {"path": path, "error": f"timed out after {timeout}s"}
+    except MemoryError:
+        return {"path": path, "error": "memory limit exceeded"}
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        signal.alarm(0)
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def scan(roots, out=None, jobs=None, timeout=DEFAULT_TIMEOUT, memory_mb=DEFAULT_MEMORY_MB,
+         checkpoint=None, min_len=4):
+    # Streams one JSON line per ELF file to `out`. Paths already listed in
+    # `checkpoint` are skipped, and each finished path is appended to it after
+    # its record is written, so an interrupted scan resumes where it stopped.
+    #
+    # When a worker dies (OOM killer, segfault in a C extension) the whole
+    # pool goes down with it. Only files a worker had started can be to
+    # blame: if there is one, it is reported as crashed; if there are
+    # several, each is re-run alone so the next crash names it. Files that
+    # were only queued go back to the new pool and are never checkpointed
+    # as failed.
+    out = out or sys.stdout
+    jobs = jobs or os.cpu_count() or 1
+    done = load_checkpoint(checkpoint)
+    ckpt = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    files = (p for p in iter_elf_files(roots) if p not in done)
+    stats = Counter()
+    ctx = multiprocessing.get_context("fork")
+
+    def emit(record):
+        out.write(json.dumps(record, separators=(",", ":")) + "\n")
+        out.flush()
+        if ckpt:
+            ckpt.write(record["path"] + "\n")
+            ckpt.flush()
+        stats["error" if "error" in record else "ok"] += 1
+
+    def new_pool():
+        started_queue = ctx.SimpleQueue()
+        pool = ProcessPoolExecutor(
+            jobs, mp_context=ctx, initializer=_init_worker, initargs=(memory_mb, started_queue),
+        )
+        return pool, started_queue
+
+    def drain(started_queue):
+        while not started_queue.empty():
+            started.add(started_queue.get())
+
+    pool, started_queue = new_pool()
+    running = {}
+    started = set()
+    retry = deque()      # queued when a pool broke; submitted before new files
+    isolate = deque()    # crash suspects, run one at a time
+    alone = False        # the only future in flight is an isolated suspect
+    try:
+        exhausted = False
+        while True:
+            if isolate:
+                if not running:
+                    path = isolate.popleft()
+                    running[pool.submit(_scan_one, path, timeout, min_len)] = path
+                    alone = True
+            else:
+                # Keep a bounded number of files in flight so huge trees stream
+                while len(running) < jobs * 4:
+                    if retry:
+                        path = retry.popleft()
+                    else:
+                        path = None if exhausted else next(files, None)
+                        if path is None:
+                            exhausted = True
+                            break
+                    running[pool.submit(_scan_one, path, timeout, min_len)] = path
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            drain(started_queue)
+            for future in finished:
+                path = running.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    pass
+                else:
+                    started.discard(path)
+                    emit(record)
+                    continue
+
+                # Every future of the pool fails with it; keep the results
+                # that made it back before the crash
+                lost = [path]
+                for other, other_path in running.items():
+                    if other.done() and other.exception() is None:
+                        started.discard(other_path)
+                        emit(other.result())
+                    else:
+                        lost.append(other_path)
+                suspects = [p for p in lost if p in started]
+                if alone or len(suspects) == 1:
+                    culprit = path if alone else suspects[0]
+                    emit({"path": culprit, "error": "worker crashed"})
+                    retry.extend(p for p in lost if p != culprit)
+                else:
+                    # Several (or, if the worker died before saying so, no)
+                    # started files: find the culprit by running them alone
+                    suspects = suspects or lost
+                    isolate.extend(suspects)
+                    retry.extend(p for p in lost if p not in suspects)
+                running.clear()
+                started.clear()
+                alone = False
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool, started_queue = new_pool()
+                break
+            else:
+                alone = False
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if ckpt:
+            ckpt.close()
+    return stats
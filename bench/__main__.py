@@ -0,0 +1,144 @@
+import argparse
+import os
+import sys
+import tempfile
+
+from bench.suite import (
+    STAGES, compare, environment, load_results, print_comparison, print_results,
+    run_suite, save_results,
+)
+from bench.startup import DEFAULT_BINARY, DEFAULT_MARGIN_MS, check_startup
+from bench.synth_elf import PRESETS, generate_elf
+
+# python -m bench generate OUT.elf [--preset P | --functions N ...]
+# python -m bench run [BINARY] [--preset P] [-o results.json] [--baseline base.json]
+# python -m bench compare base.json results.json [--threshold 0.1]
+# python -m bench startup [BINARY] [--margin-ms 200 | --budget-ms MS]
+
+
+def add_shape_args(parser):
+    parser.add_argument("--preset", choices=PRESETS, default="small", help="Size of the synthetic binary (default: small)")
+    parser.add_argument("--functions", type=int, help="Number of functions (overrides the preset)")
+    parser.add_argument("--text-size", type=lambda x: int(x, 0), help="Bytes of .text")
+    parser.add_argument("--rodata-size", type=lambda x: int(x, 0), help="Bytes of .rodata")
+    parser.add_argument("--symbols", type=int, help="Total symbol count")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+
+
+def shape(args):
+    params = dict(PRESETS[args.preset], seed=args.seed)
+    for key in ("functions", "text_size", "rodata_size", "symbols"):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    return params
+
+
+def add_gate_args(parser):
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed median time growth per stage (default: 0.10 = 10%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.20, help="Allowed peak memory growth per stage (default: 0.20)")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Ignore time changes smaller than this many seconds")
+
+
+def gate(baseline, report, args):
+    if baseline.get("params") != report.get("params"):
+        print("[!] Baseline was measured on a different binary; comparison is approximate", file=sys.stderr)
+    rows, regressions = compare(baseline, report, args.threshold, args.memory_threshold, args.min_delta)
+    print_comparison(rows)
+    if regressions:
+        print(f"[!] Regressed: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    print("[+] No regressions")
+    return 0
+
+
+def cmd_generate(args):
+    params = shape(args)
+    generate_elf(args.output, **params)
+    print(f"[+] Wrote {args.output} ({os.path.getsize(args.output)} bytes, {params})")
+    return 0
+
+
+def cmd_run(args):
+    if args.binary:
+        path, params = args.binary, {"binary": os.path.abspath(args.binary)}
+        tmp = None
+    else:
+        params = shape(args)
+        tmp = tempfile.NamedTemporaryFile(prefix="chihiro-bench-", suffix=".elf", delete=False)
+        tmp.close()
+        path = generate_elf(tmp.name, **params)
+
+    def log(name, entry):
+        print(f"  {name:<24}{entry['median'] * 1000:>10.2f} ms", file=sys.stderr)
+
+    try:
+        print(f"[+] Benchmarking {path} ({os.path.getsize(path)} bytes)", file=sys.stderr)
+        results = run_suite(path, args.repeat, args.stage, not args.no_memory, log)
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+    report = {"environment": environment(), "params": params, "repeat": args.repeat, "stages": results}
+    print_results(results)
+    if args.output:
+        save_results(args.output, report)
+        print(f"[+] Results written to {args.output}")
+    if args.baseline:
+        return gate(load_results(args.baseline), report, args)
+    return 0
+
+
+def cmd_compare(args):
+    return gate(load_results(args.baseline), load_results(args.results), args)
+
+
+def cmd_startup(args):
+    print(f"[+] CLI startup on {args.binary}")
+    failures = check_startup(args.binary, args.margin_ms, args.runs, budget_ms=args.budget_ms)
+    if failures:
+        print(f"[!] {failures} startup check(s) failed", file=sys.stderr)
+        return 1
+    print("[+] Startup within budget")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Chihiro - stage benchmarks on synthetic ELF files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("generate", help="Write a synthetic ELF file")
+    p.add_argument("output", help="Path of the ELF file to write")
+    add_shape_args(p)
+    p.set_defaults(func=cmd_generate)
+
+    p = commands.add_parser("run", help="Time and memory-profile every analysis stage")
+    p.add_argument("binary", nargs="?", help="Benchmark this file instead of a generated one")
+    add_shape_args(p)
+    p.add_argument("--repeat", "-r", type=int, default=5, help="Timed runs per stage; the median is reported")
+    p.add_argument("--stage", action="append", choices=STAGES, help="Only these stages (repeatable)")
+    p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    p.add_argument("--output", "-o", help="Write results as JSON")
+    p.add_argument("--baseline", help="Fail if a stage regressed against this results file")
+    add_gate_args(p)
+    p.set_defaults(func=cmd_run)
+
+    p = commands.add_parser("compare", help="Fail if a results file regressed against a baseline")
+    p.add_argument("baseline")
+    p.add_argument("results")
+    add_gate_args(p)
+    p.set_defaults(func=cmd_compare)
+
+    p = commands.add_parser("startup", help="Fail if the CLI imports heavy modules eagerly or starts too slowly")
+    p.add_argument("binary", nargs="?", default=DEFAULT_BINARY)
+    p.add_argument("--margin-ms", type=float, default=DEFAULT_MARGIN_MS,
+                   help="Median wall time allowed for '--info' over a bare interpreter (default: %(default)s)")
+    p.add_argument("--budget-ms", type=float, help="Fixed median wall time allowed instead of the margin")
+    p.add_argument("--runs", type=int, default=20, help="Processes timed")
+    p.set_defaults(func=cmd_startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
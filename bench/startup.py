@@ -0,0 +1,109 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Startup cost of the CLI for scripted use: wall time of whole processes,
+# and `python -X importtime` to catch heavy modules that are imported
+# eagerly again.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BINARY = os.path.join(ROOT, "test.elf")
+# Time --info may take on top of a bare interpreter on the same machine.
+# It measures about 125 ms over a 20 ms floor on one slow core, so the
+# margin leaves room for noise and slower runners while an accidental
+# Capstone or networkx import (60+ ms each) still trips the import check.
+DEFAULT_MARGIN_MS = 200
+
+# Modules that only the flag using them may load
+HEAVY_MODULES = (
+    "capstone", "networkx", "tkinter", "sqlite3", "pickle", "tracemalloc",
+    "concurrent.futures.process", "disassembler", "xref_analyzer",
+    "graph.cfg_builder", "graph.cfg_visualizer", "graph.layout",
+    "analysis_db", "batch_scan",
+)
+
+# Light invocations: none of them may import a heavy module
+CASES = (("--info",), ("--symbols",), ("--hex",), ("--strings",))
+
+
+def cli_command(binary, flags, python=sys.executable):
+    return [python, "-m", "ui.cli", binary, *flags, "--no-cache"]
+
+
+def time_startup(binary, flags=("--info",), runs=20):
+    # Wall-clock seconds of `runs` complete CLI processes
+    times = []
+    command = cli_command(binary, flags)
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def interpreter_startup(runs=20):
+    # Floor: a bare interpreter doing nothing
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def import_times(binary, flags):
+    # {module: cumulative microseconds} imported by one CLI run
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *cli_command(binary, flags)[1:]],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            modules[name.strip()] = int(cumulative)
+        except ValueError:
+            pass  # the header line
+    return modules
+
+
+def eager_imports(binary, flags, heavy=HEAVY_MODULES):
+    # Heavy modules loaded by a run that should not need them
+    modules = import_times(binary, flags)
+    return sorted(
+        h for h in heavy
+        if any(name == h or name.startswith(h + ".") for name in modules)
+    )
+
+
+def check_startup(binary=DEFAULT_BINARY, margin_ms=DEFAULT_MARGIN_MS, runs=20, out=None, budget_ms=None):
+    # Prints a report and returns the number of failed checks. The budget is
+    # the bare interpreter's median plus margin_ms unless budget_ms is given.
+    out = out or sys.stdout
+    failures = 0
+
+    for flags in CASES:
+        eager = eager_imports(binary, flags)
+        status = "ok" if not eager else "EAGER IMPORTS: " + ", ".join(eager)
+        out.write(f"  imports {' '.join(flags):<12} {status}\n")
+        failures += bool(eager)
+
+    floor = statistics.median(interpreter_startup(runs))
+    times = time_startup(binary, ("--info",), runs)
+    median = statistics.median(times)
+    if budget_ms is None:
+        budget_ms = floor * 1000 + margin_ms
+        basis = f"bare interpreter {floor * 1000:.1f} ms + {margin_ms:g} ms"
+    else:
+        basis = f"fixed; bare interpreter {floor * 1000:.1f} ms"
+    over = median * 1000 > budget_ms
+    out.write(
+        f"  startup --info      median {median * 1000:.1f} ms, min {min(times) * 1000:.1f} ms, "
+        f"budget {budget_ms:.1f} ms ({basis}){'  OVER BUDGET' if over else ''}\n"
+    )
+    failures += over
+    return failures
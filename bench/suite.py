@@ -0,0 +1,251 @@
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from binary_loader import load_binary
+from disassembler import disassemble
+from graph.call_graph import build_call_graph, refresh_functions
+from graph.cfg_builder import build_cfg
+from graph.discovery import discover
+from graph.rodata_extractor import extract_rodata
+from signature_search import SignatureSet, parse_signature, search_binary
+from string_extractor import extract_ascii_strings
+from symbol_extractor import SymbolIndex, extract_symbols
+from utils.helpers import hex_dump
+from version import __version__
+from xref_analyzer import XrefIndex, find_xrefs
+
+# Stages are timed in order; each gets the outputs of the earlier ones in
+# `state` and returns (result, item count). Results are kept so that a
+# stage is measured on exactly what the CLI would hand it.
+
+
+def _load(path, state):
+    binary = load_binary(path)
+    sections = binary.sections()
+    return binary, len(sections)
+
+
+def _symbols(path, state):
+    symbols = extract_symbols(state["load_binary"].elf)
+    return symbols, len(symbols)
+
+
+def _disassemble(path, state):
+    text = state["load_binary"].section(".text")
+    table = disassemble(text.data, text.vaddr)
+    return table, len(table)
+
+
+def _cfg(path, state):
+    text = state["load_binary"].section(".text")
+    cfg = build_cfg(state["disassemble"], text.data, text.vaddr)
+    return cfg, len(cfg)
+
+
+def _discover(path, state):
+    binary = state["load_binary"]
+    result = discover(binary, SymbolIndex(state["extract_symbols"]))
+    return result, len(result)
+
+
+def _call_graph(path, state):
+    graph = build_call_graph(state["discover"], SymbolIndex(state["extract_symbols"]))
+    return graph, len(graph)
+
+
+def _call_graph_refresh(path, state):
+    # The incremental path: every function re-summarized one at a time
+    discovery = state["discover"]
+    nodes = refresh_functions(state["call_graph"], discovery, SymbolIndex(state["extract_symbols"]),
+                              sorted(discovery.functions))
+    return None, len(nodes)
+
+
+def _xref_index(path, state):
+    binary = state["load_binary"]
+    text = binary.section(".text")
+    index = XrefIndex.build(state["disassemble"], text.data, text.vaddr, binary.address_ranges())
+    return index, len(index)
+
+
+def _find_xrefs(path, state):
+    # Textual scan for the entry point, the worst case: every instruction is looked at
+    refs = find_xrefs(state["disassemble"], state["load_binary"].elf.header['e_entry'])
+    return refs, len(refs)
+
+
+def _ascii_strings(path, state):
+    strings = extract_ascii_strings(state["load_binary"].view)
+    return strings, len(strings)
+
+
+def _rodata(path, state):
+    strings = extract_rodata(state["load_binary"])
+    return strings, len(strings)
+
+
+def _signature_search(path, state):
+    # 1000 signatures cut from .text with some wildcard and half bytes: the
+    # scan should cost about the same as for a handful
+    binary = state["load_binary"]
+    text = binary.section(".text").data
+    rng = random.Random(0)
+    signatures = []
+    for _ in range(1000):
+        start = rng.randrange(len(text) - 16)
+        signatures.append(parse_signature(" ".join(
+            "??" if rng.random() < 0.1 else f"{b >> 4:x}?" if rng.random() < 0.05 else f"{b:02x}"
+            for b in text[start:start + rng.randint(8, 16)]
+        )))
+    matches = search_binary(binary, SignatureSet(signatures))
+    return matches, len(matches)
+
+
+def _hex_dump(path, state):
+    text = hex_dump(state["load_binary"].section(".text").data)
+    return None, len(text)
+
+
+STAGES = {
+    "load_binary": _load,
+    "extract_symbols": _symbols,
+    "disassemble": _disassemble,
+    "build_cfg": _cfg,
+    "discover": _discover,
+    "call_graph": _call_graph,
+    "call_graph_refresh": _call_graph_refresh,
+    "xref_index": _xref_index,
+    "find_xrefs": _find_xrefs,
+    "extract_ascii_strings": _ascii_strings,
+    "extract_rodata": _rodata,
+    "signature_search": _signature_search,
+    "hex_dump": _hex_dump,
+}
+
+
+def _time(name, path, state, repeat):
+    runs = []
+    result = count = None
+    for _ in range(repeat):
+        if name == "load_binary" and result is not None:
+            result.close()
+        gc.collect()
+        start = time.perf_counter()
+        result, count = STAGES[name](path, state)
+        runs.append(time.perf_counter() - start)
+    return result, count, runs
+
+
+def _peak_memory(name, path, state):
+    # Peak Python-heap growth while the stage runs; C allocations inside
+    # Capstone are not seen by tracemalloc.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result, _ = STAGES[name](path, state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if name == "load_binary":
+        result.close()
+    return peak
+
+
+def run_suite(path, repeat=5, stages=None, memory=True, log=None):
+    # {stage: {"median", "min", "runs", "items", "peak_kib"}} for `path`
+    names = list(stages or STAGES)
+    needed = list(STAGES)[:max(list(STAGES).index(n) for n in names) + 1]
+    state = {}
+    results = {}
+    try:
+        for name in needed:
+            if name not in names:
+                state[name] = STAGES[name](path, state)[0]
+                continue
+            result, count, runs = _time(name, path, state, repeat)
+            state[name] = result
+            entry = {
+                "median": statistics.median(runs),
+                "min": min(runs),
+                "runs": runs,
+                "items": count,
+            }
+            if memory:
+                entry["peak_kib"] = _peak_memory(name, path, state) >> 10
+            results[name] = entry
+            if log:
+                log(name, entry)
+    finally:
+        if "load_binary" in state:
+            state["load_binary"].close()
+    return results
+
+
+def environment():
+    return {
+        "chihiro": __version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def save_results(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.10, memory_threshold=0.20, min_delta=0.005):
+    # (rows, regressions). A stage regresses when its median time grows by
+    # more than `threshold` (and by at least `min_delta` seconds, so tiny
+    # stages do not flap on timer noise) or its peak memory by more than
+    # `memory_threshold`.
+    rows = []
+    regressions = []
+    for name, base in baseline["stages"].items():
+        now = current["stages"].get(name)
+        if now is None:
+            continue
+        ratio = now["median"] / base["median"] if base["median"] else 1.0
+        slower = ratio > 1 + threshold and now["median"] - base["median"] >= min_delta
+        mem_ratio = None
+        bigger = False
+        if base.get("peak_kib") and "peak_kib" in now:
+            mem_ratio = now["peak_kib"] / base["peak_kib"]
+            bigger = mem_ratio > 1 + memory_threshold and now["peak_kib"] - base["peak_kib"] >= 64
+        rows.append((name, base["median"], now["median"], ratio, mem_ratio, slower or bigger))
+        if slower or bigger:
+            regressions.append(name)
+    return rows, regressions
+
+
+def print_results(results, out=None):
+    out = out or sys.stdout
+    out.write(f"{'stage':<24}{'median ms':>12}{'min ms':>10}{'items':>10}{'peak KiB':>11}\n")
+    for name, r in results.items():
+        peak = r.get("peak_kib", "-")
+        out.write(f"{name:<24}{r['median'] * 1000:>12.2f}{r['min'] * 1000:>10.2f}{r['items']:>10}{peak:>11}\n")
+
+
+def print_comparison(rows, out=None):
+    out = out or sys.stdout
+    out.write(f"{'stage':<24}{'base ms':>10}{'now ms':>10}{'time':>9}{'memory':>9}\n")
+    for name, base, now, ratio, mem_ratio, regressed in rows:
+        mem = f"{mem_ratio:>8.2f}x" if mem_ratio is not None else f"{'-':>9}"
+        flag = "  REGRESSED" if regressed else ""
+        out.write(f"{name:<24}{base * 1000:>10.2f}{now * 1000:>10.2f}{ratio:>8.2f}x{mem}{flag}\n")
@@ -0,0 +1,376 @@
+import random
+import struct
+
+# Deterministic synthetic x86-64 ELF executables for benchmarking. The code
+# is real, decodable machine code with calls, if/else diamonds, loops and
+# RIP-relative string references, so every analysis stage has work to do.
+# With extras=True the binary also gets the constructs code discovery has to
+# get right (jump tables, a noreturn call, .init_array and .eh_frame_hdr
+# seeds, overlapping instructions, padding); build_elf_layout() says where.
+
+BASE = 0x400000
+PAGE = 0x1000
+EHDR_SIZE = 64
+PHDR_SIZE = 56
+SHDR_SIZE = 64
+SYM_SIZE = 24
+
+SHT_PROGBITS, SHT_SYMTAB, SHT_STRTAB, SHT_INIT_ARRAY = 1, 2, 3, 14
+SHF_WRITE, SHF_ALLOC, SHF_EXECINSTR = 0x1, 0x2, 0x4
+PF_X, PF_R = 0x1, 0x4
+STT_OBJECT, STT_FUNC, STB_GLOBAL = 1, 2, 1
+
+PROLOGUE = b"\x55\x48\x89\xe5"      # push rbp; mov rbp, rsp
+EPILOGUE = b"\x5d\xc3"              # pop rbp; ret
+
+PRESETS = {
+    "tiny": dict(functions=50, text_size=32 << 10, rodata_size=8 << 10, symbols=100),
+    "small": dict(functions=500, text_size=256 << 10, rodata_size=64 << 10, symbols=1000),
+    "medium": dict(functions=4000, text_size=2 << 20, rodata_size=512 << 10, symbols=8000),
+    "large": dict(functions=20000, text_size=16 << 20, rodata_size=4 << 20, symbols=50000),
+}
+
+_WORDS = (
+    "error", "failed", "open", "read", "write", "config", "user", "path", "buffer",
+    "invalid", "request", "socket", "timeout", "value", "option", "%s", "%d", "0x%x",
+)
+
+
+def _strings(rng, rodata_size):
+    # (rodata bytes, offsets of each string); about one in eight is UTF-16LE
+    data = bytearray()
+    offsets = []
+    while len(data) < rodata_size:
+        text = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6)))
+        if rng.random() < 0.125:
+            if len(data) % 2:
+                data.append(0)
+            raw = text.encode("utf-16-le") + b"\0\0"
+        else:
+            raw = text.encode("ascii") + b"\0"
+        offsets.append(len(data))
+        data += raw
+    return bytes(data[:rodata_size]), [o for o in offsets if o < rodata_size]
+
+
+class _Emitter:
+    def __init__(self, rng, start, size, functions, strings):
+        self.rng = rng
+        self.start = start
+        self.size = size
+        self.functions = functions
+        self.strings = strings
+        self.code = bytearray(PROLOGUE)
+
+    def room(self):
+        return self.size - len(EPILOGUE) - len(self.code)
+
+    def simple(self, here):
+        # One straight-line instruction placed at address `here`
+        rng = self.rng
+        choice = rng.random()
+        if choice < 0.3 and self.strings:
+            # lea rdi, [rip + disp32]
+            return b"\x48\x8d\x3d" + struct.pack("<i", rng.choice(self.strings) - (here + 7))
+        if choice < 0.5:
+            # call rel32
+            return b"\xe8" + struct.pack("<i", rng.choice(self.functions) - (here + 5))
+        if choice < 0.7:
+            return b"\xb8" + struct.pack("<I", rng.getrandbits(32))        # mov eax, imm32
+        if choice < 0.85:
+            return bytes((0x83, 0xc0, rng.getrandbits(7)))                  # add eax, imm8
+        return b"\x48\x89\xc7"                                              # mov rdi, rax
+
+    def run(self, at, budget):
+        # A few straight-line instructions starting at code offset `at`,
+        # totalling at most `budget` bytes
+        out = bytearray()
+        while True:
+            insn = self.simple(self.start + at + len(out))
+            if len(out) + len(insn) > budget:
+                break
+            out += insn
+            if self.rng.random() < 0.35:
+                break
+        return bytes(out)
+
+    def emit(self):
+        rng = self.rng
+        code = self.code
+        while True:
+            room = self.room()
+            if room < 16:
+                break
+            shape = rng.random()
+            if shape < 0.2:
+                # cmp eax, imm8; jne else; <then>; jmp join; else: <else>; join:
+                code += bytes((0x83, 0xf8, rng.getrandbits(7)))
+                then_part = self.run(len(code) + 2, min(100, room - 7))
+                else_at = len(code) + 2 + len(then_part) + 2
+                else_part = self.run(else_at, min(100, room - 7 - len(then_part)))
+                code += bytes((0x75, len(then_part) + 2)) + then_part
+                code += bytes((0xeb, len(else_part))) + else_part
+            elif shape < 0.3:
+                # mov ecx, n; head: <body>; dec ecx; jnz head
+                code += b"\xb9" + struct.pack("<I", rng.randint(2, 64))
+                head = len(code)
+                code += self.run(head, min(100, room - 9))
+                code += b"\xff\xc9" + bytes((0x75, (head - (len(code) + 4)) & 0xff))
+            else:
+                insn = self.simple(self.start + len(code))
+                if len(insn) > room:
+                    break
+                code += insn
+        code += b"\x90" * self.room() + EPILOGUE
+        return bytes(code)
+
+
+def _extras(code_addr, table_addr):
+    # (code at code_addr, jump tables at table_addr, [(name, addr, size)],
+    # layout). Every instruction has a fixed size, so the code is as long
+    # whatever the addresses.
+    code = bytearray()
+    tables = bytearray()
+    symbols = []
+    layout = {}
+
+    def here():
+        return code_addr + len(code)
+
+    def align():
+        while len(code) % 16:
+            code.append(0xcc)
+
+    def function(name, start):
+        symbols.append((name, start, here() - start))
+
+    # abort: a noreturn callee
+    start = here()
+    code += b"\x0f\x0b"                                    # ud2
+    function("abort", start)
+    align()
+
+    # Bytes after a call to abort are inline data, not code
+    start = here()
+    code += PROLOGUE
+    layout["noreturn_call"] = here()
+    code += b"\xe8" + struct.pack("<i", symbols[0][1] - (here() + 5))
+    layout["inline_data"] = (here(), here() + 8)
+    code += b"CHIHIRO!"
+    function("fatal_path", start)
+    align()
+
+    # cmp edi, 3; ja default; lea rdx, [rip + table]
+    # movsxd rax, dword ptr [rdx + rdi*4]; add rax, rdx; jmp rax
+    start = here()
+    table = table_addr + len(tables)
+    code += b"\x83\xff\x03\x77\x00"
+    ja = len(code) - 1
+    code += b"\x48\x8d\x15" + struct.pack("<i", table - (here() + 7))
+    code += b"\x48\x63\x04\xba\x48\x01\xd0"
+    layout["relative_jmp"] = here()
+    code += b"\xff\xe0"
+    cases = []
+    for k in range(4):
+        cases.append(here())
+        code += b"\xb8" + struct.pack("<I", k) + b"\xc3"    # mov eax, k; ret
+    code[ja] = here() - (code_addr + ja + 1)
+    code += b"\x31\xc0\xc3"                                # default: xor eax, eax; ret
+    tables += b"".join(struct.pack("<i", c - table) for c in cases)
+    layout["relative_cases"] = cases
+    function("switch_relative", start)
+    align()
+
+    # cmp edi, 2; ja default; jmp qword ptr [rdi*8 + table]
+    start = here()
+    tables += b"\0" * (-len(tables) % 8)
+    table = table_addr + len(tables)
+    code += b"\x83\xff\x02\x77\x00"
+    ja = len(code) - 1
+    layout["absolute_jmp"] = here()
+    code += b"\xff\x24\xfd" + struct.pack("<I", table)
+    cases = []
+    for k in range(3):
+        cases.append(here())
+        code += b"\xb8" + struct.pack("<I", k) + b"\xc3"
+    code[ja] = here() - (code_addr + ja + 1)
+    code += b"\x31\xc0\xc3"
+    tables += b"".join(struct.pack("<Q", c) for c in cases)
+    layout["absolute_cases"] = cases
+    function("switch_absolute", start)
+    # Multi-byte nop before the int3 alignment filler
+    layout["nop_padding"] = here()
+    code += b"\x66\x0f\x1f\x44\x00\x00"
+    align()
+
+    # mov eax, 0xc3c03148; jmp <into the mov>: bytes 1-4 of the mov also
+    # decode as xor rax, rax; ret
+    start = here()
+    code += b"\xb8\x48\x31\xc0\xc3"
+    layout["overlap_target"] = start + 1
+    code += b"\xeb" + bytes([(start + 1 - (here() + 2)) & 0xff])
+    function("overlap", start)
+    align()
+
+    # Functions without symbols, reached only from .init_array / .eh_frame_hdr
+    for name, value in (("init_array_function", 1), ("eh_frame_function", 2)):
+        layout[name] = here()
+        code += b"\xb8" + struct.pack("<I", value) + b"\xc3"
+        align()
+    return bytes(code), bytes(tables), symbols, layout
+
+
+def _eh_frame_hdr(vaddr, locations):
+    # version 1, no .eh_frame pointer, udata4 count, datarel sdata4 table;
+    # the FDE pointers are never followed, so they point at the header
+    out = bytearray(b"\x01\xff\x03\x3b") + struct.pack("<I", len(locations))
+    for location in sorted(locations):
+        out += struct.pack("<ii", location - vaddr, 0)
+    return bytes(out)
+
+
+def _function_sizes(rng, functions, text_size):
+    average = max(32, text_size // max(functions, 1))
+    sizes = [max(32, int(average * rng.uniform(0.5, 1.5))) for _ in range(functions)]
+    scale = text_size / sum(sizes)
+    return [max(32, int(s * scale)) for s in sizes]
+
+
+def build_elf(functions=500, text_size=256 << 10, rodata_size=64 << 10, symbols=None, seed=0, extras=False):
+    # Bytes of an ELF64 x86-64 executable with `functions` FUNC symbols, about
+    # `text_size` bytes of code, `rodata_size` bytes of strings and `symbols`
+    # symbols in total (the ones beyond the functions are OBJECTs in .rodata).
+    return build_elf_layout(functions, text_size, rodata_size, symbols, seed, extras)[0]
+
+
+def build_elf_layout(functions=500, text_size=256 << 10, rodata_size=64 << 10, symbols=None, seed=0, extras=False):
+    # (ELF bytes, {name: address}) with the function starts, the extras'
+    # addresses and, with extras, where the jump tables and seeds are
+    rng = random.Random(seed)
+    functions = max(functions, 1)
+    symbols = max(symbols or functions, functions)
+
+    text_off = PAGE
+    text_addr = BASE + text_off
+    sizes = _function_sizes(rng, functions, text_size)
+    starts = []
+    offset = text_addr
+    for size in sizes:
+        starts.append(offset)
+        offset += size
+    text_len = offset - text_addr
+    layout = {"functions": list(starts)}
+
+    extra_addr = text_addr + text_len + (-text_len % 16)
+    if extras:
+        text_len = extra_addr - text_addr + len(_extras(extra_addr, 0)[0])
+
+    rodata_off = (text_off + text_len + PAGE - 1) & ~(PAGE - 1)
+    rodata_addr = BASE + rodata_off
+    rodata, string_offsets = _strings(rng, rodata_size)
+    string_addrs = [rodata_addr + o for o in string_offsets]
+
+    text = bytearray()
+    for start, size in zip(starts, sizes):
+        text += _Emitter(rng, start, size, starts, string_addrs).emit()
+
+    extra_sections = []
+    extra_symbols = []
+    if extras:
+        tables_addr = rodata_addr + len(rodata) + (-len(rodata) % 8)
+        code, tables, extra_symbols, extra_layout = _extras(extra_addr, tables_addr)
+        layout.update(extra_layout, jump_tables=tables_addr)
+        text += b"\xcc" * (extra_addr - text_addr - len(text)) + code
+        rodata += b"\0" * (tables_addr - rodata_addr - len(rodata)) + tables
+        init_addr = rodata_addr + len(rodata) + (-len(rodata) % 8)
+        eh_addr = init_addr + 8
+        extra_sections = [
+            (".init_array", SHT_INIT_ARRAY, SHF_ALLOC | SHF_WRITE, init_addr,
+             struct.pack("<Q", extra_layout["init_array_function"]), 8),
+            (".eh_frame_hdr", SHT_PROGBITS, SHF_ALLOC, eh_addr,
+             _eh_frame_hdr(eh_addr, [extra_layout["eh_frame_function"]]), 4),
+        ]
+
+    # Symbol and string tables
+    strtab = bytearray(b"\0")
+    symtab = bytearray(SYM_SIZE)
+
+    def add_symbol(name, value, size, kind, shndx):
+        symtab.extend(struct.pack(
+            "<IBBHQQ", len(strtab), (STB_GLOBAL << 4) | kind, 0, shndx, value, size
+        ))
+        strtab.extend(name.encode() + b"\0")
+
+    for i, (start, size) in enumerate(zip(starts, sizes)):
+        add_symbol("main" if i == 0 else f"func_{i:06d}", start, size, STT_FUNC, 1)
+    for name, start, size in extra_symbols:
+        add_symbol(name, start, size, STT_FUNC, 1)
+    for i in range(symbols - functions):
+        add_symbol(f"data_{i:06d}", rng.choice(string_addrs) if string_addrs else rodata_addr, 0, STT_OBJECT, 2)
+
+    names = [b"", b".text", b".rodata"] + [e[0].encode() for e in extra_sections] + [b".symtab", b".strtab", b".shstrtab"]
+    shstrtab = bytearray()
+    name_offsets = []
+    for name in names:
+        name_offsets.append(len(shstrtab))
+        shstrtab += name + b"\0"
+
+    # Extra sections follow .rodata in its segment, at their vaddr's offset
+    loaded_end = rodata_off + len(rodata)
+    for _, _, _, vaddr, data, _ in extra_sections:
+        loaded_end = vaddr - BASE + len(data)
+    symtab_off = loaded_end
+    symtab_off += -symtab_off % 8
+    strtab_off = symtab_off + len(symtab)
+    shstrtab_off = strtab_off + len(strtab)
+    shoff = shstrtab_off + len(shstrtab)
+    shoff += -shoff % 8
+
+    out = bytearray(shoff + SHDR_SIZE * len(names))
+    out[:EHDR_SIZE] = struct.pack(
+        "<16sHHIQQQIHHHHHH",
+        b"\x7fELF\x02\x01\x01" + b"\0" * 9, 2, 62, 1, starts[0], EHDR_SIZE, shoff, 0,
+        EHDR_SIZE, PHDR_SIZE, 2, SHDR_SIZE, len(names), len(names) - 1,
+    )
+    phdrs = (
+        (PF_R | PF_X, 0, BASE, text_off + text_len),
+        (PF_R, rodata_off, rodata_addr, loaded_end - rodata_off),
+    )
+    for i, (flags, p_off, vaddr, size) in enumerate(phdrs):
+        out[EHDR_SIZE + i * PHDR_SIZE:EHDR_SIZE + (i + 1) * PHDR_SIZE] = struct.pack(
+            "<IIQQQQQQ", 1, flags, p_off, vaddr, vaddr, size, size, PAGE
+        )
+    out[text_off:text_off + text_len] = text
+    out[rodata_off:rodata_off + len(rodata)] = rodata
+    for _, _, _, vaddr, data, _ in extra_sections:
+        out[vaddr - BASE:vaddr - BASE + len(data)] = data
+    out[symtab_off:strtab_off] = symtab
+    out[strtab_off:shstrtab_off] = strtab
+    out[shstrtab_off:shstrtab_off + len(shstrtab)] = shstrtab
+
+    strtab_index = len(names) - 2
+    headers = [
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (SHT_PROGBITS, SHF_ALLOC | SHF_EXECINSTR, text_addr, text_off, text_len, 0, 0, 16, 0),
+        (SHT_PROGBITS, SHF_ALLOC, rodata_addr, rodata_off, len(rodata), 0, 0, 16, 0),
+    ]
+    headers += [
+        (kind, flags, vaddr, vaddr - BASE, len(data), 0, 0, alignment, 8 if kind == SHT_INIT_ARRAY else 0)
+        for _, kind, flags, vaddr, data, alignment in extra_sections
+    ]
+    headers += [
+        (SHT_SYMTAB, 0, 0, symtab_off, len(symtab), strtab_index, 1, 8, SYM_SIZE),
+        (SHT_STRTAB, 0, 0, strtab_off, len(strtab), 0, 0, 1, 0),
+        (SHT_STRTAB, 0, 0, shstrtab_off, len(shstrtab), 0, 0, 1, 0),
+    ]
+    for i, (name_off, header) in enumerate(zip(name_offsets, headers)):
+        out[shoff + i * SHDR_SIZE:shoff + (i + 1) * SHDR_SIZE] = struct.pack(
+            "<IIQQQQIIQQ", name_off, *header
+        )
+    return bytes(out), layout
+
+
+def generate_elf(path, **params):
+    with open(path, "wb") as f:
+        f.write(build_elf(**params))
+    return path
@@ -1,20 +1,26 @@
-def print_binary_info(elf):
-    print("\n[+] ELF File Info:")
+def binary_info_lines(elf):
+    yield ""
+    yield "[+] ELF File Info:"
     header = elf.header
 
     elfclass = header['e_ident']['EI_CLASS']
-    print(f"    Format        : {'ELF64' if elfclass == 'ELFCLASS64' else 'ELF32'}")
+    yield f"    Format        : {'ELF64' if elfclass == 'ELFCLASS64' else 'ELF32'}"
 
     machine = header['e_machine']
-    print(f"    Architecture  : {machine}")
+    yield f"    Architecture  : {machine}"
 
     endian = header['e_ident']['EI_DATA']
-    print(f"    Endianness    : {'Little' if endian == 'ELFDATA2LSB' else 'Big'}")
+    yield f"    Endianness    : {'Little' if endian == 'ELFDATA2LSB' else 'Big'}"
 
     entry = header['e_entry']
-    print(f"    Entry point   : 0x{entry:x}")
+    yield f"    Entry point   : 0x{entry:x}"
 
-    print(f"    Sections      : {elf.num_sections()}")
-    print("    Section names :")
+    yield f"    Sections      : {elf.num_sections()}"
+    yield "    Section names :"
     for section in elf.iter_sections():
-        print(f"      - {section.name}")
+        yield f"      - {section.name}"
+
+
+def print_binary_info(elf):
+    for line in binary_info_lines(elf):
+        print(line)
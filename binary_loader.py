@@ -1,6 +1,127 @@
+import bisect
+import mmap
+from collections import namedtuple
+
 from elftools.elf.elffile import ELFFile
 
+from profiling import span
+
+# A named, zero-copy window over the mapped file
+Region = namedtuple("Region", "name offset vaddr size data")
+
+
+class Binary:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        # ACCESS_COPY keeps the mapping private but writable, which lets
+        # ctypes-based consumers (Capstone) borrow slices without a copy.
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.view = memoryview(self.map)
+        self.elf = ELFFile(self.map)
+
+        self._sections = None
+        self._segments = None
+        self._segment_starts = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.map)
+
+    def sections(self):
+        if self._sections is None:
+            self._parse_sections()
+        return list(self._sections.values())
+
+    def _parse_sections(self):
+        with span("parse_sections") as s:
+            self._sections = {}
+            for section in self.elf.iter_sections():
+                if not section.name:
+                    continue
+                offset = section['sh_offset']
+                size = 0 if section['sh_type'] == 'SHT_NOBITS' else section['sh_size']
+                self._sections[section.name] = Region(
+                    section.name, offset, section['sh_addr'], size,
+                    self.view[offset:offset + size]
+                )
+            s.count(sections=len(self._sections))
+
+    def section(self, name):
+        if self._sections is None:
+            self._parse_sections()
+        return self._sections.get(name)
+
+    def segments(self):
+        if self._segments is None:
+            self._segments = []
+            for i, segment in enumerate(self.elf.iter_segments()):
+                if segment['p_type'] != 'PT_LOAD':
+                    continue
+                offset = segment['p_offset']
+                size = segment['p_filesz']
+                self._segments.append(Region(
+                    f"LOAD{i}", offset, segment['p_vaddr'], size,
+                    self.view[offset:offset + size]
+                ))
+            self._segments.sort(key=lambda r: r.vaddr)
+            self._segment_starts = [r.vaddr for r in self._segments]
+        return self._segments
+
+    def address_ranges(self):
+        # Mapped [start, end) ranges including zero-filled tails such as .bss
+        return sorted(
+            (seg['p_vaddr'], seg['p_vaddr'] + seg['p_memsz'])
+            for seg in self.elf.iter_segments()
+            if seg['p_type'] == 'PT_LOAD'
+        )
+
+    def vaddr_to_offset(self, vaddr):
+        segments = self.segments()
+        i = bisect.bisect_right(self._segment_starts, vaddr) - 1
+        if i < 0:
+            return None
+        seg = segments[i]
+        if vaddr >= seg.vaddr + seg.size:
+            return None
+        return seg.offset + (vaddr - seg.vaddr)
+
+    def offset_to_vaddr(self, offset):
+        for seg in self.segments():
+            if seg.offset <= offset < seg.offset + seg.size:
+                return seg.vaddr + (offset - seg.offset)
+        return None
+
+    def read(self, vaddr, size=None):
+        # File-backed bytes from vaddr, clipped to the end of its segment
+        offset = self.vaddr_to_offset(vaddr)
+        if offset is None:
+            return None
+        seg = self._segments[bisect.bisect_right(self._segment_starts, vaddr) - 1]
+        end = seg.offset + seg.size
+        if size is not None:
+            end = min(end, offset + size)
+        return self.view[offset:end]
+
+    def close(self):
+        self._sections = self._segments = None
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Views handed out to callers are still alive; the mapping is
+            # released when the last of them is collected.
+            pass
+        self.file.close()
+
+
 def load_binary(path):
-    f = open(path, 'rb')  
-    elffile = ELFFile(f)
-    return elffile, f 
\ No newline at end of file
+    with span("load_binary") as s:
+        binary = Binary(path)
+        s.count(bytes=len(binary))
+    return binary
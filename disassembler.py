@@ -1,12 +1,318 @@
+import bisect
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 from capstone import Cs, CS_ARCH_X86, CS_MODE_64
 
-def disassemble(code, addr):
-    md = Cs(CS_ARCH_X86, CS_MODE_64)
-    instructions = []
-    for i in md.disasm(code, addr):
-        instructions.append({
-            'address': i.address,
-            'mnemonic': i.mnemonic,
-            'op_str': i.op_str
-        })
-    return instructions
+from profiling import span
+
+MAX_INSN_SIZE = 15
+DECODE_WINDOW = 1 << 16
+MIN_SHARD_SIZE = 1 << 16
+
+_md = None
+_md_detail = None
+
+
+def get_handle():
+    # Capstone handles are costly to open; one per process is enough
+    global _md
+    if _md is None:
+        _md = Cs(CS_ARCH_X86, CS_MODE_64)
+    return _md
+
+
+def get_detail_handle():
+    global _md_detail
+    if _md_detail is None:
+        _md_detail = Cs(CS_ARCH_X86, CS_MODE_64)
+        _md_detail.detail = True
+    return _md_detail
+
+
+def decode_detailed(code, addr, address, size=MAX_INSN_SIZE):
+    # Single instruction at `address` with operand details, or None if invalid
+    offset = address - addr
+    view = memoryview(code)[offset:offset + size]
+    return next(get_detail_handle().disasm(view, address, 1), None)
+
+
+class Instruction:
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def address(self):
+        return self.table.addresses[self.index]
+
+    @property
+    def size(self):
+        return self.table.sizes[self.index]
+
+    @property
+    def mnemonic(self):
+        return self.table.mnemonics[self.table.mnemonic_ids[self.index]]
+
+    @property
+    def op_str(self):
+        return self.table.op_strs[self.index]
+
+    # Dict-style access, so code written against the old list of dicts keeps working
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"<Instruction 0x{self.address:x}: {self.mnemonic} {self.op_str}>"
+
+
+class InstructionTable:
+    def __init__(self, mnemonics=None, mnemonic_index=None):
+        self.addresses = array('Q')
+        self.sizes = array('B')
+        self.mnemonic_ids = array('H')
+        self.op_strs = []
+        # Interned mnemonic strings, shared with slices of this table
+        self.mnemonics = [] if mnemonics is None else mnemonics
+        self._mnemonic_index = {} if mnemonic_index is None else mnemonic_index
+
+    @classmethod
+    def from_code(cls, code, addr, progress=None):
+        table = cls()
+        table.decode(code, addr, progress)
+        return table
+
+    # Appends the linear sweep of `code` and returns the address it stopped at.
+    # progress(done, total) is called after every window and may raise to abort.
+    def decode(self, code, addr, progress=None):
+        md = get_handle()
+        view = memoryview(code)
+        total = len(view)
+
+        add_addr = self.addresses.append
+        add_size = self.sizes.append
+        add_mid = self.mnemonic_ids.append
+        add_op = self.op_strs.append
+        intern = self.intern
+
+        # Decode in bounded windows so Capstone never materialises the whole
+        # section at once; a window that stops within MAX_INSN_SIZE of its end
+        # hit a truncated instruction and resumes, anything else is invalid
+        # code and ends the sweep like a single disasm call would.
+        pos = stop = 0
+        while pos < total:
+            end = min(pos + DECODE_WINDOW, total)
+            for address, size, mnemonic, op_str in md.disasm_lite(view[pos:end], addr + pos):
+                add_addr(address)
+                add_size(size)
+                add_mid(intern(mnemonic))
+                add_op(op_str)
+                stop = address + size - addr
+            if progress is not None:
+                progress(stop, total)
+            if stop == pos or end == total or end - stop >= MAX_INSN_SIZE:
+                break
+            pos = stop
+        return addr + stop
+
+    def intern(self, mnemonic):
+        mid = self._mnemonic_index.get(mnemonic)
+        if mid is None:
+            mid = self._mnemonic_index[mnemonic] = len(self.mnemonics)
+            self.mnemonics.append(mnemonic)
+        return mid
+
+    def extend(self, other, start=0):
+        if other.mnemonics is self.mnemonics:
+            self.mnemonic_ids.extend(other.mnemonic_ids[start:])
+        else:
+            remap = [self.intern(m) for m in other.mnemonics]
+            self.mnemonic_ids.extend(remap[m] for m in other.mnemonic_ids[start:])
+        self.addresses.extend(other.addresses[start:])
+        self.sizes.extend(other.sizes[start:])
+        self.op_strs.extend(other.op_strs[start:])
+
+    def append(self, address, size, mnemonic, op_str):
+        self.addresses.append(address)
+        self.sizes.append(size)
+        self.mnemonic_ids.append(self.intern(mnemonic))
+        self.op_strs.append(op_str)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __iter__(self):
+        for i in range(len(self.addresses)):
+            yield Instruction(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self.addresses))
+            if step != 1:
+                raise ValueError("InstructionTable slices must be contiguous")
+            return self._slice(start, stop)
+        if key < 0:
+            key += len(self.addresses)
+        if not 0 <= key < len(self.addresses):
+            raise IndexError("instruction index out of range")
+        return Instruction(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, InstructionTable):
+            return NotImplemented
+        return (
+            self.addresses == other.addresses
+            and self.sizes == other.sizes
+            and self.op_strs == other.op_strs
+            and [self.mnemonics[m] for m in self.mnemonic_ids]
+            == [other.mnemonics[m] for m in other.mnemonic_ids]
+        )
+
+    def _slice(self, start, stop):
+        sub = InstructionTable(self.mnemonics, self._mnemonic_index)
+        sub.addresses = self.addresses[start:stop]
+        sub.sizes = self.sizes[start:stop]
+        sub.mnemonic_ids = self.mnemonic_ids[start:stop]
+        sub.op_strs = self.op_strs[start:stop]
+        return sub
+
+    def index_of(self, address):
+        i = bisect.bisect_left(self.addresses, address)
+        if i < len(self.addresses) and self.addresses[i] == address:
+            return i
+        return None
+
+    def slice_range(self, start, end):
+        lo = bisect.bisect_left(self.addresses, start)
+        hi = bisect.bisect_left(self.addresses, end)
+        return self._slice(lo, hi)
+
+    def rows(self):
+        mnemonics = self.mnemonics
+        return zip(
+            self.addresses,
+            self.sizes,
+            (mnemonics[m] for m in self.mnemonic_ids),
+            self.op_strs,
+        )
+
+
+# ---------------- Parallel sweep ----------------
+
+def plan_shards(addr, size, jobs, boundaries=()):
+    end = addr + size
+    target = max(MIN_SHARD_SIZE, size // (jobs * 4))
+    cuts = sorted({b for b in boundaries if addr < b < end})
+    if not cuts:
+        cuts = range(addr + target, end, target)
+
+    shards = []
+    start = addr
+    for cut in cuts:
+        if cut - start >= target:
+            shards.append((start, cut))
+            start = cut
+    shards.append((start, end))
+    return shards
+
+
+# Set in the parent right before the pool forks; workers inherit the
+# (possibly mmap-backed) buffer instead of receiving pickled slices.
+_shard_code = None
+
+
+def _decode_shard(addr, start, end):
+    view = memoryview(_shard_code)
+    limit = min(end - addr + MAX_INSN_SIZE, len(view))
+    table = InstructionTable()
+
+    # A shard may start in the middle of an instruction or inside data, so
+    # invalid bytes are skipped rather than ending the sweep. `gaps` holds the
+    # row indices that do not follow on from the previous row.
+    gaps = []
+    pos = start
+    while pos < end:
+        pos = table.decode(view[pos - addr:limit], pos)
+        if pos >= end:
+            break
+        if not gaps or gaps[-1] != len(table):
+            gaps.append(len(table))
+        pos += 1
+
+    keep = bisect.bisect_left(table.addresses, end)
+    if keep < len(table):
+        table = table[:keep]
+        gaps = [g for g in gaps if g < keep]
+    stop = table.addresses[-1] + table.sizes[-1] if len(table) else start
+    return table, gaps, stop
+
+
+def _merge_shards(code, addr, shards, results):
+    md = get_handle()
+    view = memoryview(code)
+    merged = InstructionTable()
+    pos = addr
+
+    for (start, end), (table, gaps, stop) in zip(shards, results):
+        if pos >= end:
+            continue
+
+        # The previous shard's last instruction may straddle into this one;
+        # sweep serially from there until we land on an address the shard
+        # also decoded, after which both sweeps are identical.
+        idx = table.index_of(pos)
+        while idx is None and pos < end:
+            insn = next(md.disasm_lite(view[pos - addr:pos - addr + MAX_INSN_SIZE], pos, 1), None)
+            if insn is None:
+                return merged
+            merged.append(*insn)
+            pos += insn[1]
+            idx = table.index_of(pos)
+        if idx is None:
+            continue
+
+        gap = next((g for g in gaps if g > idx), None)
+        if gap is not None:
+            # The serial sweep hits the same invalid bytes and stops there
+            merged.extend(table[idx:gap])
+            return merged
+
+        merged.extend(table, idx)
+        pos = stop
+
+    return merged
+
+
+def disassemble_parallel(code, addr, jobs, boundaries=()):
+    global _shard_code
+
+    shards = plan_shards(addr, len(code), jobs, boundaries)
+    if len(shards) == 1:
+        return InstructionTable.from_code(code, addr)
+
+    _shard_code = code
+    try:
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            results = list(pool.map(
+                _decode_shard, [addr] * len(shards), *zip(*shards)
+            ))
+    finally:
+        _shard_code = None
+
+    return _merge_shards(code, addr, shards, results)
+
+
+def disassemble(code, addr, jobs=1, boundaries=(), progress=None):
+    with span("disassemble", bytes=len(code), jobs=jobs) as s:
+        if jobs > 1:
+            table = disassemble_parallel(code, addr, jobs, boundaries)
+        else:
+            table = InstructionTable.from_code(code, addr, progress)
+        s.count(instructions=len(table))
+    return table
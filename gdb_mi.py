@@ -0,0 +1,523 @@
+import asyncio
+import codecs
+import os
+import re
+import termios
+import threading
+from collections import OrderedDict, namedtuple
+
+# One parsed line of GDB/MI output. kind is "result", "exec", "status",
+# "notify", "console", "target", "log" or "prompt"; cls is the result or
+# async class ("done", "stopped", ...) and results a dict, or the text of a
+# stream record.
+Record = namedtuple("Record", "token kind cls results")
+Breakpoint = namedtuple("Breakpoint", "number type enabled addr func file line hits")
+StopEvent = namedtuple("StopEvent", "reason thread_id addr func frame raw")
+
+_KINDS = {"^": "result", "*": "exec", "+": "status", "=": "notify",
+          "~": "console", "@": "target", "&": "log"}
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\", "a": "\a",
+            "b": "\b", "f": "\f", "v": "\v", "e": "\x1b"}
+_TOKEN = re.compile(r"\d*")
+_WORD = re.compile(r"[\w-]+")
+READ_SIZE = 64 << 10
+
+
+class MIError(Exception):
+    pass
+
+
+class MIParser:
+    def __init__(self, line):
+        self.s = line
+        self.i = 0
+
+    def record(self):
+        s = self.s
+        if s.startswith("(gdb)"):
+            return Record(None, "prompt", None, None)
+        token = _TOKEN.match(s).group()
+        self.i = len(token)
+        kind = _KINDS.get(s[self.i:self.i + 1])
+        if kind is None:
+            return None
+        self.i += 1
+        if kind in ("console", "target", "log"):
+            return Record(None, kind, None, self.cstring())
+        cls = self.word()
+        results = {}
+        while self.peek(","):
+            self.i += 1
+            name, value = self.result()
+            results[name] = value
+        return Record(int(token) if token else None, kind, cls, results)
+
+    def peek(self, char):
+        return self.s[self.i:self.i + 1] == char
+
+    def word(self):
+        m = _WORD.match(self.s, self.i)
+        if not m:
+            raise MIError(f"Malformed MI record: {self.s!r}")
+        self.i = m.end()
+        return m.group()
+
+    def result(self):
+        name = self.word()
+        if not self.peek("="):
+            raise MIError(f"Malformed MI record: {self.s!r}")
+        self.i += 1
+        return name, self.value()
+
+    def value(self):
+        c = self.s[self.i:self.i + 1]
+        if c == '"':
+            return self.cstring()
+        if c == "{":
+            self.i += 1
+            tup = {}
+            while not self.peek("}"):
+                name, value = self.result()
+                tup[name] = value
+                if self.peek(","):
+                    self.i += 1
+            self.i += 1
+            return tup
+        if c == "[":
+            # Lists hold either values or name=value results; names are dropped
+            self.i += 1
+            items = []
+            while not self.peek("]"):
+                if self.s[self.i] in '"{[':
+                    items.append(self.value())
+                else:
+                    items.append(self.result()[1])
+                if self.peek(","):
+                    self.i += 1
+            self.i += 1
+            return items
+        raise MIError(f"Malformed MI record: {self.s!r}")
+
+    def cstring(self):
+        s = self.s
+        i = self.i + 1
+        out = []
+        while i < len(s) and s[i] != '"':
+            if s[i] == "\\" and i + 1 < len(s):
+                nxt = s[i + 1]
+                if nxt in "01234567":
+                    digits = re.match(r"[0-7]{1,3}", s[i + 1:]).group()
+                    out.append(chr(int(digits, 8)))
+                    i += 1 + len(digits)
+                    continue
+                out.append(_ESCAPES.get(nxt, nxt))
+                i += 2
+                continue
+            out.append(s[i])
+            i += 1
+        self.i = i + 1
+        return "".join(out)
+
+
+def parse_record(line):
+    # Record for one line of MI output, or None for non-MI text such as the
+    # inferior's own output
+    line = line.rstrip("\r\n")
+    try:
+        return MIParser(line).record()
+    except (MIError, IndexError):
+        return None
+
+
+def quote(arg):
+    # MI c-string quoting for command arguments
+    arg = str(arg)
+    if arg and not re.search(r'[\s"\\]', arg):
+        return arg
+    return '"' + arg.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def _int(value):
+    try:
+        return int(value, 0)
+    except (TypeError, ValueError):
+        return value
+
+
+def _breakpoint(bkpt):
+    line = bkpt.get("line")
+    return Breakpoint(
+        int(bkpt.get("number", 0)), bkpt.get("type"), bkpt.get("enabled") == "y",
+        _int(bkpt.get("addr")), bkpt.get("func"), bkpt.get("fullname") or bkpt.get("file"),
+        int(line) if line else None, int(bkpt.get("times", 0)),
+    )
+
+
+class GDBMIController:
+    # Asyncio driver for `gdb --interpreter=mi3`. Every command carries a
+    # numeric token and its ^result is routed back to the awaiting caller;
+    # stream, notify and exec records go to the optional callbacks. The
+    # inferior gets a pty of its own (-inferior-tty-set), so its output never
+    # interleaves with MI records; it reaches on_stream as "target" text.
+    def __init__(self, gdb="gdb", on_stream=None, on_stop=None, on_notify=None, on_exit=None):
+        self.gdb = gdb
+        self.on_stream = on_stream
+        self.on_stop = on_stop
+        self.on_notify = on_notify
+        self.on_exit = on_exit
+
+        self.proc = None
+        self.running = False
+        self.last_stop = None
+        self.stop_count = 0
+        self._token = 0
+        self._pending = {}
+        self._reader = None
+        self._stopped = None
+        self._tty = None
+        self._tty_decoder = None
+
+        self._register_names = None
+        self._registers = {}
+        self._registers_stale = True
+
+    async def start(self, binary=None, args=()):
+        argv = [self.gdb, "--interpreter=mi3", "--quiet", "-nx", *args]
+        if binary:
+            argv.append(binary)
+        self.proc = await asyncio.create_subprocess_exec(
+            *argv, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        self._stopped = asyncio.Event()
+        self._reader = asyncio.ensure_future(self._read())
+        await self._open_tty()
+        return self
+
+    async def _open_tty(self):
+        master, slave = os.openpty()
+        # No \n -> \r\n translation; the console shows the text as is
+        attrs = termios.tcgetattr(slave)
+        attrs[1] &= ~termios.OPOST
+        termios.tcsetattr(slave, termios.TCSANOW, attrs)
+        os.set_blocking(master, False)
+        # The slave stays open here so that the master does not hit EOF
+        # every time one inferior exits and the next run starts
+        self._tty = (master, slave)
+        self._tty_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        asyncio.get_running_loop().add_reader(master, self._read_tty)
+        await self.command("-inferior-tty-set", os.ttyname(slave))
+
+    def _read_tty(self):
+        # Everything the inferior has written so far; stops reading at EOF
+        master = self._tty[0]
+        while True:
+            try:
+                data = os.read(master, READ_SIZE)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b""
+            if not data:
+                asyncio.get_running_loop().remove_reader(master)
+                return
+            text = self._tty_decoder.decode(data)
+            if text and self.on_stream:
+                self.on_stream("target", text)
+
+    def _close_tty(self):
+        if self._tty is None:
+            return
+        # Whatever the inferior wrote last is still delivered
+        self._read_tty()
+        master, slave = self._tty
+        self._tty = None
+        asyncio.get_running_loop().remove_reader(master)
+        os.close(master)
+        os.close(slave)
+
+    async def close(self):
+        if self.proc is None:
+            return
+        if self.proc.returncode is None:
+            try:
+                self.proc.stdin.write(b"-gdb-exit\n")
+                await self.proc.stdin.drain()
+                await asyncio.wait_for(self.proc.wait(), 2)
+            except (OSError, asyncio.TimeoutError):
+                self.proc.kill()
+                await self.proc.wait()
+        if self._reader is not None:
+            await self._reader
+        self._close_tty()
+
+    async def _read(self):
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                break
+            text = line.decode(errors="replace")
+            record = parse_record(text)
+            if record is None:
+                # gdb's own stderr, or an inferior started without the pty
+                if self.on_stream:
+                    self.on_stream("target", text)
+                continue
+            self._dispatch(record)
+
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(MIError("gdb exited"))
+        self._pending.clear()
+        if self.on_exit:
+            self.on_exit()
+
+    def _dispatch(self, record):
+        kind = record.kind
+        if kind == "result":
+            future = self._pending.pop(record.token, None)
+            if future is not None and not future.done():
+                if record.cls == "error":
+                    future.set_exception(MIError(record.results.get("msg", "unknown error")))
+                else:
+                    future.set_result(record.results)
+            if record.cls == "running":
+                self._set_running()
+        elif kind == "exec":
+            if record.cls == "running":
+                self._set_running()
+            elif record.cls == "stopped":
+                self._set_stopped(record.results)
+        elif kind in ("console", "target", "log"):
+            if self.on_stream:
+                self.on_stream(kind, record.results)
+        elif kind == "notify" and self.on_notify:
+            self.on_notify(record.cls, record.results)
+
+    def _set_running(self):
+        self.running = True
+        self._stopped.clear()
+
+    def _set_stopped(self, results):
+        frame = results.get("frame", {})
+        event = StopEvent(
+            results.get("reason"), results.get("thread-id"),
+            _int(frame.get("addr")), frame.get("func"), frame, results,
+        )
+        self.running = False
+        self.last_stop = event
+        self.stop_count += 1
+        self._registers_stale = True
+        self._stopped.set()
+        if self.on_stop:
+            self.on_stop(event)
+
+    async def command(self, operation, *args):
+        # Sends one MI command and returns its ^done/^running results
+        if self.proc is None or self.proc.returncode is not None:
+            raise MIError("gdb is not running")
+        self._token += 1
+        token = self._token
+        future = self._pending[token] = asyncio.get_running_loop().create_future()
+        line = " ".join([f"{token}{operation}", *(quote(a) for a in args)])
+        self.proc.stdin.write(line.encode() + b"\n")
+        await self.proc.stdin.drain()
+        return await future
+
+    async def console(self, line):
+        # Runs a plain CLI command; its output arrives as console stream records
+        return await self.command("-interpreter-exec", "console", line)
+
+    async def wait_for_stop(self, timeout=None):
+        await asyncio.wait_for(self._stopped.wait(), timeout)
+        return self.last_stop
+
+    # ---------------- Execution ----------------
+
+    async def run(self):
+        return await self.command("-exec-run")
+
+    async def cont(self):
+        return await self.command("-exec-continue")
+
+    async def step(self):
+        return await self.command("-exec-step")
+
+    async def next(self):
+        return await self.command("-exec-next")
+
+    async def stepi(self):
+        return await self.command("-exec-step-instruction")
+
+    async def nexti(self):
+        return await self.command("-exec-next-instruction")
+
+    async def finish(self):
+        return await self.command("-exec-finish")
+
+    async def interrupt(self):
+        return await self.command("-exec-interrupt")
+
+    # ---------------- Breakpoints ----------------
+
+    async def break_insert(self, location, temporary=False, condition=None):
+        args = ["-t"] if temporary else []
+        if condition:
+            args += ["-c", condition]
+        results = await self.command("-break-insert", *args, location)
+        return _breakpoint(results["bkpt"])
+
+    async def break_delete(self, *numbers):
+        if not numbers:
+            numbers = [bp.number for bp in await self.breakpoints()]
+        if numbers:
+            await self.command("-break-delete", *numbers)
+
+    async def breakpoints(self):
+        results = await self.command("-break-list")
+        return [_breakpoint(b) for b in results.get("BreakpointTable", {}).get("body", [])]
+
+    # ---------------- Registers and memory ----------------
+
+    async def register_names(self):
+        if self._register_names is None:
+            results = await self.command("-data-list-register-names")
+            self._register_names = results["register-names"]
+        return self._register_names
+
+    async def registers(self):
+        # name -> value. After a stop only the registers GDB reports as
+        # changed are fetched again; the rest come from the previous stop.
+        names = await self.register_names()
+        if self._registers_stale:
+            if self._registers:
+                changed = (await self.command("-data-list-changed-registers"))["changed-registers"]
+            else:
+                changed = None
+            if changed is None or changed:
+                numbers = changed or []
+                results = await self.command("-data-list-register-values", "x", *numbers)
+                for reg in results["register-values"]:
+                    number = int(reg["number"])
+                    if number < len(names) and names[number]:
+                        self._registers[names[number]] = _int(reg["value"])
+            self._registers_stale = False
+        return dict(self._registers)
+
+    async def read_memory(self, address, size):
+        # Bytes at [address, address + size); unreadable ranges raise MIError
+        results = await self.command("-data-read-memory-bytes", hex(address), size)
+        data = bytearray()
+        for block in results["memory"]:
+            begin = _int(block["begin"])
+            offset = begin - address
+            if offset > len(data):
+                raise MIError(f"Cannot access memory at 0x{address + len(data):x}")
+            data[offset:] = bytes.fromhex(block["contents"])
+        if len(data) < size:
+            raise MIError(f"Cannot access memory at 0x{address + len(data):x}")
+        return bytes(data)
+
+
+class PageCache:
+    # Page-granular cache of inferior memory over a GDBMIController. Missing
+    # pages of a request are fetched in as few -data-read-memory-bytes calls
+    # as possible (one per contiguous run); unreadable pages are remembered
+    # as None. Everything is dropped whenever the inferior stops or resumes.
+    def __init__(self, gdb, page_size=4096, max_pages=1024):
+        self.gdb = gdb
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self._generation = None
+        self._prefetch = None
+
+    def _check_generation(self):
+        generation = (self.gdb.stop_count, self.gdb.running)
+        if generation != self._generation:
+            self.pages.clear()
+            self._generation = generation
+
+    async def _fetch(self, first, count):
+        size = self.page_size
+        try:
+            data = await self.gdb.read_memory(first * size, count * size)
+            for i in range(count):
+                self._put(first + i, data[i * size:(i + 1) * size])
+            return
+        except MIError:
+            if count == 1:
+                self._put(first, None)
+                return
+        # Part of the run is unmapped; split it so the readable pages survive
+        half = count // 2
+        await self._fetch(first, half)
+        await self._fetch(first + half, count - half)
+
+    def _put(self, page, data):
+        self.pages[page] = data
+        self.pages.move_to_end(page)
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+    async def load(self, address, size):
+        # Makes sure every page touching [address, address + size) is cached
+        self._check_generation()
+        first = address // self.page_size
+        last = (address + max(size, 1) - 1) // self.page_size
+        runs = []
+        for page in range(first, last + 1):
+            if page in self.pages:
+                self.pages.move_to_end(page)
+            elif runs and runs[-1][0] + runs[-1][1] == page:
+                runs[-1][1] += 1
+            else:
+                runs.append([page, 1])
+        for start, count in runs:
+            await self._fetch(start, count)
+
+    async def read(self, address, size):
+        # Bytes of the readable prefix of [address, address + size)
+        await self.load(address, size)
+        out = bytearray()
+        pos, end = address, address + size
+        while pos < end:
+            page, offset = divmod(pos, self.page_size)
+            data = self.pages.get(page)
+            if data is None:
+                break
+            chunk = data[offset:offset + end - pos]
+            out += chunk
+            pos += len(chunk)
+        return bytes(out)
+
+    def prefetch(self, address, size):
+        # Loads the pages just before and after a window in the background
+        if self._prefetch is not None and not self._prefetch.done():
+            return
+        span = max(size, self.page_size)
+
+        async def run():
+            try:
+                await self.load(max(0, address - span), span)
+                await self.load(address + size, span)
+            except MIError:
+                pass
+
+        self._prefetch = asyncio.ensure_future(run())
+
+
+class MIThread:
+    # Hosts an event loop on a daemon thread so Tk code can drive a
+    # GDBMIController: submit() schedules a coroutine and returns a
+    # concurrent.futures.Future.
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
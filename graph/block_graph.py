@@ -0,0 +1,349 @@
+import bisect
+from array import array
+from collections import namedtuple
+
+from profiling import span
+
+# Compact control flow graph: blocks are numbered 0..n-1 in address order
+# and edges live in CSR form, one flat array of successor ids indexed by a
+# per-block offset array, with the reverse (predecessor) arrays built
+# alongside. A block's instructions are a (first row, count) pair into a
+# shared InstructionTable and are only sliced out when asked for. networkx
+# is only imported by to_networkx(), for the viewer.
+
+Loop = namedtuple("Loop", "header latches blocks")
+
+
+def _csr(count, sources, targets):
+    # (index, adjacency): adjacency[index[b]:index[b + 1]] are b's targets
+    index = array('I', bytes(4 * (count + 1)))
+    for s in sources:
+        index[s + 1] += 1
+    for b in range(count):
+        index[b + 1] += index[b]
+    if all(sources[i] <= sources[i + 1] for i in range(len(sources) - 1)):
+        return index, array('I', targets)
+    adjacency = array('I', bytes(4 * len(targets)))
+    fill = index[:-1]
+    for s, t in zip(sources, targets):
+        adjacency[fill[s]] = t
+        fill[s] += 1
+    return index, adjacency
+
+
+class BlockGraph:
+    def __init__(self, instructions, rows, counts, sources=(), targets=(), entries=()):
+        # rows/counts: first instruction row and instruction count per block,
+        # in ascending address order; sources/targets: edges as block ids
+        self.instructions = instructions
+        self.rows = array('I', rows)
+        self.counts = array('I', counts)
+        addresses = instructions.addresses
+        self.starts = array('Q', (addresses[r] for r in self.rows))
+        sources = array('I', sources)
+        targets = array('I', targets)
+        self.succ_index, self.succ = _csr(len(self.rows), sources, targets)
+        self.pred_index, self.pred = _csr(len(self.rows), targets, sources)
+        # Blocks control enters from outside the graph (function entries)
+        self.entries = tuple(entries)
+
+    @classmethod
+    def from_address_edges(cls, instructions, rows, counts, edges, entries=()):
+        # Same, with edges and entries given as block start addresses
+        addresses = instructions.addresses
+        block = {addresses[r]: b for b, r in enumerate(rows)}
+        pairs = sorted({(block[s], block[d]) for s, d in edges if s in block and d in block})
+        return cls(
+            instructions, rows, counts, [s for s, _ in pairs], [d for _, d in pairs],
+            [block[e] for e in entries if e in block],
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def edge_count(self):
+        return len(self.succ)
+
+    def successors(self, b):
+        return self.succ[self.succ_index[b]:self.succ_index[b + 1]]
+
+    def predecessors(self, b):
+        return self.pred[self.pred_index[b]:self.pred_index[b + 1]]
+
+    def edges(self):
+        # (source id, target id) in source order
+        succ, index = self.succ, self.succ_index
+        for b in range(len(self.rows)):
+            for i in range(index[b], index[b + 1]):
+                yield b, succ[i]
+
+    def address_edges(self):
+        starts = self.starts
+        return ((starts[s], starts[d]) for s, d in self.edges())
+
+    def block_at(self, addr):
+        # Id of the block starting at `addr`, or None
+        b = bisect.bisect_left(self.starts, addr)
+        return b if b < len(self.starts) and self.starts[b] == addr else None
+
+    def block_containing(self, addr):
+        b = bisect.bisect_right(self.starts, addr) - 1
+        if b < 0:
+            return None
+        last = self.rows[b] + self.counts[b] - 1
+        table = self.instructions
+        if addr < table.addresses[last] + table.sizes[last]:
+            return b
+        return None
+
+    def block_instructions(self, b):
+        row = self.rows[b]
+        return self.instructions[row:row + self.counts[b]]
+
+    def roots(self):
+        # Entries if known, else one block of every strongly connected
+        # component nothing else leads into
+        if self.entries:
+            return list(self.entries)
+        components = strongly_connected_components(self)
+        component = array('i', bytes(4 * len(self)))
+        for c, blocks in enumerate(components):
+            for b in blocks:
+                component[b] = c
+        entered = set()
+        for s, d in self.edges():
+            if component[s] != component[d]:
+                entered.add(component[d])
+        return sorted(min(blocks) for c, blocks in enumerate(components) if c not in entered)
+
+    def to_networkx(self):
+        # DiGraph keyed by block address with "instructions" slices, the
+        # shape graph.cfg_visualizer and graph.layout work with
+        import networkx as nx
+
+        cfg = nx.DiGraph()
+        starts = self.starts
+        cfg.add_nodes_from(
+            (starts[b], {"instructions": self.block_instructions(b)}) for b in range(len(self))
+        )
+        cfg.add_edges_from(self.address_edges())
+        return cfg
+
+
+# ---------------- Analyses ----------------
+
+def reverse_postorder(graph, roots=None):
+    # Blocks reachable from `roots` (default graph.roots()) in reverse postorder
+    if roots is None:
+        roots = graph.roots()
+    succ, index = graph.succ, graph.succ_index
+    seen = bytearray(len(graph))
+    postorder = []
+    for root in roots:
+        if seen[root]:
+            continue
+        seen[root] = 1
+        # (block, next successor offset) frames instead of recursion
+        stack = [(root, index[root])]
+        while stack:
+            b, i = stack[-1]
+            end = index[b + 1]
+            while i < end and seen[succ[i]]:
+                i += 1
+            if i < end:
+                stack[-1] = (b, i + 1)
+                d = succ[i]
+                seen[d] = 1
+                stack.append((d, index[d]))
+            else:
+                stack.pop()
+                postorder.append(b)
+    postorder.reverse()
+    return postorder
+
+
+class DominatorTree:
+    # Immediate dominators by the Cooper-Harvey-Kennedy iterative algorithm
+    # ("A Simple, Fast Dominance Algorithm"). Several roots are handled as
+    # children of a virtual root; idom is -1 for the roots, for blocks only
+    # the virtual root dominates and for every block the roots do not reach.
+    def __init__(self, graph, roots=None):
+        if roots is None:
+            roots = graph.roots()
+        count = len(graph)
+        virtual = count
+        order = reverse_postorder(graph, roots)
+        rank = array('i', [-1]) * (count + 1)
+        for i, b in enumerate(order):
+            rank[b] = len(order) - i          # postorder number + 1
+        rank[virtual] = len(order) + 1
+        idom = array('i', [-1]) * (count + 1)
+        idom[virtual] = virtual
+        root_set = set(roots)
+        for r in root_set:
+            idom[r] = virtual
+
+        pred, pred_index = graph.pred, graph.pred_index
+        changed = True
+        while changed:
+            changed = False
+            for b in order:
+                if b in root_set:
+                    continue
+                new = -1
+                for i in range(pred_index[b], pred_index[b + 1]):
+                    p = pred[i]
+                    if idom[p] == -1:
+                        continue
+                    if new == -1:
+                        new = p
+                        continue
+                    a = p
+                    while a != new:
+                        while rank[a] < rank[new]:
+                            a = idom[a]
+                        while rank[new] < rank[a]:
+                            new = idom[new]
+                if idom[b] != new:
+                    idom[b] = new
+                    changed = True
+
+        # Roots, and blocks only the virtual root dominates (reached from
+        # more than one root), have no immediate dominator among the blocks
+        for b in order:
+            if idom[b] == virtual:
+                idom[b] = -1
+        self.idom = idom[:count]
+        self.order = order
+        self._intervals = None
+
+    def _interval(self, b):
+        if self._intervals is None:
+            self._number()
+        return self._intervals.get(b)
+
+    def _number(self):
+        # Pre/post numbers on the dominator forest make dominates() O(1)
+        idom = self.idom
+        children = {}
+        roots = []
+        for b in self.order:
+            parent = idom[b]
+            if parent == -1:
+                roots.append(b)
+            else:
+                children.setdefault(parent, []).append(b)
+        intervals = {}
+        clock = 0
+        for root in roots:
+            stack = [(root, False)]
+            while stack:
+                b, done = stack.pop()
+                if done:
+                    intervals[b] = (intervals[b], clock)
+                    clock += 1
+                    continue
+                intervals[b] = clock
+                clock += 1
+                stack.append((b, True))
+                stack.extend((c, False) for c in children.get(b, ()))
+        self._intervals = intervals
+
+    def dominates(self, a, b):
+        # True if every path from the roots to b goes through a
+        outer = self._interval(a)
+        inner = self._interval(b)
+        if outer is None or inner is None:
+            return False
+        return outer[0] <= inner[0] and inner[1] <= outer[1]
+
+
+def natural_loops(graph, dominators=None):
+    # One Loop per header: the back edges latch -> header (header dominates
+    # latch) and every block that reaches a latch without passing the header
+    with span("natural_loops", blocks=len(graph)) as s:
+        if dominators is None:
+            dominators = DominatorTree(graph)
+        loops = _natural_loops(graph, dominators)
+        s.count(loops=len(loops))
+    return loops
+
+
+def _natural_loops(graph, dominators):
+    dominates = dominators.dominates
+    latches = {}
+    for b in dominators.order:
+        for d in graph.successors(b):
+            if dominates(d, b):
+                latches.setdefault(d, []).append(b)
+
+    pred, pred_index = graph.pred, graph.pred_index
+    # Blocks the roots never reach belong to no loop
+    reached = bytearray(len(graph))
+    for b in dominators.order:
+        reached[b] = 1
+    loops = []
+    for header in sorted(latches):
+        body = {header}
+        stack = [t for t in latches[header] if t != header]
+        body.update(stack)
+        while stack:
+            b = stack.pop()
+            for i in range(pred_index[b], pred_index[b + 1]):
+                p = pred[i]
+                if reached[p] and p not in body:
+                    body.add(p)
+                    stack.append(p)
+        loops.append(Loop(header, sorted(latches[header]), sorted(body)))
+    return loops
+
+
+def strongly_connected_components(graph):
+    # Tarjan's algorithm without recursion; components come out in reverse
+    # topological order, each as a list of block ids
+    count = len(graph)
+    succ, index = graph.succ, graph.succ_index
+    order = array('i', [-1]) * count
+    low = array('i', [0]) * count
+    on_stack = bytearray(count)
+    stack = []
+    components = []
+    clock = 0
+    for start in range(count):
+        if order[start] != -1:
+            continue
+        order[start] = low[start] = clock
+        clock += 1
+        stack.append(start)
+        on_stack[start] = 1
+        frames = [(start, index[start])]
+        while frames:
+            b, i = frames[-1]
+            if i < index[b + 1]:
+                frames[-1] = (b, i + 1)
+                d = succ[i]
+                if order[d] == -1:
+                    order[d] = low[d] = clock
+                    clock += 1
+                    stack.append(d)
+                    on_stack[d] = 1
+                    frames.append((d, index[d]))
+                elif on_stack[d] and order[d] < low[b]:
+                    low[b] = order[d]
+                continue
+            frames.pop()
+            if frames:
+                parent = frames[-1][0]
+                if low[b] < low[parent]:
+                    low[parent] = low[b]
+            if low[b] == order[b]:
+                component = []
+                while True:
+                    d = stack.pop()
+                    on_stack[d] = 0
+                    component.append(d)
+                    if d == b:
+                        break
+                components.append(component)
+    return components
@@ -0,0 +1,342 @@
+import bisect
+from array import array
+from collections import namedtuple
+
+from graph.block_graph import strongly_connected_components
+from profiling import span
+from symbol_extractor import _RIP_OPERAND
+
+# Whole-program call graph. Nodes are the functions found by
+# graph.discovery plus one external node per import (its PLT stub and GOT
+# slot both map to it); edges come from direct calls, tail jumps into
+# another entry, calls/jumps through [rip + disp] GOT slots and GOT loads
+# into registers.
+#
+# Transitive reachability is kept as one bitset (a Python int) per node:
+# bit j of reach[i] is set when i reaches j through at least one call. The
+# closure is built once over the SCC condensation and then patched when a
+# function's callees change (refresh_functions() after a newer discovery):
+# added edges are OR-ed into the node's ancestors, removed ones recompute
+# the ancestors only.
+
+FunctionSummary = namedtuple("FunctionSummary", "entry name kind size blocks instructions")
+
+KIND_FUNCTION = "function"
+KIND_IMPORT = "import"
+
+_IMPORT_SUFFIXES = ("@plt", "@got")
+
+
+def _bits(value):
+    # Indices of the set bits of a non-negative int, ascending
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+class _Adjacency:
+    # The CSR shape strongly_connected_components() walks
+    def __init__(self, successors):
+        self.succ = array('I')
+        self.succ_index = array('I', [0])
+        for targets in successors:
+            self.succ.extend(targets)
+            self.succ_index.append(len(self.succ))
+
+    def __len__(self):
+        return len(self.succ_index) - 1
+
+
+class CallGraph:
+    def __init__(self):
+        self.summaries = []     # node -> FunctionSummary
+        self.callees = []       # node -> set of nodes
+        self.callers = []       # node -> set of nodes
+        self.reach = []         # node -> int bitset of transitively called nodes
+        self.ids = {}           # entry address -> node
+        self.imports = {}       # PLT stub / GOT slot address -> import node
+        self.by_name = {}
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def add_function(self, entry, name, kind=KIND_FUNCTION, size=0, blocks=0, instructions=0):
+        # Node for `entry` (existing or new) with no callees yet
+        node = self.ids.get(entry)
+        if node is not None:
+            return node
+        node = len(self.summaries)
+        self.summaries.append(FunctionSummary(entry, name, kind, size, blocks, instructions))
+        self.callees.append(set())
+        self.callers.append(set())
+        self.reach.append(0)
+        self.ids[entry] = node
+        self.by_name.setdefault(name, node)
+        return node
+
+    def node(self, spec):
+        # Node for a name, "sub_<hex>", an address or an address string
+        if isinstance(spec, int):
+            return self.ids.get(spec)
+        node = self.by_name.get(spec)
+        if node is not None:
+            return node
+        if spec.startswith("sub_"):
+            spec = "0x" + spec[4:]
+        try:
+            return self.ids.get(int(spec, 0))
+        except ValueError:
+            return None
+
+    def add_import(self, name, addresses):
+        # External node for an imported function, found by any of `addresses`
+        node = self.by_name.get(name)
+        if node is None or self.summaries[node].kind != KIND_IMPORT:
+            node = self.add_function(addresses[0], name, KIND_IMPORT)
+        for address in addresses:
+            self.imports[address] = node
+            self.ids.setdefault(address, node)
+        return node
+
+    def name(self, node):
+        return self.summaries[node].name
+
+    def location(self, node):
+        # "0x<entry>" for code, "extern" for an import: its stub and slot
+        # are not where the function is
+        s = self.summaries[node]
+        return "extern" if s.kind == KIND_IMPORT else f"0x{s.entry:08x}"
+
+    def order(self, nodes=None):
+        # Functions by entry, then imports by name
+        def key(n):
+            s = self.summaries[n]
+            return (1, 0, s.name) if s.kind == KIND_IMPORT else (0, s.entry, s.name)
+        return sorted(range(len(self.summaries)) if nodes is None else nodes, key=key)
+
+    # ---------------- Updates ----------------
+
+    def _link(self, node, callees):
+        # Replaces the callee set; returns (added, removed)
+        old = self.callees[node]
+        new = set(callees)
+        added, removed = new - old, old - new
+        for c in added:
+            self.callers[c].add(node)
+        for c in removed:
+            self.callers[c].discard(node)
+        self.callees[node] = new
+        return added, removed
+
+    def update_function(self, entry, callees, **summary):
+        # Re-summarizes one function after its analysis changed and patches
+        # the closure. callees are nodes; summary fields (size, blocks, ...)
+        # are replaced when given.
+        node = self.ids[entry]
+        if summary:
+            self.summaries[node] = self.summaries[node]._replace(**summary)
+        added, removed = self._link(node, callees)
+        if removed:
+            self._close(self.ancestors(node) | {node})
+        elif added:
+            # Whatever reaches `node` now also reaches the new callees
+            gained = 0
+            for c in added:
+                gained |= (1 << c) | self.reach[c]
+            bit = 1 << node
+            reach = self.reach
+            for n in range(len(reach)):
+                if n == node or reach[n] & bit:
+                    reach[n] |= gained
+
+    def _close(self, nodes):
+        # Recomputes reach for `nodes`, which must hold every node that can
+        # reach one of them. Components are visited callees first, so each
+        # one only ORs finished sets.
+        members = sorted(nodes)
+        local = {n: i for i, n in enumerate(members)}
+        adjacency = _Adjacency(
+            sorted(local[c] for c in self.callees[n] if c in local) for n in members
+        )
+        reach = self.reach
+        for component in strongly_connected_components(adjacency):
+            group = {members[i] for i in component}
+            bits = 0
+            for n in group:
+                for c in self.callees[n]:
+                    bits |= 1 << c
+                    if c not in group:
+                        bits |= reach[c]
+            for n in group:
+                reach[n] = bits
+
+    def close(self):
+        self._close(range(len(self.summaries)))
+
+    # ---------------- Queries ----------------
+
+    def reaches(self, a, b):
+        return bool(self.reach[a] >> b & 1)
+
+    def reachable(self, node):
+        # Nodes transitively called from `node`
+        return list(_bits(self.reach[node]))
+
+    def ancestors(self, node):
+        # Nodes that transitively call `node`
+        bit = 1 << node
+        return {n for n, bits in enumerate(self.reach) if bits & bit}
+
+    def roots(self):
+        # Functions nothing calls
+        return [n for n in range(len(self.summaries)) if not self.callers[n]]
+
+
+def build_call_graph(discovery, index):
+    # discovery: graph.discovery.Discovery; index: SymbolIndex for names
+    with span("call_graph", functions=len(discovery.functions)) as s:
+        graph = _build(discovery, index)
+        s.count(nodes=len(graph), edges=sum(len(c) for c in graph.callees))
+    return graph
+
+
+def refresh_functions(graph, discovery, index, entries):
+    # Re-summarizes the functions at `entries` from a newer discovery (more
+    # seeds, more resolved jump tables) and patches the graph in place
+    # instead of rebuilding it. Returns their nodes.
+    scanner = _Scanner(graph, discovery, index)
+    nodes = []
+    for entry in entries:
+        rows = scanner.rows(entry)
+        blocks = discovery.functions[entry]
+        end = max(discovery.block_end(scanner.block_index[a]) for a in blocks)
+        nodes.append(graph.add_function(entry, _name(index, entry)))
+        graph.update_function(entry, scanner.callees(entry, rows), size=end - entry, blocks=len(blocks),
+                              instructions=sum(stop - start for start, stop in rows))
+    return nodes
+
+
+def _name(index, entry):
+    found = index.function_at(entry)
+    return found[2] if found is not None and found[0] == entry else f"sub_{entry:x}"
+
+
+def _build(discovery, index):
+    graph = CallGraph()
+    scanner = _Scanner(graph, discovery, index)
+
+    functions = []
+    for entry, end, count in discovery.boundaries():
+        rows = scanner.rows(entry)
+        size = sum(stop - start for start, stop in rows)
+        graph.add_function(entry, _name(index, entry), KIND_FUNCTION, end - entry, count, size)
+        functions.append((entry, rows))
+
+    # Imports: the PLT stub and the GOT slot of a symbol share one node
+    addresses = {}
+    for sym in sorted(index.symbols, key=lambda s: not s['name'].endswith("@plt")):
+        base, suffix = sym['name'][:-4], sym['name'][-4:]
+        if suffix in _IMPORT_SUFFIXES and sym['addr']:
+            addresses.setdefault(base, []).append(sym['addr'])
+    for base, found in addresses.items():
+        graph.add_import(base, found)
+
+    for entry, rows in functions:
+        graph._link(graph.ids[entry], scanner.callees(entry, rows))
+
+    graph.close()
+    return graph
+
+
+class _Scanner:
+    # Finds the callees of a function's blocks in one discovery
+    def __init__(self, graph, discovery, index):
+        self.graph = graph
+        self.discovery = discovery
+        self.index = index
+        self.block_index = {addr: b for b, addr in enumerate(discovery.block_addrs)}
+        self.bounds = discovery.bounds()
+        table = discovery.instructions
+        mnemonics = table.mnemonics
+        self.calls = {m for m, name in enumerate(mnemonics) if name.endswith("call")}
+        self.jumps = {m for m, name in enumerate(mnemonics) if name.endswith("jmp")}
+        self.loads = {m for m, name in enumerate(mnemonics) if name == "mov"}
+        interesting = self.calls | self.jumps | self.loads
+        # Rows worth a look, found once; each block bisects into them
+        self.hits = [i for i, m in enumerate(table.mnemonic_ids) if m in interesting]
+
+    def rows(self, entry):
+        # [(start, stop)] instruction rows of each block of the function
+        bounds = self.bounds
+        return [(bounds[b], bounds[b + 1]) for b in map(self.block_index.__getitem__, self.discovery.functions[entry])]
+
+    def _callee_at(self, target):
+        graph = self.graph
+        node = graph.ids.get(target)
+        if node is None:
+            # A symbol outside the discovered code, e.g. _init
+            found = self.index.function_at(target)
+            if found is not None and found[0] == target:
+                start, end, name = found
+                node = graph.add_function(start, name, KIND_FUNCTION, end - start)
+        return node
+
+    def callees(self, entry, rows):
+        graph = self.graph
+        table = self.discovery.instructions
+        mnemonic_ids, op_strs = table.mnemonic_ids, table.op_strs
+        addresses, sizes = table.addresses, table.sizes
+        jumps, loads, hits = self.jumps, self.loads, self.hits
+        callees = set()
+        for start, stop in rows:
+            for i in hits[bisect.bisect_left(hits, start):bisect.bisect_left(hits, stop)]:
+                m = mnemonic_ids[i]
+                op_str = op_strs[i]
+                if op_str[:2] == "0x" and m not in loads:
+                    try:
+                        target = int(op_str, 16)
+                    except ValueError:
+                        continue
+                    if m in jumps and (target == entry or target not in graph.ids):
+                        continue  # a jump inside the function
+                    callee = self._callee_at(target)
+                elif "rip" in op_str:
+                    rip = _RIP_OPERAND.search(op_str)
+                    if rip is None:
+                        continue
+                    disp = int(rip.group(2), 16)
+                    slot = addresses[i] + sizes[i] + (disp if rip.group(1) == "+" else -disp)
+                    callee = graph.imports.get(slot)
+                else:
+                    continue
+                if callee is not None:
+                    callees.add(callee)
+        return callees
+
+
+# ---------------- Export ----------------
+
+def call_graph_json(graph):
+    # Plain data for json.dump
+    return {"functions": [
+        {
+            "entry": None if s.kind == KIND_IMPORT else s.entry, "name": s.name, "kind": s.kind, "size": s.size,
+            "blocks": s.blocks, "instructions": s.instructions,
+            "callees": sorted(graph.name(c) for c in graph.callees[n]),
+            "callers": sorted(graph.name(c) for c in graph.callers[n]),
+            "reachable": len(graph.reachable(n)),
+        }
+        for n, s in enumerate(graph.summaries)
+    ]}
+
+
+def write_call_graph_dot(graph, out):
+    out.write("digraph callgraph {\n  node [shape=box, fontname=\"monospace\"];\n")
+    for n, s in enumerate(graph.summaries):
+        style = ", style=dashed" if s.kind == KIND_IMPORT else ""
+        out.write(f"  n{n} [label=\"{s.name}\\n{graph.location(n)}\"{style}];\n")
+    for n, targets in enumerate(graph.callees):
+        for c in sorted(targets):
+            out.write(f"  n{n} -> n{c};\n")
+    out.write("}\n")
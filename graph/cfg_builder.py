@@ -1,83 +1,251 @@
-import networkx as nx
-
-def build_cfg(instructions):
-    cfg = nx.DiGraph()
-    jump_mnemonics = (
-        "jmp", "je", "jne", "jg", "jl", "jz", "jnz", "ja", "jb", "call"
-    )
-    conditional_jumps = (
-        "je", "jne", "jg", "jl", "jz", "jnz", "ja", "jb"
-    )
-
-    jump_targets = {
-        int(instr["op_str"], 16)
-        for instr in instructions
-        if instr["mnemonic"].startswith(jump_mnemonics)
-        and instr.get("op_str", "").startswith("0x")
-    }
-
-    block_starts = set(jump_targets)
-    for i, instr in enumerate(instructions[:-1]):
-        if instr["mnemonic"].startswith(jump_mnemonics) or instr["mnemonic"].startswith("ret"):
-            block_starts.add(instructions[i + 1]["address"])
-    block_starts.add(instructions[0]["address"])  
-
-    blocks = {}
-    current_block = []
-
-    for instr in instructions:
-        addr = instr["address"]
-
-        if addr in block_starts and current_block:
-            blocks[current_block[0]["address"]] = current_block
-            current_block = []
-
-        current_block.append(instr)
-
-        if instr["mnemonic"].startswith(("jmp", "ret")):
-            blocks[current_block[0]["address"]] = current_block
-            current_block = []
-
-    if current_block:
-        blocks[current_block[0]["address"]] = current_block
-
-    for start_addr, instrs in blocks.items():
-        cfg.add_node(start_addr, instructions=instrs)
-
-    block_starts_sorted = sorted(blocks)
-    addr_to_block_start = {
-        instr["address"]: blk_start
-        for blk_start, instrs in blocks.items()
-        for instr in instrs
-    }
-
-    for i, start in enumerate(block_starts_sorted):
-        block = blocks[start]
-        last_instr = block[-1]
-        mnem = last_instr["mnemonic"]
-        op = last_instr.get("op_str", "")
-
-        if mnem.startswith("jmp") and op.startswith("0x"):
-            tgt = int(op, 16)
-            tgt_blk = addr_to_block_start.get(tgt)
-            if tgt_blk:
-                cfg.add_edge(start, tgt_blk)
-
-        elif mnem.startswith(conditional_jumps):
-            if op.startswith("0x"):
-                tgt = int(op, 16)
-                tgt_blk = addr_to_block_start.get(tgt)
-                if tgt_blk:
-                    cfg.add_edge(start, tgt_blk)
-            if i + 1 < len(block_starts_sorted):
-                cfg.add_edge(start, block_starts_sorted[i + 1])
-
-        elif mnem.startswith("call"):
-            if i + 1 < len(block_starts_sorted):
-                cfg.add_edge(start, block_starts_sorted[i + 1])
-
-        elif not mnem.startswith("ret"):
-            if i + 1 < len(block_starts_sorted):
-                cfg.add_edge(start, block_starts_sorted[i + 1])
+import bisect
+
+from capstone import (
+    CS_GRP_BRANCH_RELATIVE, CS_GRP_CALL, CS_GRP_IRET, CS_GRP_JUMP, CS_GRP_RET,
+)
+from capstone.x86 import X86_INS_HLT, X86_INS_JMP, X86_INS_LJMP, X86_INS_UD2
+
+from disassembler import MAX_INSN_SIZE, InstructionTable, decode_detailed, get_handle
+from graph.block_graph import BlockGraph
+from profiling import span
+
+FLOW_NONE, FLOW_JMP, FLOW_COND, FLOW_CALL, FLOW_RET = range(5)
+
+# mnemonic -> FLOW_*; a mnemonic always maps to the same Capstone groups
+_flow_by_mnemonic = {}
+
+
+def flow_kind(insn):
+    if insn.group(CS_GRP_RET) or insn.group(CS_GRP_IRET) or insn.id in (X86_INS_HLT, X86_INS_UD2):
+        return FLOW_RET
+    if insn.group(CS_GRP_CALL):
+        return FLOW_CALL
+    if insn.group(CS_GRP_JUMP) or insn.group(CS_GRP_BRANCH_RELATIVE):
+        return FLOW_JMP if insn.id in (X86_INS_JMP, X86_INS_LJMP) else FLOW_COND
+    return FLOW_NONE
+
+
+def mnemonic_flow(mnemonic, code, addr, address, size=MAX_INSN_SIZE):
+    flow = _flow_by_mnemonic.get(mnemonic)
+    if flow is None:
+        insn = decode_detailed(code, addr, address, size)
+        flow = _flow_by_mnemonic[mnemonic] = flow_kind(insn) if insn is not None else FLOW_NONE
+    return flow
+
+
+def table_flows(instructions, code, addr):
+    # FLOW_* per interned mnemonic id of `instructions`
+    mnemonics = instructions.mnemonics
+    missing = {m for m, name in enumerate(mnemonics) if name not in _flow_by_mnemonic}
+    if missing:
+        for i, m in enumerate(instructions.mnemonic_ids):
+            if m in missing:
+                mnemonic_flow(mnemonics[m], code, addr, instructions.addresses[i], instructions.sizes[i])
+                missing.discard(m)
+                if not missing:
+                    break
+    return [_flow_by_mnemonic.get(name, FLOW_NONE) for name in mnemonics]
+
+
+def _branch_target(op_str):
+    if op_str.startswith("0x"):
+        try:
+            return int(op_str, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def _blocks_to_graph(instructions, flows, block_ids, entries=()):
+    # block_ids: sorted instruction indices where a block starts
+    addresses = instructions.addresses
+    sizes = instructions.sizes
+    op_strs = instructions.op_strs
+    mnemonic_ids = instructions.mnemonic_ids
+    count = len(addresses)
+
+    bounds = block_ids + [count]
+    block_addrs = [addresses[i] for i in block_ids]
+
+    def block_of(target):
+        i = instructions.index_of(target)
+        if i is None:
+            return None
+        return bisect.bisect_right(block_ids, i) - 1
+
+    sources = []
+    targets = []
+    for b in range(len(block_ids)):
+        last = bounds[b + 1] - 1
+        flow = flows[mnemonic_ids[last]]
+        # Fall through only into the instruction that physically follows
+        has_next = (
+            b + 1 < len(block_addrs)
+            and addresses[last] + sizes[last] == block_addrs[b + 1]
+        )
+
+        if flow in (FLOW_JMP, FLOW_COND):
+            target = _branch_target(op_strs[last])
+            tgt_blk = block_of(target) if target is not None else None
+            if tgt_blk is not None:
+                sources.append(b)
+                targets.append(tgt_blk)
+            if flow == FLOW_COND and has_next and tgt_blk != b + 1:
+                sources.append(b)
+                targets.append(b + 1)
+
+        elif flow != FLOW_RET:
+            if has_next:
+                sources.append(b)
+                targets.append(b + 1)
+
+    counts = [bounds[b + 1] - bounds[b] for b in range(len(block_ids))]
+    entry_ids = [b for b in map(block_of, entries) if b is not None]
+    return BlockGraph(instructions, block_ids, counts, sources, targets, entry_ids)
+
+
+def build_cfg(instructions, code, addr):
+    with span("build_cfg", instructions=len(instructions)) as s:
+        cfg = _linear_cfg(instructions, code, addr)
+        s.count(blocks=len(cfg), edges=cfg.edge_count)
+    return cfg
+
 
+def _linear_cfg(instructions, code, addr):
+    addresses = instructions.addresses
+    op_strs = instructions.op_strs
+    mnemonic_ids = instructions.mnemonic_ids
+    count = len(addresses)
+    if not count:
+        return BlockGraph(instructions, (), ())
+
+    flows = table_flows(instructions, code, addr)
+
+    block_starts = {addresses[0]}
+    for i in range(count):
+        flow = flows[mnemonic_ids[i]]
+        if flow == FLOW_NONE:
+            continue
+        if flow != FLOW_RET:
+            target = _branch_target(op_strs[i])
+            if target is not None:
+                block_starts.add(target)
+        if i + 1 < count:
+            block_starts.add(addresses[i + 1])
+
+    block_ids = [i for i in range(count) if addresses[i] in block_starts]
+    return _blocks_to_graph(instructions, flows, block_ids)
+
+
+def build_function_cfg(code, addr, entry, end=None):
+    # Recursive descent from `entry`: only bytes reachable inside the function
+    # are decoded. Branches leaving [entry, end) are treated as tail calls.
+    with span("build_function_cfg") as s:
+        cfg = _descend(code, addr, entry, end)
+        s.count(blocks=len(cfg), edges=cfg.edge_count)
     return cfg
+
+
+def _descend(code, addr, entry, end):
+    md = get_handle()
+    view = memoryview(code)
+    lo, hi = addr, addr + len(view)
+    if end is not None and end > entry:
+        lo, hi = max(lo, entry), min(hi, end)
+
+    decoded = {}
+    leaders = {entry}
+    worklist = [entry]
+    while worklist:
+        pc = worklist.pop()
+        while lo <= pc < hi and pc not in decoded:
+            offset = pc - addr
+            insn = next(md.disasm_lite(view[offset:offset + MAX_INSN_SIZE], pc, 1), None)
+            if insn is None:
+                break
+            _, size, mnemonic, op_str = insn
+            decoded[pc] = insn
+            flow = mnemonic_flow(mnemonic, code, addr, pc, size)
+            nxt = pc + size
+
+            if flow in (FLOW_JMP, FLOW_COND):
+                target = _branch_target(op_str)
+                if target is not None and lo <= target < hi:
+                    leaders.add(target)
+                    worklist.append(target)
+            if flow in (FLOW_JMP, FLOW_RET):
+                break
+            if flow != FLOW_NONE:
+                leaders.add(nxt)
+            pc = nxt
+
+    instructions = InstructionTable()
+    for pc in sorted(decoded):
+        instructions.append(*decoded[pc])
+    if not len(instructions):
+        return BlockGraph(instructions, (), ())
+
+    flows = [_flow_by_mnemonic.get(name, FLOW_NONE) for name in instructions.mnemonics]
+    addresses = instructions.addresses
+    sizes = instructions.sizes
+    block_ids = [
+        i for i in range(len(addresses))
+        if addresses[i] in leaders
+        or i == 0
+        or addresses[i - 1] + sizes[i - 1] != addresses[i]
+        or flows[instructions.mnemonic_ids[i - 1]] != FLOW_NONE
+    ]
+    return _blocks_to_graph(instructions, flows, block_ids, (entry,))
+
+
+class FunctionGraphs:
+    # Memoized per-function CFGs of a binary. Each function is decoded from
+    # the section (SymbolIndex.regions) that holds its entry, so _init in
+    # .init or a stub in .plt gets a graph like anything in .text.
+    def __init__(self, binary, index):
+        self.binary = binary
+        self.regions = list(index.regions)
+        self._region_starts = [lo for lo, _ in self.regions]
+        self.functions = {
+            sym['name']: sym for sym in index.symbols
+            if sym['type'] == "FUNC" and sym['addr']
+        }
+        self._graphs = {}
+
+    def region_of(self, address):
+        # [start, end) of the section holding `address`, or None
+        i = bisect.bisect_right(self._region_starts, address) - 1
+        if i >= 0 and address < self.regions[i][1]:
+            return self.regions[i]
+        return None
+
+    def resolve(self, spec):
+        # Name or address -> (entry, end or None)
+        sym = self.functions.get(spec)
+        if sym is None:
+            if isinstance(spec, str) and spec.startswith("sub_"):
+                # Name given to unnamed functions by graph.discovery
+                spec = "0x" + spec[4:]
+            try:
+                entry = int(spec, 0) if isinstance(spec, str) else int(spec)
+            except ValueError:
+                return None
+            sym = next((s for s in self.functions.values() if s['addr'] == entry), None)
+            if sym is None:
+                return entry, None
+        size = sym.get('size') or 0
+        return sym['addr'], (sym['addr'] + size if size else None)
+
+    def get(self, spec):
+        resolved = self.resolve(spec)
+        if resolved is None:
+            return None
+        entry, end = resolved
+        cfg = self._graphs.get(entry)
+        if cfg is None:
+            region = self.region_of(entry)
+            code = None if region is None else self.binary.read(region[0], region[1] - region[0])
+            if not code:
+                return None  # not in the file: unmapped, or .bss
+            cfg = self._graphs[entry] = build_function_cfg(code, region[0], entry, end)
+        return cfg
@@ -2,10 +2,14 @@
 # CFG Viewer - Chihiro
 # ------------------------
 
+import time
 import tkinter as tk
 from tkinter import Canvas, Entry, Button, messagebox
 from textwrap import wrap
-import networkx as nx
+
+from graph.block_graph import BlockGraph, natural_loops
+from graph.layout import choose_method, params_tag, submit_layout
+from profiling import record, span
 
 try:
     from PIL import ImageGrab
@@ -19,17 +23,90 @@ INSTR_COLORS = {
     "nop": "#f5f5f5",
     "default": "#f0f8ff"
 }
+LOOP_HEADER_OUTLINE = "#8e44ad"
+
+# Layout units per spatial index cell
+GRID_CELL = 1024
+# Extra screen pixels rendered around the viewport so short pans need no work
+RENDER_MARGIN = 200
+# Below this zoom level nodes are drawn as plain rectangles without text
+DETAIL_ZOOM = 0.6
+# How often a pending background layout is polled
+LAYOUT_POLL_MS = 100
+
+
+def block_text(node, instrs):
+    lines = [f"{mnemonic} {op_str}".strip() for _, _, mnemonic, op_str in instrs.rows()]
+    return f"0x{node:x}\n" + "  ".join(lines)
+
+
+def block_label(node, instrs):
+    head, _, body = block_text(node, instrs).partition("\n")
+    return head + "\n" + "\n".join(wrap(body, 40))
+
+
+def block_size(cfg, node):
+    # (width, height) of a block's label box, or None for an empty block
+    instrs = cfg.nodes[node].get("instructions")
+    if not instrs:
+        return None
+    label_lines = block_label(node, instrs).splitlines()
+    width = max(140, 8 * max(len(line) for line in label_lines) + 30)
+    height = 14 * len(label_lines) + 26
+    return width, height
+
+
+class _SpatialGrid:
+    # Uniform grid over layout coordinates: cell -> keys whose bbox touches it.
+    # Items spanning many cells (long edges) are kept aside with their bbox and
+    # tested directly on every query.
+    def __init__(self, cell=GRID_CELL, max_cells=64):
+        self.cell = cell
+        self.max_cells = max_cells
+        self.cells = {}
+        self.wide = []
+
+    def _span(self, x0, y0, x1, y1):
+        c = self.cell
+        return int(x0 // c), int(y0 // c), int(x1 // c), int(y1 // c)
+
+    def insert(self, key, bbox):
+        cx0, cy0, cx1, cy1 = self._span(*bbox)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.max_cells:
+            self.wide.append((key, bbox))
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), []).append(key)
+
+    def query(self, bbox):
+        x0, y0, x1, y1 = bbox
+        found = {
+            key for key, (kx0, ky0, kx1, ky1) in self.wide
+            if kx0 <= x1 and x0 <= kx1 and ky0 <= y1 and y0 <= ky1
+        }
+        cx0, cy0, cx1, cy1 = self._span(*bbox)
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                keys = cells.get((cx, cy))
+                if keys:
+                    found.update(keys)
+        return found
+
 
 class CFGViewer:
-    def __init__(self, cfg, title="CFG Viewer"):
-        self.cfg = cfg
+    def __init__(self, cfg, title="CFG Viewer", provider=None, cache=None):
+        self._load(cfg)
         self.title = title
+        self.provider = provider
+        self.cache = cache
+        self._layout_job = None
         self.zoom = 1.0
-        self.node_items = {}
-        self.edge_items = []
 
         self.root = tk.Toplevel()
         self.root.title(self.title)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         self.canvas = Canvas(self.root, bg="#fbfbfb", width=1400, height=800)
         self.canvas.pack(fill=tk.BOTH, expand=True)
@@ -40,6 +117,12 @@ class CFGViewer:
         Button(self.root, text="", command=self.search_node).pack(side=tk.LEFT)
         Button(self.root, text=" Export PNG", command=self.export_png).pack(side=tk.LEFT, padx=5)
 
+        if self.provider:
+            self.function_box = Entry(self.root)
+            self.function_box.pack(side=tk.LEFT, padx=5)
+            self.function_box.bind("<Return>", lambda e: self.open_function())
+            Button(self.root, text=" Open function", command=self.open_function).pack(side=tk.LEFT)
+
         self.canvas.bind("<ButtonPress-2>", self.start_pan)
         self.canvas.bind("<B2-Motion>", self.do_pan)
         self.canvas.bind("<ButtonPress-3>", self.start_pan)
@@ -47,119 +130,352 @@ class CFGViewer:
         self.canvas.bind("<MouseWheel>", self.on_zoom)
         self.canvas.bind("<Button-4>", self.on_zoom_linux)  # Linux scroll up
         self.canvas.bind("<Button-5>", self.on_zoom_linux)  # Linux scroll down
+        self.canvas.bind("<Configure>", lambda e: self._schedule_render())
 
+        # One binding for every node instead of a pair per node
+        self.canvas.tag_bind("node", "<Enter>", self._on_enter)
+        self.canvas.tag_bind("node", "<Leave>", self._on_leave)
+
+        self._reset()
         self._draw_graph()
         self._draw_legend()
 
+    def _reset(self):
+        if self._layout_job is not None:
+            self._layout_job.cancel()
+            self._layout_job = None
+        self.nodes = {}          # node -> (x, y, width, height)
+        self.labels = {}         # node -> (color, label) for nodes drawn so far
+        self.edges = []          # (src, dst)
+        self.node_grid = _SpatialGrid()
+        self.edge_grid = _SpatialGrid()
+        self.bounds = None
+        self.matches = set()
+
+        # Materialized canvas items; everything else only exists in the index
+        self.node_items = {}     # node -> (detail, shape, shadow, text)
+        self.edge_items = {}     # edge index -> line
+        self.item_node = {}      # canvas item -> node
+        self.pools = {True: [], False: []}
+        self.line_pool = []
+        self._render_pending = False
+        self._hovered = None
+
     def run(self):
         self.root.mainloop()
 
-    def _draw_graph(self):
-        try:
-            # Horizontal layout using Graphviz with increased spacing
-            pos = nx.nx_agraph.graphviz_layout(self.cfg, prog="dot", args='-Grankdir=LR -Gnodesep=1 -Granksep=1.2')
-        except Exception:
-            pos = nx.spring_layout(self.cfg, seed=42)
-
-        if not pos:
-            return
-
-        y_center = sum(y for _, y in pos.values()) / len(pos)
-        pos_scaled = {
-            node: (x * 2.8 + 100, (y - y_center) * 2.2 + 400)
-            for node, (x, y) in pos.items()
-        }
-
-        for node in self.cfg.nodes():
-            if node not in pos_scaled:
-                continue
-
-            x, y = pos_scaled[node]
-            instrs = self.cfg.nodes[node].get("instructions", [])
-            if not instrs:
-                continue
+    def close(self):
+        # A layout still running in its worker is abandoned with the window
+        if self._layout_job is not None:
+            self._layout_job.cancel()
+            self._layout_job = None
+        self.root.destroy()
+
+    def _load(self, cfg):
+        # Loops are found on the compact BlockGraph; the drawing code works
+        # on a networkx copy made here
+        self.loop_headers = set()
+        if isinstance(cfg, BlockGraph):
+            self.loop_headers = {cfg.starts[loop.header] for loop in natural_loops(cfg)}
+            cfg = cfg.to_networkx()
+        self.cfg = cfg
 
-            lines = [f"{i['mnemonic']} {i['op_str']}".strip() for i in instrs]
-            label_text = f"0x{node:x}\n" + "\n".join(wrap("  ".join(lines), 40))
-            mnemonic = instrs[-1]["mnemonic"]
-            color = next((c for k, c in INSTR_COLORS.items() if mnemonic.startswith(k)), INSTR_COLORS["default"])
+    def set_graph(self, cfg):
+        self._load(cfg)
+        self.zoom = 1.0
+        self.canvas.delete("all")
+        self._reset()
+        self._draw_graph()
+        self._draw_legend()
 
-            width = max(140, 8 * max(len(line) for line in label_text.splitlines()) + 30)
-            height = 14 * len(label_text.splitlines()) + 26
+    def open_function(self):
+        spec = self.function_box.get().strip()
+        if not spec:
+            return
+        cfg = self.provider(spec)
+        if cfg is None:
+            messagebox.showerror("Error", f"Unknown function: {spec}")
+            return
+        self.root.title(f"{self.title} - {spec}")
+        self.set_graph(cfg)
 
-            # Shadow
-            self.canvas.create_oval(
-                x - width//2 + 2, y - height//2 + 2, x + width//2 + 2, y + height//2 + 2,
-                fill="#d0d0d0", outline="", tags=f"shadow_{node}"
-            )
+    def _draw_graph(self):
+        count = sum(1 for node in self.cfg.nodes() if self.cfg.nodes[node].get("instructions"))
+        if not count:
+            return
 
-            # Main oval
-            oval = self.canvas.create_oval(
-                x - width//2, y - height//2, x + width//2, y + height//2,
-                fill=color, outline="#2c3e50", width=2, tags=f"node_{node}"
-            )
+        method = choose_method(count)
+        name = self._layout_name(method)
+        boxes = self.cache.lookup(name) if self.cache else None
+        if boxes is not None:
+            self._show(boxes)
+            return
 
-            # Text
-            text = self.canvas.create_text(
-                x, y, text=label_text,
-                font=("Courier New", 8), justify="center", tags=f"label_{node}"
+        # Measure and lay out in a worker process; draw when the result arrives
+        self.canvas.create_text(
+            self.canvas.winfo_reqwidth() // 2, self.canvas.winfo_reqheight() // 2,
+            font=("Arial", 11), fill="#555", tags="placeholder",
+        )
+        job = self._layout_job = submit_layout(self.cfg, block_size, method)
+        self._poll_layout(job, method, count, time.perf_counter())
+
+    def _poll_layout(self, job, method, count, started):
+        if job is not self._layout_job:
+            return  # superseded by another graph
+        if not job.done():
+            self.canvas.itemconfig(
+                "placeholder",
+                text=f"Computing {method} layout of {count} blocks... {time.perf_counter() - started:.0f}s",
             )
+            self.root.after(LAYOUT_POLL_MS, self._poll_layout, job, method, count, started)
+            return
 
-            self.node_items[node] = {"oval": oval, "text": text, "coords": (x, y)}
+        self._layout_job = None
+        self.canvas.delete("placeholder")
+        try:
+            method, boxes = job.result()
+        except Exception as e:
+            messagebox.showerror("Layout Error", str(e))
+            return
+        # Measured from submission: the worker process cannot report spans itself
+        record(f"layout {method}", started, time.perf_counter() - started, blocks=count)
+        if self.cache:
+            self.cache.put(self._layout_name(method), boxes)
+        self._show(boxes)
+
+    def _layout_name(self, method):
+        # Cache artifact for this graph of the binary under the given layout
+        cfg = self.cfg
+        key = f"{min(cfg.nodes()):x}-{cfg.number_of_nodes()}-{cfg.number_of_edges()}"
+        return f"layout:{key}:{method}:{params_tag(method)}"
+
+    def _show(self, boxes):
+        self._index(boxes)
+        self.canvas.update_idletasks()
+        self._update_scrollregion()
+        self.canvas.xview_moveto(0.3)
+        self._render()
 
-            self.canvas.tag_bind(f"node_{node}", "<Enter>", lambda e, n=node: self._highlight(n))
-            self.canvas.tag_bind(f"node_{node}", "<Leave>", lambda e, n=node: self._unhighlight(n))
+    def _index(self, boxes):
+        # Fill the spatial indexes from layout boxes; no canvas items yet
+        self.nodes = boxes
+        insert = self.node_grid.insert
+        for node, (x, y, width, height) in boxes.items():
+            insert(node, (x - width / 2, y - height / 2, x + width / 2 + 2, y + height / 2 + 2))
 
-        # Draw edges
         for src, dst in self.cfg.edges():
-            if src not in pos_scaled or dst not in pos_scaled:
+            if src not in self.nodes or dst not in self.nodes:
                 continue
-            x1, y1 = pos_scaled[src]
-            x2, y2 = pos_scaled[dst]
-            line = self.canvas.create_line(x1, y1, x2, y2, arrow=tk.LAST, width=1.2, fill="#777")
-            self.edge_items.append((src, dst, line))
+            x1, y1 = self.nodes[src][:2]
+            x2, y2 = self.nodes[dst][:2]
+            self.edge_grid.insert(len(self.edges), (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)))
+            self.edges.append((src, dst))
+
+        if self.nodes:
+            self.bounds = (
+                min(x - w / 2 for x, _, w, _ in self.nodes.values()) - 50,
+                min(y - h / 2 for _, y, _, h in self.nodes.values()) - 50,
+                max(x + w / 2 for x, _, w, _ in self.nodes.values()) + 50,
+                max(y + h / 2 for _, y, _, h in self.nodes.values()) + 50,
+            )
 
-        self.canvas.update_idletasks()
-        bbox = self.canvas.bbox("all")
-        if bbox:
-            self.canvas.config(scrollregion=bbox)
-            self.canvas.xview_moveto(0.3)
+    def _update_scrollregion(self):
+        if self.bounds:
+            z = self.zoom
+            self.canvas.config(scrollregion=tuple(v * z for v in self.bounds))
+
+    def _schedule_render(self):
+        # Coalesce bursts of pan/zoom/resize events into one render
+        if not self._render_pending:
+            self._render_pending = True
+            self.canvas.after_idle(self._render)
+
+    def _viewport(self):
+        # Visible layout-space rectangle, grown by RENDER_MARGIN pixels
+        z = self.zoom
+        c = self.canvas
+        return (
+            (c.canvasx(-RENDER_MARGIN)) / z,
+            (c.canvasy(-RENDER_MARGIN)) / z,
+            (c.canvasx(c.winfo_width() + RENDER_MARGIN)) / z,
+            (c.canvasy(c.winfo_height() + RENDER_MARGIN)) / z,
+        )
+
+    def _render(self):
+        self._render_pending = False
+        if not self.nodes:
+            return
+        with span("render") as s:
+            view = self._viewport()
+            visible = self.node_grid.query(view)
+            lines = self.edge_grid.query(view)
+
+            for node in [n for n in self.node_items if n not in visible]:
+                self._release_node(node)
+            for edge in [e for e in self.edge_items if e not in lines]:
+                self._release_edge(edge)
+
+            for edge in lines:
+                if edge not in self.edge_items:
+                    self._place_edge(edge)
+            for node in visible:
+                if node not in self.node_items:
+                    self._place_node(node)
+
+            self.canvas.tag_raise("node")
+            self.canvas.tag_raise("legend")
+            s.count(nodes=len(visible), edges=len(lines))
+
+    def _place_node(self, node):
+        x, y, width, height = self.nodes[node]
+        color, label = self._label(node)
+        z = self.zoom
+        detail = z >= DETAIL_ZOOM
+        x0, y0 = (x - width / 2) * z, (y - height / 2) * z
+        x1, y1 = (x + width / 2) * z, (y + height / 2) * z
+        outline, line_width = self._outline(node)
+
+        pool = self.pools[detail]
+        if pool:
+            shape, shadow, text = pool.pop()
+        elif detail:
+            shadow = self.canvas.create_oval(0, 0, 0, 0, fill="#d0d0d0", outline="")
+            shape = self.canvas.create_oval(0, 0, 0, 0, tags="node")
+            text = self.canvas.create_text(0, 0, justify="center", tags="node")
+        else:
+            shadow = text = None
+            shape = self.canvas.create_rectangle(0, 0, 0, 0, tags="node")
+
+        self.canvas.coords(shape, x0, y0, x1, y1)
+        self.canvas.itemconfig(shape, fill=color, outline=outline, width=line_width, state="normal")
+        self.item_node[shape] = node
+        if detail:
+            self.canvas.coords(shadow, x0 + 2, y0 + 2, x1 + 2, y1 + 2)
+            self.canvas.itemconfig(shadow, state="normal")
+            self.canvas.coords(text, x * z, y * z)
+            self.canvas.itemconfig(
+                text, text=label, font=("Courier New", max(1, round(8 * z))), state="normal"
+            )
+            self.item_node[text] = node
+        self.node_items[node] = (detail, shape, shadow, text)
+
+    def _release_node(self, node):
+        detail, shape, shadow, text = self.node_items.pop(node)
+        self.item_node.pop(shape, None)
+        self.item_node.pop(text, None)
+        for item in (shape, shadow, text):
+            if item is not None:
+                self.canvas.itemconfig(item, state="hidden")
+        self.pools[detail].append((shape, shadow, text))
+
+    def _place_edge(self, edge):
+        src, dst = self.edges[edge]
+        z = self.zoom
+        x1, y1 = self.nodes[src][:2]
+        x2, y2 = self.nodes[dst][:2]
+        if self.line_pool:
+            line = self.line_pool.pop()
+        else:
+            line = self.canvas.create_line(0, 0, 0, 0, width=1.2, fill="#777")
+        self.canvas.coords(line, x1 * z, y1 * z, x2 * z, y2 * z)
+        self.canvas.itemconfig(line, arrow=tk.LAST if z >= DETAIL_ZOOM else tk.NONE, state="normal")
+        self.edge_items[edge] = line
+
+    def _release_edge(self, edge):
+        line = self.edge_items.pop(edge)
+        self.canvas.itemconfig(line, state="hidden")
+        self.line_pool.append(line)
+
+    def _release_all(self):
+        for node in list(self.node_items):
+            self._release_node(node)
+        for edge in list(self.edge_items):
+            self._release_edge(edge)
 
     def _draw_legend(self):
         x, y = 20, 20
-        self.canvas.create_text(x, y - 10, text="Legend:", anchor="nw", font=("Arial", 9, "bold"))
+        self.canvas.create_text(x, y - 10, text="Legend:", anchor="nw", font=("Arial", 9, "bold"), tags="legend")
         for key, color in INSTR_COLORS.items():
             if key == "default":
                 continue
-            self.canvas.create_rectangle(x, y, x + 20, y + 20, fill=color, outline="#333")
-            self.canvas.create_text(x + 30, y + 10, anchor="w", text=key, font=("Arial", 9))
+            self.canvas.create_rectangle(x, y, x + 20, y + 20, fill=color, outline="#333", tags="legend")
+            self.canvas.create_text(x + 30, y + 10, anchor="w", text=key, font=("Arial", 9), tags="legend")
             y += 25
+        self.canvas.create_rectangle(x, y, x + 20, y + 20, fill="#ffffff", outline=LOOP_HEADER_OUTLINE, width=3, tags="legend")
+        self.canvas.create_text(x + 30, y + 10, anchor="w", text="loop header", font=("Arial", 9), tags="legend")
+
+    def _label(self, node):
+        label = self.labels.get(node)
+        if label is None:
+            instrs = self.cfg.nodes[node]["instructions"]
+            mnemonic = instrs[-1].mnemonic
+            color = next((c for k, c in INSTR_COLORS.items() if mnemonic.startswith(k)), INSTR_COLORS["default"])
+            label = self.labels[node] = (color, block_label(node, instrs))
+        return label
+
+    def _outline(self, node):
+        if node == self._hovered:
+            return "#ff8800", 3
+        if node in self.matches:
+            return "#ff0000", 3
+        if node in self.loop_headers:
+            return LOOP_HEADER_OUTLINE, 3
+        return "#2c3e50", 2
+
+    def _restyle(self, node):
+        items = self.node_items.get(node)
+        if items:
+            outline, width = self._outline(node)
+            self.canvas.itemconfig(items[1], outline=outline, width=width)
 
     def search_node(self):
         query = self.search_box.get().strip().lower()
-        for node, items in self.node_items.items():
-            label = self.canvas.itemcget(items["text"], "text").lower()
-            if query in label:
-                x, y = items["coords"]
-                bbox = self.canvas.bbox("all")
-                if bbox:
-                    self.canvas.xview_moveto((x - 600) / bbox[2])
-                    self.canvas.yview_moveto((y - 400) / bbox[3])
-                self.canvas.itemconfig(items["oval"], outline="#ff0000", width=3)
-            else:
-                self.canvas.itemconfig(items["oval"], outline="#2c3e50", width=2)
+        previous = self.matches
+        self.matches = set()
+        if query:
+            self.matches = {
+                node for node in self.nodes
+                if query in block_text(node, self.cfg.nodes[node]["instructions"]).lower()
+            }
+        for node in previous | self.matches:
+            self._restyle(node)
+        if self.matches:
+            self._center_on(min(self.matches))
+
+    def _center_on(self, node):
+        x, y = self.nodes[node][:2]
+        z = self.zoom
+        sx0, sy0, sx1, sy1 = (v * z for v in self.bounds)
+        left = x * z - self.canvas.winfo_width() / 2
+        top = y * z - self.canvas.winfo_height() / 2
+        self.canvas.xview_moveto((left - sx0) / (sx1 - sx0))
+        self.canvas.yview_moveto((top - sy0) / (sy1 - sy0))
+        self._schedule_render()
+
+    def _on_enter(self, event):
+        current = self.canvas.find_withtag("current")
+        node = self.item_node.get(current[0]) if current else None
+        if node is not None:
+            self._highlight(node)
+
+    def _on_leave(self, event):
+        if self._hovered is not None:
+            self._unhighlight(self._hovered)
 
     def _highlight(self, node):
-        self.canvas.itemconfig(self.node_items[node]["oval"], outline="#ff8800", width=3)
+        self._hovered = node
+        self._restyle(node)
 
     def _unhighlight(self, node):
-        self.canvas.itemconfig(self.node_items[node]["oval"], outline="#2c3e50", width=2)
+        self._hovered = None
+        self._restyle(node)
 
     def start_pan(self, event):
         self.canvas.scan_mark(event.x, event.y)
 
     def do_pan(self, event):
         self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self._schedule_render()
 
     def on_zoom(self, event):
         scale = 1.1 if event.delta > 0 else 0.9
@@ -170,9 +486,22 @@ class CFGViewer:
         self._zoom_canvas(event.x, event.y, scale)
 
     def _zoom_canvas(self, x, y, scale):
+        if not self.bounds:
+            return
+        # Keep the layout point under the cursor fixed while zooming
+        wx = self.canvas.canvasx(x) / self.zoom
+        wy = self.canvas.canvasy(y) / self.zoom
         self.zoom *= scale
-        self.canvas.scale("all", x, y, scale, scale)
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self._update_scrollregion()
+
+        z = self.zoom
+        sx0, sy0, sx1, sy1 = (v * z for v in self.bounds)
+        self.canvas.xview_moveto((wx * z - x - sx0) / (sx1 - sx0))
+        self.canvas.yview_moveto((wy * z - y - sy0) / (sy1 - sy0))
+
+        # Materialized items were placed for the old zoom; recycle them all
+        self._release_all()
+        self._schedule_render()
 
     def export_png(self):
         if not ImageGrab:
@@ -190,6 +519,6 @@ class CFGViewer:
             messagebox.showerror("Export Error", str(e))
 
 
-def visualize_cfg(cfg, title=" CFG - Chihiro"):
-    viewer = CFGViewer(cfg, title)
+def visualize_cfg(cfg, title=" CFG - Chihiro", provider=None, cache=None):
+    viewer = CFGViewer(cfg, title, provider, cache)
     viewer.run()
@@ -0,0 +1,615 @@
+import bisect
+import re
+import struct
+from array import array
+
+from disassembler import InstructionTable, get_handle
+from graph.block_graph import BlockGraph
+from graph.cfg_builder import (
+    FLOW_CALL, FLOW_COND, FLOW_JMP, FLOW_NONE, FLOW_RET, _branch_target,
+    _flow_by_mnemonic, mnemonic_flow,
+)
+from profiling import span
+from symbol_extractor import _RIP_OPERAND
+
+# Recursive-descent code discovery. Starting from the entry point, function
+# symbols, .init_array/.fini_array and the .eh_frame_hdr FDE table, a
+# worklist follows calls, branches and resolved jump tables so only bytes
+# that are actually reachable get decoded, each byte once: decoded runs are
+# kept as sorted [start, end) intervals, and a run stops at the first
+# instruction that would start or end inside one (a jump into the middle of
+# an instruction does not decode a second, overlapping stream). Whatever the
+# descent never reaches (alignment padding, inline data, dead code) is
+# reported as unreached ranges instead of turning into bogus blocks.
+
+# Initial bytes decoded per run; doubled while a run keeps going
+RUN_WINDOW = 64
+MAX_RUN_WINDOW = 4096
+MAX_JUMP_TABLE = 4096
+# Instructions looked at backwards from an indirect jmp for its table
+JUMP_TABLE_LOOKBACK = 12
+
+# Calls to these never return, so the bytes after them are not followed
+NORETURN = frozenset((
+    "exit", "_exit", "_Exit", "quick_exit", "abort", "__assert_fail",
+    "__stack_chk_fail", "__fortify_fail", "__chk_fail", "__libc_start_main",
+    "__cxa_throw", "__cxa_rethrow", "__cxa_bad_cast", "_Unwind_Resume",
+    "err", "errx", "verr", "verrx", "longjmp", "siglongjmp", "__longjmp_chk",
+    "pthread_exit", "__libc_fatal",
+))
+
+PADDING_BYTES = frozenset(b"\x00\x90\xcc")
+PADDING_MNEMONICS = frozenset(("nop", "int3", "hlt", "ud2"))
+MAX_PADDING = 64
+
+SEED_KINDS = ("entry", "symbols", "init_array", "fini_array", "eh_frame", "calls")
+
+R_X86_64_RELATIVE = 8
+PF_X = 0x1
+
+DW_EH_PE_omit = 0xff
+DW_EH_PE_pcrel = 0x10
+DW_EH_PE_datarel = 0x30
+# DWARF pointer encodings: low nibble -> struct format
+_EH_FORMATS = {0x0: "<Q", 0x2: "<H", 0x3: "<I", 0x4: "<Q", 0xa: "<h", 0xb: "<i", 0xc: "<q"}
+
+_MEM_TABLE = re.compile(r"^(?:(\w+), )?qword ptr \[(?:(\w+) \+ )?(\w+)\*8(?: \+ (0x[0-9a-f]+))?\]$")
+_MOVSXD_TABLE = re.compile(r"^(\w+), dword ptr \[(\w+) \+ (\w+)\*4\]$")
+_LEA_RIP = re.compile(r"^(\w+), \[rip ([+-]) (0x[0-9a-f]+)\]$")
+_TWO_REGS = re.compile(r"^(\w+), (\w+)$")
+
+# Register name -> architectural register, so `cmp edi, 5` bounds `rdi*8`
+_REGISTERS = {}
+for _family, _names in {
+    "a": "rax eax ax al", "b": "rbx ebx bx bl", "c": "rcx ecx cx cl", "d": "rdx edx dx dl",
+    "si": "rsi esi si sil", "di": "rdi edi di dil", "bp": "rbp ebp bp bpl", "sp": "rsp esp sp spl",
+}.items():
+    for _name in _names.split():
+        _REGISTERS[_name] = _family
+for _n in range(8, 16):
+    for _suffix in ("", "d", "w", "b"):
+        _REGISTERS[f"r{_n}{_suffix}"] = f"r{_n}"
+
+
+def _register(name):
+    return _REGISTERS.get(name)
+
+
+class Discovery:
+    # Result of discover(): the reached instructions in address order, their
+    # blocks and edges, function entries with the blocks reachable from each
+    # without crossing into another entry, and the bytes nobody reached.
+    def __init__(self, instructions, block_ids, edges, functions, jump_tables=None,
+                 unresolved=(), unreached=(), seeds=None):
+        self.instructions = instructions
+        self.block_ids = block_ids                 # row indices where blocks start
+        self.edges = edges                         # [(block addr, block addr)]
+        self.functions = functions                 # {entry: array('Q') of block addrs}
+        self.jump_tables = jump_tables or {}       # {jmp address: [targets]}
+        self.unresolved = list(unresolved)         # indirect jmps left unresolved
+        self.unreached = list(unreached)           # [(start, end, "padding" | "unknown")]
+        self.seeds = seeds or {}                   # {SEED_KINDS entry: count}
+        addresses = instructions.addresses
+        self.block_addrs = array('Q', (addresses[i] for i in block_ids))
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def block_rows(self, b):
+        # [start, stop) instruction rows of block number b
+        stop = self.block_ids[b + 1] if b + 1 < len(self.block_ids) else len(self.instructions)
+        return self.block_ids[b], stop
+
+    def block_end(self, b):
+        last = self.block_rows(b)[1] - 1
+        return self.instructions.addresses[last] + self.instructions.sizes[last]
+
+    def bounds(self):
+        # Row bounds: block b covers rows bounds[b]:bounds[b + 1]
+        return list(self.block_ids) + [len(self.instructions)]
+
+    def boundaries(self):
+        # [(entry, end, block count)] with end the furthest byte of any block
+        addresses, sizes = self.instructions.addresses, self.instructions.sizes
+        lasts = [row - 1 for row in self.bounds()[1:]]
+        ends = {addr: addresses[last] + sizes[last] for addr, last in zip(self.block_addrs, lasts)}
+        return [
+            (entry, max((ends[a] for a in blocks), default=entry), len(blocks))
+            for entry, blocks in sorted(self.functions.items())
+        ]
+
+    def symbols(self, index=None):
+        # FUNC symbol dicts for the discovered functions, named after `index`
+        # where a symbol starts at the entry and "sub_<addr>" otherwise
+        symbols = []
+        for entry, end, _ in self.boundaries():
+            name = None
+            if index is not None:
+                found = index.function_at(entry)
+                if found is not None and found[0] == entry:
+                    name = found[2]
+            symbols.append({'name': name or f"sub_{entry:x}", 'addr': entry, 'type': "FUNC", 'size': end - entry})
+        return symbols
+
+    def graph(self, blocks=None):
+        # BlockGraph over all blocks or a subset, entered at the function entries
+        if blocks is None:
+            chosen = range(len(self.block_ids))
+        else:
+            index = {addr: b for b, addr in enumerate(self.block_addrs)}
+            chosen = sorted(index[a] for a in blocks if a in index)
+        rows = []
+        counts = []
+        for b in chosen:
+            start, stop = self.block_rows(b)
+            rows.append(start)
+            counts.append(stop - start)
+        return BlockGraph.from_address_edges(self.instructions, rows, counts, self.edges, sorted(self.functions))
+
+    def function_graph(self, entry):
+        blocks = self.functions.get(entry)
+        return None if blocks is None else self.graph(blocks)
+
+
+def code_regions(binary):
+    # .text, or the executable segments of a binary without section headers
+    text = binary.section(".text")
+    if text is not None and text.size:
+        return [text]
+    executable = {
+        (seg['p_offset'], seg['p_vaddr']) for seg in binary.elf.iter_segments()
+        if seg['p_type'] == 'PT_LOAD' and seg['p_flags'] & PF_X
+    }
+    return [r for r in binary.segments() if (r.offset, r.vaddr) in executable]
+
+
+def _relative_relocations(binary):
+    # {slot: addend} of R_X86_64_RELATIVE, which fill pointer arrays in PIEs
+    from elftools.elf.relocation import RelocationSection
+
+    addends = {}
+    for section in binary.elf.iter_sections():
+        if isinstance(section, RelocationSection) and section.is_RELA():
+            for rel in section.iter_relocations():
+                if rel['r_info_type'] == R_X86_64_RELATIVE:
+                    addends[rel['r_offset']] = rel['r_addend']
+    return addends
+
+
+def pointer_array(binary, name, relocations=None):
+    # Code pointers stored in .init_array / .fini_array
+    region = binary.section(name)
+    if region is None or not region.size:
+        return []
+    pointers = []
+    for i, (value,) in enumerate(struct.iter_unpack("<Q", bytes(region.data[:region.size & ~7]))):
+        if not value and relocations:
+            value = relocations.get(region.vaddr + 8 * i, 0)
+        if value and value != 0xffffffffffffffff:
+            pointers.append(value)
+    return pointers
+
+
+def _read_encoded(data, pos, encoding, vaddr, datarel):
+    # (value, next pos) of a DWARF-encoded pointer, value None if omitted
+    if encoding == DW_EH_PE_omit:
+        return None, pos
+    fmt = _EH_FORMATS.get(encoding & 0x0f)
+    if fmt is None:
+        raise ValueError(f"unsupported pointer encoding 0x{encoding:x}")
+    value = struct.unpack_from(fmt, data, pos)[0]
+    application = encoding & 0x70
+    if application == DW_EH_PE_pcrel:
+        value += vaddr + pos
+    elif application == DW_EH_PE_datarel:
+        value += datarel
+    return value & 0xffffffffffffffff, pos + struct.calcsize(fmt)
+
+
+def fde_starts(binary):
+    # initial_location of every FDE, from the sorted lookup table in
+    # .eh_frame_hdr (found through PT_GNU_EH_FRAME when sections are gone)
+    header = next((
+        (seg['p_vaddr'], seg['p_filesz']) for seg in binary.elf.iter_segments()
+        if seg['p_type'] == 'PT_GNU_EH_FRAME'
+    ), None)
+    if header is None:
+        region = binary.section(".eh_frame_hdr")
+        if region is None:
+            return []
+        header = (region.vaddr, region.size)
+    vaddr, size = header
+    view = binary.read(vaddr, size)
+    if view is None or len(view) < 4:
+        return []
+    data = bytes(view)
+    version, ptr_enc, count_enc, table_enc = data[:4]
+    if version != 1:
+        return []
+    try:
+        _, pos = _read_encoded(data, 4, ptr_enc, vaddr, vaddr)
+        count, pos = _read_encoded(data, pos, count_enc, vaddr, vaddr)
+        starts = []
+        for _ in range(count or 0):
+            location, pos = _read_encoded(data, pos, table_enc, vaddr, vaddr)
+            _, pos = _read_encoded(data, pos, table_enc, vaddr, vaddr)
+            starts.append(location)
+    except (ValueError, struct.error):
+        return []
+    return starts
+
+
+def _noreturn_addresses(index):
+    # Function starts and GOT slots of functions that never return
+    if index is None:
+        return set()
+    return {
+        sym['addr'] for sym in index.symbols
+        if sym['addr'] and sym['name'].partition('@')[0] in NORETURN
+    }
+
+
+def _jump_table(run, read, in_code):
+    # Targets of the indirect jmp ending `run`, for the two shapes compilers
+    # emit: `jmp [idx*8 + table]` with absolute entries, and
+    #   lea base, [rip + table]; movsxd r, dword ptr [base + idx*4]
+    #   add r, base; jmp r
+    # with 32-bit offsets from the table. The entry count comes from the
+    # `cmp idx, n; ja default` guard; without one the jmp stays unresolved.
+    recent = run[-JUMP_TABLE_LOOKBACK:]
+    jmp_op = recent[-1][3]
+    rows = recent[:-1]
+    pos = len(rows)
+
+    def back(pattern, mnemonic, first=None):
+        # Closest earlier row matching `mnemonic` + `pattern` (and first operand)
+        nonlocal pos
+        for i in range(pos - 1, -1, -1):
+            _, _, m, op = rows[i]
+            if m == mnemonic:
+                match = pattern.match(op)
+                if match and (first is None or _register(match.group(1)) == first):
+                    pos = i
+                    return match
+        return None
+
+    def rip_base(register):
+        lea = back(_LEA_RIP, "lea", _register(register))
+        if lea is None:
+            return None
+        address, size = rows[pos][0], rows[pos][1]
+        disp = int(lea.group(3), 16)
+        return address + size + (disp if lea.group(2) == "+" else -disp)
+
+    target = _register(jmp_op)
+    if target is not None:
+        # jmp reg: loaded from a table just before
+        load = back(_MEM_TABLE, "mov", target)
+        if load is not None:
+            base_reg, index_reg, disp = load.group(2), load.group(3), load.group(4)
+            load_pos = pos
+            table = int(disp, 16) if disp else 0
+            if base_reg:
+                base = rip_base(base_reg)
+                if base is None:
+                    return None
+                table += base
+            entry, relative = 8, False
+        else:
+            add = back(_TWO_REGS, "add", target)
+            if add is None:
+                return None
+            base_reg = add.group(2)
+            movsxd = back(_MOVSXD_TABLE, "movsxd", target)
+            if movsxd is None:
+                return None
+            if _register(movsxd.group(2)) != _register(base_reg):
+                if _register(movsxd.group(3)) != _register(base_reg):
+                    return None
+                base_reg, index_reg = movsxd.group(3), movsxd.group(2)
+            else:
+                index_reg = movsxd.group(3)
+            load_pos = pos
+            table = rip_base(base_reg)
+            if table is None:
+                return None
+            entry, relative = 4, True
+    else:
+        direct = _MEM_TABLE.match(jmp_op)
+        if direct is None or not direct.group(4) or direct.group(2):
+            return None
+        index_reg, table = direct.group(3), int(direct.group(4), 16)
+        entry, relative = 8, False
+        load_pos = pos
+
+    # The bound: cmp on the index (or a register it was copied from)
+    index = _register(index_reg)
+    count = None
+    for i in range(load_pos - 1, -1, -1):
+        _, _, m, op = rows[i]
+        operands = _TWO_REGS.match(op)
+        if m in ("mov", "movzx") and operands and _register(operands.group(1)) == index:
+            index = _register(operands.group(2))
+        elif m == "cmp" and operands and _register(operands.group(1)) == index:
+            try:
+                limit = int(operands.group(2), 0)
+            except ValueError:
+                return None
+            following = rows[i + 1][2] if i + 1 < len(rows) else None
+            if following == "ja":
+                count = limit + 1
+            elif following == "jae":
+                count = limit
+            break
+    if not count or count > MAX_JUMP_TABLE:
+        return None
+
+    data = read(table, count * entry)
+    if data is None:
+        return None
+    count = len(data) // entry
+    if relative:
+        targets = [table + v for (v,) in struct.iter_unpack("<i", bytes(data[:count * 4]))]
+    else:
+        targets = [v for (v,) in struct.iter_unpack("<Q", bytes(data[:count * 8]))]
+    targets = [t & 0xffffffffffffffff for t in targets]
+    return [t for t in dict.fromkeys(targets) if in_code(t)]
+
+
+def discover(binary, index=None):
+    # index: a SymbolIndex for function seeds and noreturn imports (optional)
+    regions = code_regions(binary)
+    with span("discover", bytes=sum(r.size for r in regions)) as s:
+        result = _discover(binary, regions, index)
+        s.count(instructions=len(result), blocks=len(result.block_ids),
+                functions=len(result.functions), unreached=len(result.unreached))
+    return result
+
+
+def _discover(binary, regions, index):
+    md = get_handle()
+    spans = [(r.vaddr, r.vaddr + r.size, r) for r in regions]
+
+    def region_of(pc):
+        for lo, hi, region in spans:
+            if lo <= pc < hi:
+                return region
+        return None
+
+    def in_code(pc):
+        return region_of(pc) is not None
+
+    decoded = {}        # address -> (address, size, mnemonic, op_str)
+    # Disjoint decoded runs [starts[i], ends[i]), sorted
+    starts = []
+    ends = []
+
+    def covered(pc):
+        i = bisect.bisect_right(starts, pc) - 1
+        return i >= 0 and pc < ends[i]
+
+    def overlaps(lo, hi):
+        i = bisect.bisect_right(starts, lo) - 1
+        return (i >= 0 and lo < ends[i]) or (i + 1 < len(starts) and starts[i + 1] < hi)
+
+    def mark(lo, hi):
+        i = bisect.bisect_left(starts, lo)
+        if i > 0 and ends[i - 1] == lo:
+            i -= 1
+            lo = starts.pop(i)
+            ends.pop(i)
+        if i < len(starts) and starts[i] == hi:
+            starts.pop(i)
+            hi = ends.pop(i)
+        starts.insert(i, lo)
+        ends.insert(i, hi)
+
+    leaders = set()
+    entries = set()
+    worklist = []
+    seeds = dict.fromkeys(SEED_KINDS, 0)
+
+    def seed(kind, addresses):
+        for address in addresses:
+            if in_code(address) and address not in entries:
+                entries.add(address)
+                leaders.add(address)
+                worklist.append(address)
+                seeds[kind] += 1
+
+    relocations = None
+    if binary.section(".init_array") is not None or binary.section(".fini_array") is not None:
+        relocations = _relative_relocations(binary)
+    seed("entry", [binary.elf.header['e_entry']])
+    seed("init_array", pointer_array(binary, ".init_array", relocations))
+    seed("fini_array", pointer_array(binary, ".fini_array", relocations))
+    if index is not None:
+        seed("symbols", index.starts)
+    seed("eh_frame", fde_starts(binary))
+    # Popped last-in first-out: start with the entry point
+    worklist.reverse()
+
+    noreturn = _noreturn_addresses(index)
+    noreturn_calls = set()
+    jump_tables = {}
+    unresolved = []
+
+    while worklist:
+        pc = worklist.pop()
+        if covered(pc):
+            continue
+        region = region_of(pc)
+        if region is None:
+            continue
+        base, code, end = region.vaddr, region.data, region.vaddr + region.size
+        start = pc
+        run = []
+        window = RUN_WINDOW
+        live = True
+        while live and pc < end:
+            got = False
+            for insn in md.disasm_lite(code[pc - base:pc - base + window], pc):
+                address, size, mnemonic, op_str = insn
+                if overlaps(address, address + size):
+                    if address in decoded:
+                        # Joined code decoded by an earlier run
+                        leaders.add(address)
+                    live = False
+                    break
+                got = True
+                decoded[address] = insn
+                run.append(insn)
+                pc = address + size
+                flow = _flow_by_mnemonic.get(mnemonic)
+                if flow is None:
+                    flow = mnemonic_flow(mnemonic, code, base, address, size)
+                if flow == FLOW_NONE:
+                    continue
+
+                target = _branch_target(op_str) if flow != FLOW_RET else None
+                if flow == FLOW_CALL:
+                    if target is None:
+                        rip = _RIP_OPERAND.search(op_str)
+                        if rip is not None:
+                            disp = int(rip.group(2), 16)
+                            target = pc + (disp if rip.group(1) == "+" else -disp)
+                    if target is not None and target not in entries and in_code(target):
+                        entries.add(target)
+                        leaders.add(target)
+                        worklist.append(target)
+                        seeds["calls"] += 1
+                    if target in noreturn:
+                        noreturn_calls.add(address)
+                        live = False
+                        break
+                elif target is not None:
+                    if in_code(target):
+                        leaders.add(target)
+                        if not covered(target):
+                            worklist.append(target)
+                elif flow == FLOW_JMP and "rip" not in op_str:
+                    targets = _jump_table(run, binary.read, in_code)
+                    if targets:
+                        jump_tables[address] = targets
+                        for t in targets:
+                            leaders.add(t)
+                            if not covered(t):
+                                worklist.append(t)
+                    else:
+                        unresolved.append(address)
+
+                if flow in (FLOW_JMP, FLOW_RET):
+                    live = False
+                    break
+                leaders.add(pc)
+            else:
+                if not got:
+                    # Invalid bytes (or a truncated tail) end the run
+                    break
+                window = min(window * 2, MAX_RUN_WINDOW)
+        if pc > start:
+            mark(start, pc)
+
+    return _assemble(decoded, leaders, entries, noreturn_calls, jump_tables, unresolved, regions, seeds)
+
+
+def _assemble(decoded, leaders, entries, noreturn_calls, jump_tables, unresolved, regions, seeds):
+    instructions = InstructionTable()
+    order = sorted(decoded)
+    rows = [decoded[address] for address in order]
+    intern = instructions.intern
+    instructions.addresses = array('Q', order)
+    instructions.sizes = array('B', [row[1] for row in rows])
+    instructions.mnemonic_ids = array('H', [intern(row[2]) for row in rows])
+    instructions.op_strs = [row[3] for row in rows]
+    del rows
+    addresses = instructions.addresses
+    sizes = instructions.sizes
+    mnemonic_ids = instructions.mnemonic_ids
+    count = len(addresses)
+    flows = [_flow_by_mnemonic.get(name, FLOW_NONE) for name in instructions.mnemonics]
+
+    block_ids = [
+        i for i in range(count)
+        if i == 0
+        or addresses[i] in leaders
+        or addresses[i - 1] + sizes[i - 1] != addresses[i]
+        or flows[mnemonic_ids[i - 1]] != FLOW_NONE
+    ]
+    block_addrs = [addresses[i] for i in block_ids]
+    block_of = {addr: b for b, addr in enumerate(block_addrs)}
+    bounds = block_ids + [count]
+
+    successors = [[] for _ in block_ids]
+    for b, start in enumerate(block_addrs):
+        last = bounds[b + 1] - 1
+        flow = flows[mnemonic_ids[last]]
+        address = addresses[last]
+        follows = (
+            b + 1 < len(block_addrs)
+            and address + sizes[last] == block_addrs[b + 1]
+        )
+        out = successors[b]
+        if flow in (FLOW_JMP, FLOW_COND):
+            target = _branch_target(instructions.op_strs[last])
+            if target in block_of:
+                out.append(block_of[target])
+            for t in jump_tables.get(address, ()):
+                if t in block_of:
+                    out.append(block_of[t])
+            if flow == FLOW_COND and follows:
+                out.append(b + 1)
+        elif flow != FLOW_RET and follows and address not in noreturn_calls:
+            out.append(b + 1)
+    edges = [(block_addrs[b], block_addrs[d]) for b, out in enumerate(successors) for d in dict.fromkeys(out)]
+
+    # A function is what its entry reaches without entering another entry
+    # (a jump there is a tail call)
+    functions = {}
+    for entry in sorted(entries):
+        first = block_of.get(entry)
+        if first is None:
+            continue
+        seen = {first}
+        stack = [first]
+        while stack:
+            for d in successors[stack.pop()]:
+                if d not in seen and block_addrs[d] not in entries:
+                    seen.add(d)
+                    stack.append(d)
+        functions[entry] = array('Q', sorted(block_addrs[b] for b in seen))
+
+    unreached = []
+    for region in regions:
+        lo, hi = region.vaddr, region.vaddr + region.size
+        covered = lo
+        for i in range(bisect.bisect_left(addresses, lo), count):
+            address = addresses[i]
+            if address >= hi:
+                break
+            if address > covered:
+                unreached.append((covered, address))
+            covered = max(covered, address + sizes[i])
+        if covered < hi:
+            unreached.append((covered, hi))
+    unreached = [(lo, hi, _classify_gap(regions, lo, hi)) for lo, hi in unreached]
+
+    return Discovery(instructions, block_ids, edges, functions, jump_tables, unresolved, unreached, seeds)
+
+
+def _classify_gap(regions, lo, hi):
+    # "padding" for alignment filler (zeros, nop, int3, multi-byte nops, the
+    # hlt/ud2 left after noreturn calls),
+    # "unknown" for anything else: data, dead code, missed indirect targets
+    region = next(r for r in regions if r.vaddr <= lo < r.vaddr + r.size)
+    data = region.data[lo - region.vaddr:hi - region.vaddr]
+    if set(data) <= PADDING_BYTES:
+        return "padding"
+    if hi - lo > MAX_PADDING:
+        return "unknown"
+    end = lo
+    for address, size, mnemonic, _ in get_handle().disasm_lite(data, lo):
+        if mnemonic not in PADDING_MNEMONICS:
+            return "unknown"
+        end = address + size
+    return "padding" if end == hi else "unknown"
@@ -0,0 +1,233 @@
+import hashlib
+import multiprocessing
+from collections import deque
+
+import networkx as nx
+
+# Layout method -> parameters; the parameters are part of the cache key
+LAYOUT_PARAMS = {
+    "dot": "-Grankdir=LR -Gnodesep=1 -Granksep=1.2",
+    "layered": "rank_gap=80 node_gap=40 sweeps=4",
+}
+# Beyond this many blocks dot takes far too long; use the layered layout
+DOT_MAX_NODES = 600
+
+# The viewer process runs Tk, task and pipeline threads, so layout workers
+# are never forked from it; the graph is pickled to a fresh process instead
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _has_graphviz():
+    try:
+        import pygraphviz  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def choose_method(node_count):
+    if node_count <= DOT_MAX_NODES and _has_graphviz():
+        return "dot"
+    return "layered"
+
+
+def params_tag(method):
+    return hashlib.sha1(LAYOUT_PARAMS[method].encode()).hexdigest()[:8]
+
+
+def dot_layout(nodes, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(edges)
+    pos = nx.nx_agraph.graphviz_layout(graph, prog="dot", args=LAYOUT_PARAMS["dot"])
+    if not pos:
+        return {}
+
+    y_center = sum(y for _, y in pos.values()) / len(pos)
+    return {
+        node: (x * 2.8 + 100, (y - y_center) * 2.2 + 400)
+        for node, (x, y) in pos.items()
+    }
+
+
+def _break_cycles(nodes, succ):
+    # Iterative DFS in address order; edges into a node still on the stack
+    # are back edges and are ignored for ranking.
+    WHITE, GRAY, BLACK = 0, 1, 2
+    state = dict.fromkeys(nodes, WHITE)
+    back = set()
+    for root in nodes:
+        if state[root] != WHITE:
+            continue
+        state[root] = GRAY
+        stack = [(root, iter(succ[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state[child] == WHITE:
+                    state[child] = GRAY
+                    stack.append((child, iter(succ[child])))
+                    break
+                if state[child] == GRAY:
+                    back.add((node, child))
+            else:
+                state[node] = BLACK
+                stack.pop()
+    return back
+
+
+def layered_layout(nodes, edges, sizes, rank_gap=80, node_gap=40, sweeps=4):
+    # Sugiyama-style left-to-right layout in O((V + E) * sweeps):
+    # longest-path ranks, barycenter ordering, then packing by node size.
+    nodes = sorted(nodes)
+    if not nodes:
+        return {}
+    succ = {n: [] for n in nodes}
+    for src, dst in edges:
+        if src in succ and dst in succ and src != dst:
+            succ[src].append(dst)
+
+    back = _break_cycles(nodes, succ)
+    forward = [(s, d) for s in nodes for d in succ[s] if (s, d) not in back]
+
+    preds = {n: [] for n in nodes}
+    indegree = dict.fromkeys(nodes, 0)
+    dag = {n: [] for n in nodes}
+    for src, dst in forward:
+        dag[src].append(dst)
+        preds[dst].append(src)
+        indegree[dst] += 1
+
+    rank = dict.fromkeys(nodes, 0)
+    queue = deque(n for n in nodes if not indegree[n])
+    while queue:
+        node = queue.popleft()
+        for child in dag[node]:
+            rank[child] = max(rank[child], rank[node] + 1)
+            indegree[child] -= 1
+            if not indegree[child]:
+                queue.append(child)
+
+    layers = [[] for _ in range(max(rank.values()) + 1)]
+    for node in nodes:
+        layers[rank[node]].append(node)
+
+    order = {}
+    for layer in layers:
+        order.update((node, i) for i, node in enumerate(layer))
+
+    def reorder(layer, neighbours):
+        keyed = []
+        for node in layer:
+            around = neighbours[node]
+            bary = sum(order[n] for n in around) / len(around) if around else order[node]
+            keyed.append((bary, order[node], node))
+        keyed.sort()
+        layer[:] = [node for _, _, node in keyed]
+        order.update((node, i) for i, node in enumerate(layer))
+
+    for sweep in range(sweeps):
+        if sweep % 2 == 0:
+            for layer in layers[1:]:
+                reorder(layer, preds)
+        else:
+            for layer in reversed(layers[:-1]):
+                reorder(layer, dag)
+
+    pos = {}
+    x = 100
+    for layer in layers:
+        width = max(sizes[n][0] for n in layer)
+        total = sum(sizes[n][1] for n in layer) + node_gap * (len(layer) - 1)
+        y = 400 - total / 2
+        for node in layer:
+            height = sizes[node][1]
+            pos[node] = (x + width / 2, y + height / 2)
+            y += height + node_gap
+        x += width + rank_gap
+    return pos
+
+
+def compute_layout(nodes, edges, sizes, method):
+    # nodes: block addresses, edges: (src, dst), sizes: node -> (width, height)
+    if method == "dot":
+        return dot_layout(nodes, edges)
+    return layered_layout(nodes, edges, sizes)
+
+
+def _layout(cfg, measure, method):
+    # Sizes every block with measure(cfg, node) -> (w, h) or None, lays them
+    # out and returns (method actually used, {node: (x, y, w, h)})
+    sizes = {}
+    for node in cfg.nodes():
+        size = measure(cfg, node)
+        if size is not None:
+            sizes[node] = size
+    nodes = list(sizes)
+    edges = [(s, d) for s, d in cfg.edges() if s in sizes and d in sizes]
+    try:
+        pos = compute_layout(nodes, edges, sizes, method)
+    except Exception:
+        # Graphviz missing or failed; the layered layout always works
+        method = "layered"
+        pos = compute_layout(nodes, edges, sizes, method)
+    return method, {node: pos[node] + sizes[node] for node in nodes if node in pos}
+
+
+def _layout_worker(conn, cfg, measure, method):
+    try:
+        outcome = (True, _layout(cfg, measure, method))
+    except Exception as e:
+        outcome = (False, RuntimeError(f"{type(e).__name__}: {e}"))
+    conn.send(outcome)
+    conn.close()
+
+
+class LayoutJob:
+    # One layout in a worker process of its own, polled from the Tk loop
+    # with done()/result(). cancel() terminates the worker, so a graph that
+    # was replaced stops using the CPU at once.
+    def __init__(self, cfg, measure, method):
+        ctx = multiprocessing.get_context(START_METHOD)
+        self._conn, child = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(target=_layout_worker, args=(child, cfg, measure, method), daemon=True)
+        self.process.start()
+        child.close()
+        self._outcome = None
+
+    def done(self):
+        if self._outcome is None and self._conn.poll():
+            try:
+                self._outcome = self._conn.recv()
+            except EOFError:
+                self.process.join()
+                self._outcome = (False, RuntimeError(f"Layout worker exited with code {self.process.exitcode}"))
+            self.process.join()
+            self._conn.close()
+        return self._outcome is not None
+
+    def result(self, timeout=None):
+        # Blocks until the layout is done; raises its error
+        if not self.done() and self._conn.poll(timeout):
+            self.done()
+        if self._outcome is None:
+            raise TimeoutError("Layout still running")
+        ok, value = self._outcome
+        if not ok:
+            raise value
+        return value
+
+    def cancel(self):
+        if self._outcome is not None:
+            return False
+        self.process.terminate()
+        self.process.join()
+        self._conn.close()
+        self._outcome = (False, RuntimeError("Layout cancelled"))
+        return True
+
+
+def submit_layout(cfg, measure, method):
+    # Lays out `cfg` in a worker process so the Tk loop stays responsive;
+    # measure must be a module-level function so that it pickles
+    return LayoutJob(cfg, measure, method)
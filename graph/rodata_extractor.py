@@ -1,21 +1,13 @@
-def extract_rodata(elf):
-    rodata_section = elf.get_section_by_name('.rodata')
-    if not rodata_section:
-        print("[!] .rodata section not found.")
-        return []
+from profiling import span
+from string_extractor import iter_strings
 
-    data = rodata_section.data()
-    strings = []
-    current = b""
 
-    for byte in data:
-        if 32 <= byte <= 126:
-            current += bytes([byte])
-        else:
-            if len(current) >= 4:
-                strings.append(current.decode(errors='ignore'))
-            current = b""
-    if len(current) >= 4:
-        strings.append(current.decode(errors='ignore'))
+def extract_rodata(binary):
+    # No .rodata is no strings; the front end says so
+    if not binary.section('.rodata'):
+        return []
 
+    with span("extract_rodata") as s:
+        strings = [record.text for record in iter_strings(binary, '.rodata', encodings=("ascii",))]
+        s.count(strings=len(strings))
     return strings
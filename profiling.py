@@ -0,0 +1,320 @@
+import os
+import sys
+import threading
+import time
+
+# Opt-in timing spans around the analysis stages. With no profiler enabled
+# span() hands back one shared do-nothing object, so instrumented code only
+# pays a global lookup and a call per stage.
+#
+#     with span("disassemble", bytes=len(code)) as s:
+#         table = ...
+#         s.count(instructions=len(table))
+#
+# A span's parent is the innermost span open on its thread. Work handed to
+# another thread keeps its place in the tree by capturing current_span() on
+# the submitting side and running under attached(parent) on the worker.
+#
+# CHIHIRO_PROFILE=1 (summary table on stderr) or CHIHIRO_PROFILE=trace.json
+# (Chrome trace-event file, also summarised) turns it on for any entry point;
+# CHIHIRO_PROFILE_MEMORY=1 adds tracemalloc peaks, at a large speed cost.
+# tracemalloc and json are only imported once profiling is actually used.
+
+ENV_VAR = "CHIHIRO_PROFILE"
+MEMORY_ENV_VAR = "CHIHIRO_PROFILE_MEMORY"
+
+
+class Span:
+    __slots__ = ("profiler", "name", "counts", "start", "duration", "depth", "parent", "tid",
+                 "peak", "_mem_start", "_peak_abs")
+
+    def __init__(self, profiler, name, counts):
+        self.profiler = profiler
+        self.name = name
+        self.counts = counts
+        self.start = self.duration = 0.0
+        self.depth = 0
+        self.parent = None
+        self.tid = threading.get_ident()
+        self.peak = None
+        self._mem_start = self._peak_abs = 0
+
+    def count(self, **counts):
+        self.counts.update(counts)
+        return self
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self)
+
+    def describe(self):
+        counts = ", ".join(f"{v} {k}" for k, v in self.counts.items())
+        text = f"{self.name} {self.duration * 1000:.1f} ms"
+        return f"{text} ({counts})" if counts else text
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def count(self, **counts):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Profiler:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._listeners = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tracemalloc = None
+        self._started_tracing = False
+        if memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+
+    def add_listener(self, callback):
+        # callback(span) runs on the thread that closed the span
+        self._listeners.append(callback)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        # Innermost open span of this thread, or the one it was attached to
+        stack = self._stack()
+        return stack[-1] if stack else getattr(self._local, "parent", None)
+
+    def attach(self, parent):
+        # Makes `parent` the parent of this thread's outermost spans until
+        # detach(); returns the previous one
+        previous = getattr(self._local, "parent", None)
+        self._local.parent = parent
+        return previous
+
+    def _adopt(self, span):
+        parent = span.parent = self.current()
+        span.depth = parent.depth + 1 if parent is not None else 0
+
+    def _enter(self, span):
+        stack = self._stack()
+        self._adopt(span)
+        if self.memory:
+            # tracemalloc has one global peak: fold it into the enclosing
+            # span before resetting it for this one
+            tracemalloc = self._tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._peak_abs = max(stack[-1]._peak_abs, peak)
+            tracemalloc.reset_peak()
+            span._mem_start = span._peak_abs = current
+        stack.append(span)
+        span.start = time.perf_counter()
+
+    def _exit(self, span):
+        span.duration = time.perf_counter() - span.start
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        if self.memory:
+            tracemalloc = self._tracemalloc
+            span._peak_abs = max(span._peak_abs, tracemalloc.get_traced_memory()[1])
+            span.peak = span._peak_abs - span._mem_start
+            if stack:
+                stack[-1]._peak_abs = max(stack[-1]._peak_abs, span._peak_abs)
+            tracemalloc.reset_peak()
+        self._finish(span)
+
+    def record(self, name, start, duration, **counts):
+        # A span measured by the caller, e.g. across Tk after() callbacks
+        span = Span(self, name, counts)
+        span.start, span.duration = start, duration
+        self._adopt(span)
+        self._finish(span)
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+        for callback in self._listeners:
+            callback(span)
+
+    def close(self):
+        if self._started_tracing:
+            self._tracemalloc.stop()
+            self._started_tracing = False
+
+    def summary(self):
+        # Spans aggregated by their path of names from the root, each row
+        # right under its parent's, siblings in first-seen order:
+        # (depth, name, calls, total seconds, summed counts, max peak or None)
+        paths = {}
+
+        def path(s):
+            key = paths.get(id(s))
+            if key is None:
+                key = paths[id(s)] = (path(s.parent) if s.parent is not None else ()) + (s.name,)
+            return key
+
+        rows = {}
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        for s in spans:
+            key = path(s)
+            # Ancestors still open (the whole run, say) get an empty row
+            for depth in range(1, len(key) + 1):
+                if key[:depth] not in rows:
+                    rows[key[:depth]] = [depth - 1, key[depth - 1], 0, 0.0, {}, None]
+            row = rows[key]
+            row[2] += 1
+            row[3] += s.duration
+            for k, v in s.counts.items():
+                if isinstance(v, (int, float)):
+                    row[4][k] = row[4].get(k, 0) + v
+                else:
+                    row[4][k] = v
+            if s.peak is not None:
+                row[5] = max(row[5] or 0, s.peak)
+
+        children = {}
+        for key in rows:
+            children.setdefault(key[:-1], []).append(key)
+        ordered = []
+        stack = children.get((), [])[::-1]
+        while stack:
+            key = stack.pop()
+            ordered.append(tuple(rows[key]))
+            stack.extend(children.get(key, [])[::-1])
+        return ordered
+
+    def write_summary(self, out=None):
+        out = out or sys.stderr
+        out.write(f"\n[+] Profile ({time.perf_counter() - self.origin:.3f}s wall):\n")
+        out.write(f"  {'span':<48}{'calls':>6}{'total ms':>11}{'peak KiB':>10}  counts\n")
+        for depth, name, calls, total, counts, peak in self.summary():
+            label = ("  " * depth + name)[:48]
+            peak = f"{peak >> 10}" if peak is not None else "-"
+            counts = ", ".join(f"{k}={v}" for k, v in counts.items())
+            out.write(f"  {label:<48}{calls:>6}{total * 1000:>11.2f}{peak:>10}  {counts}\n")
+        out.flush()
+
+    def trace_events(self):
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = []
+        for s in spans:
+            args = dict(s.counts)
+            if s.peak is not None:
+                args["peak_bytes"] = s.peak
+            events.append({
+                "name": s.name, "cat": "chihiro", "ph": "X", "pid": pid, "tid": s.tid,
+                "ts": round((s.start - self.origin) * 1e6, 3),
+                "dur": round(s.duration * 1e6, 3),
+                "args": args,
+            })
+        return events
+
+    def write_trace(self, path):
+        # Loadable in chrome://tracing or Perfetto
+        import json
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+
+
+_profiler = None
+
+
+def span(name, **counts):
+    if _profiler is None:
+        return _NULL
+    return Span(_profiler, name, counts)
+
+
+def record(name, start, duration, **counts):
+    if _profiler is not None:
+        _profiler.record(name, start, duration, **counts)
+
+
+def current_span():
+    # To hand to attached() on another thread; None when not profiling
+    return _profiler.current() if _profiler is not None else None
+
+
+class attached:
+    # with attached(parent): spans opened inside nest under `parent`, a span
+    # captured with current_span() on another thread
+    __slots__ = ("parent", "_profiler", "_previous")
+
+    def __init__(self, parent):
+        self.parent = parent
+        self._profiler = None
+
+    def __enter__(self):
+        if self.parent is not None:
+            self._profiler = self.parent.profiler
+            self._previous = self._profiler.attach(self.parent)
+        return self
+
+    def __exit__(self, *exc):
+        if self._profiler is not None:
+            self._profiler.attach(self._previous)
+
+
+def active():
+    return _profiler
+
+
+def enable(memory=False):
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(memory)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.close()
+    return profiler
+
+
+def enable_from_env(environ=os.environ):
+    # (profiler, trace path or None) when CHIHIRO_PROFILE is set, else (None, None)
+    value = environ.get(ENV_VAR, "")
+    if value.lower() in ("", "0", "false", "no"):
+        return None, None
+    memory = environ.get(MEMORY_ENV_VAR, "").lower() not in ("", "0", "false", "no")
+    trace = value if value.lower().endswith(".json") else None
+    return enable(memory), trace
+
+
+def finish(trace=None, out=None):
+    # Disables profiling, prints the summary and writes the trace file if asked
+    profiler = disable()
+    if profiler is None:
+        return
+    profiler.write_summary(out)
+    if trace:
+        profiler.write_trace(trace)
+        (out or sys.stderr).write(f"[+] Trace written to {trace}\n")
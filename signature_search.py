@@ -0,0 +1,203 @@
+from array import array
+from collections import namedtuple
+
+from profiling import span
+
+# Byte signatures such as "48 8b 05 ?? ?? ?? ?? 4? 85 c0": hex bytes, "??"
+# for any byte and "4?" / "?f" for a known high or low nibble. Every
+# signature contributes one short anchor (a run of fully known bytes, or
+# the 16 values of one half-known byte) to a single Aho-Corasick automaton;
+# one pass over each section finds all anchor hits, and only those
+# positions are checked against the whole masked pattern. The pass costs
+# the same for ten signatures or ten thousand.
+#
+# The automaton is a dense DFA in one flat array: entry state + byte is the
+# next state, with states stored pre-multiplied by 256. Accepting states
+# are numbered last, so the scan loop tests a hit with one comparison.
+
+Signature = namedtuple("Signature", "name text size value mask")
+Match = namedtuple("Match", "offset vaddr section signature")
+
+MAX_ANCHOR = 4
+CHUNK_SIZE = 1 << 20
+# Bytes too common in code and data to make good anchors
+_COMMON_BYTES = frozenset(b"\x00\xff\x48\x89\x8b\x0f\xcc\x90")
+
+
+def parse_signature(text, name=None):
+    # "e8 ?? ?? ?? ?? 4?" or "e8????????4?"; raises ValueError
+    digits = "".join(text.split())
+    if not digits or len(digits) % 2:
+        raise ValueError(f"Signature needs whole bytes: {text!r}")
+    value = mask = 0
+    for i in range(0, len(digits), 2):
+        byte_value = byte_mask = 0
+        for shift, digit in ((4, digits[i]), (0, digits[i + 1])):
+            if digit == "?":
+                continue
+            try:
+                byte_value |= int(digit, 16) << shift
+            except ValueError:
+                raise ValueError(f"Bad hex digit {digit!r} in signature {text!r}") from None
+            byte_mask |= 0xF << shift
+        value = value << 8 | byte_value
+        mask = mask << 8 | byte_mask
+    if not mask:
+        raise ValueError(f"Signature has no fixed bits: {text!r}")
+    size = len(digits) // 2
+    return Signature(name or " ".join(text.split()), text, size, value, mask)
+
+
+def load_signatures(path):
+    # One signature per line, "pattern" or "name = pattern"; '#' comments
+    signatures = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            name, _, pattern = line.rpartition("=")
+            try:
+                signatures.append(parse_signature(pattern, name.strip() or None))
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: {e}") from None
+    return signatures
+
+
+def _columns(sig):
+    # Per byte (value, mask), first byte first
+    return [
+        (sig.value >> shift & 0xFF, sig.mask >> shift & 0xFF)
+        for shift in range(8 * (sig.size - 1), -1, -8)
+    ]
+
+
+def _anchor(sig):
+    # (offset in the signature, [anchor byte strings]) for the best short
+    # window of fully known bytes, else the 16 values of a half-known byte
+    columns = _columns(sig)
+    best = None
+    for start in range(sig.size):
+        length = 0
+        while length < MAX_ANCHOR and start + length < sig.size and columns[start + length][1] == 0xFF:
+            length += 1
+        if not length:
+            continue
+        window = bytes(v for v, _ in columns[start:start + length])
+        score = (length, -sum(b in _COMMON_BYTES for b in window))
+        if best is None or score > best[0]:
+            best = (score, start, window)
+    if best is not None:
+        return best[1], [best[2]]
+    start = next(i for i, (_, m) in enumerate(columns) if m)
+    value, mask = columns[start]
+    return start, [bytes([b]) for b in range(256) if b & mask == value]
+
+
+class SignatureSet:
+    def __init__(self, signatures):
+        self.signatures = list(signatures)
+        with span("compile_signatures", signatures=len(self.signatures)) as s:
+            self._compile()
+            s.count(states=len(self.delta) // 256)
+
+    def _compile(self):
+        # Trie of anchors; outputs[state] = [(signature, start - end offset)]
+        goto = [{}]
+        outputs = [[]]
+        for index, sig in enumerate(self.signatures):
+            offset, anchors = _anchor(sig)
+            for anchor in anchors:
+                state = 0
+                for b in anchor:
+                    nxt = goto[state].get(b)
+                    if nxt is None:
+                        nxt = goto[state][b] = len(goto)
+                        goto.append({})
+                        outputs.append([])
+                    state = nxt
+                # Match start relative to the last anchor byte
+                outputs[state].append((index, offset + len(anchor) - 1))
+
+        # Failure links breadth first, merging the outputs along them
+        count = len(goto)
+        fail = [0] * count
+        order = []
+        queue = list(goto[0].values())
+        while queue:
+            following = []
+            for state in queue:
+                order.append(state)
+                outputs[state] = outputs[state] + outputs[fail[state]]
+                for b, t in goto[state].items():
+                    f = fail[state]
+                    while f and b not in goto[f]:
+                        f = fail[f]
+                    fail[t] = goto[f].get(b, 0)
+                    following.append(t)
+            queue = following
+
+        # Accepting states last: ids at or above `threshold` have outputs
+        ranked = [0] + sorted(order, key=lambda st: bool(outputs[st]))
+        renumber = [0] * count
+        for new, old in enumerate(ranked):
+            renumber[old] = new * 256
+        accepting = sum(1 for st in order if outputs[st])
+        self.threshold = (count - accepting) * 256 if accepting else 256 * count
+        self.outputs = {renumber[st]: outputs[st] for st in order if outputs[st]}
+
+        # A state's row is its fail row with its own edges on top, which
+        # makes the automaton a DFA; fail rows are always filled first
+        delta = self.delta = array('I', bytes(4 * 256 * count))
+        delta[0:256] = array('I', (renumber[goto[0].get(b, 0)] for b in range(256)))
+        for state in order:
+            base, fail_base = renumber[state], renumber[fail[state]]
+            delta[base:base + 256] = delta[fail_base:fail_base + 256]
+            for b, t in goto[state].items():
+                delta[base + b] = renumber[t]
+
+    def scan(self, buf, start=0, end=None):
+        # (offset, signature index) of every match inside buf[start:end], in
+        # offset order
+        end = len(buf) if end is None else end
+        delta, threshold, outputs = self.delta, self.threshold, self.outputs
+        signatures = self.signatures
+        found = []
+        state = 0
+        for chunk_start in range(start, end, CHUNK_SIZE):
+            chunk = bytes(buf[chunk_start:min(chunk_start + CHUNK_SIZE, end)])
+            for pos, b in enumerate(chunk, chunk_start):
+                state = delta[state + b]
+                if state >= threshold:
+                    for index, back in outputs[state]:
+                        offset = pos - back
+                        sig = signatures[index]
+                        if offset < start or offset + sig.size > end:
+                            continue
+                        window = int.from_bytes(buf[offset:offset + sig.size], "big")
+                        if window & sig.mask == sig.value:
+                            found.append((offset, index))
+        found.sort()
+        return found
+
+
+def _search_regions(binary):
+    # File-backed sections, or the PT_LOAD segments without section headers
+    regions = [s for s in binary.sections() if s.size]
+    return sorted(regions or binary.segments(), key=lambda r: r.offset)
+
+
+def search_binary(binary, signatures):
+    # [Match] over every section; signatures: a SignatureSet or Signatures
+    if not isinstance(signatures, SignatureSet):
+        signatures = SignatureSet(signatures)
+    regions = _search_regions(binary)
+    with span("signature_search", bytes=sum(r.size for r in regions),
+              signatures=len(signatures.signatures)) as s:
+        matches = []
+        for region in regions:
+            for offset, index in signatures.scan(binary.view, region.offset, region.offset + region.size):
+                vaddr = region.vaddr + (offset - region.offset) if region.vaddr else None
+                matches.append(Match(offset, vaddr, region.name, signatures.signatures[index]))
+        s.count(matches=len(matches))
+    return matches
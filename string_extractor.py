@@ -1,4 +1,123 @@
+import bisect
+import heapq
+import os
 import re
+from collections import namedtuple
+
+StringRecord = namedtuple("StringRecord", "offset vaddr section encoding text")
+
+ENCODINGS = ("ascii", "utf-16le")
+CHUNK_SIZE = 1 << 20
+PARALLEL_THRESHOLD = 64 << 20
+
+# Any byte that can be part of neither an ASCII nor a UTF-16LE run; a window
+# that ends just after one of these can be scanned independently of the next.
+_HARD_BREAK = re.compile(rb"[^\x00\x20-\x7E]")
+
+
+def _pattern(encoding, min_len):
+    if encoding == "ascii":
+        return re.compile(rb"[\x20-\x7E]{%d,}" % min_len)
+    if encoding == "utf-16le":
+        return re.compile(rb"(?:[\x20-\x7E]\x00){%d,}" % min_len)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def _windows(buf, start, end, chunk_size=CHUNK_SIZE):
+    while start < end:
+        cut = _HARD_BREAK.search(buf, min(start + chunk_size, end), end)
+        stop = cut.end() if cut else end
+        yield start, stop
+        start = stop
+
+
+def _scan_window(buf, start, end, patterns):
+    # (offset, encoding index, raw bytes) for every run in [start, end)
+    runs = [
+        [(m.start(), e, m.group()) for m in pattern.finditer(buf, start, end)]
+        for e, pattern in enumerate(patterns)
+    ]
+    return list(heapq.merge(*runs)) if len(runs) > 1 else runs[0]
+
+
+# Set in the parent right before the pool forks, like disassembler._shard_code
+_scan_buffer = None
+
+
+def _scan_jobs(windows, patterns):
+    return [_scan_window(_scan_buffer, start, end, patterns) for start, end in windows]
+
+
+def scan_buffer(buf, start=0, end=None, min_len=4, encodings=ENCODINGS, jobs=1):
+    # Yields (offset, encoding, raw bytes) over buf[start:end] in offset order
+    global _scan_buffer
+
+    end = len(buf) if end is None else end
+    patterns = [_pattern(e, min_len) for e in encodings]
+
+    if jobs <= 1 or end - start < PARALLEL_THRESHOLD:
+        for w_start, w_end in _windows(buf, start, end):
+            for offset, e, raw in _scan_window(buf, w_start, w_end, patterns):
+                yield offset, encodings[e], raw
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    windows = list(_windows(buf, start, end))
+    per_job = max(1, len(windows) // (jobs * 4))
+    batches = [windows[i:i + per_job] for i in range(0, len(windows), per_job)]
+
+    _scan_buffer = buf
+    try:
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            for batch in pool.map(_scan_jobs, batches, [patterns] * len(batches)):
+                for runs in batch:
+                    for offset, e, raw in runs:
+                        yield offset, encodings[e], raw
+    finally:
+        _scan_buffer = None
+
+
+def _regions(binary, source):
+    if source == "file":
+        return [(None, 0, len(binary))]
+    if source == "all":
+        return [(s, s.offset, s.offset + s.size) for s in binary.sections() if s.size]
+    region = binary.section(source)
+    if region is None:
+        region = next((s for s in binary.segments() if s.name == source), None)
+    if region is None:
+        raise KeyError(f"No section or segment named {source}")
+    return [(region, region.offset, region.offset + region.size)]
+
+
+def iter_strings(binary, source=".text", min_len=4, encodings=ENCODINGS, jobs=1):
+    # source: a section or segment name, "all" for every section, "file" for the raw file
+    sections = sorted((s for s in binary.sections() if s.size), key=lambda s: s.offset)
+    section_starts = [s.offset for s in sections]
+
+    def section_at(offset):
+        i = bisect.bisect_right(section_starts, offset) - 1
+        if i >= 0 and offset < sections[i].offset + sections[i].size:
+            return sections[i]
+        return None
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    for region, start, end in _regions(binary, source):
+        for offset, encoding, raw in scan_buffer(binary.view, start, end, min_len, encodings, jobs):
+            owner = region or section_at(offset)
+            if owner is not None and owner.vaddr:
+                vaddr = owner.vaddr + (offset - owner.offset)
+            elif region is None:
+                vaddr = binary.offset_to_vaddr(offset)
+            else:
+                vaddr = None
+            text = raw.decode("ascii" if encoding == "ascii" else "utf-16-le")
+            yield StringRecord(offset, vaddr, owner.name if owner else None, encoding, text)
+
 
 def extract_ascii_strings(data, min_len=4):
-    return re.findall(rb'[\x20-\x7E]{%d,}' % min_len, data)
+    return [raw for _, _, raw in scan_buffer(data, min_len=min_len, encodings=("ascii",))]
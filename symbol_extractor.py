@@ -1,4 +1,26 @@
+import bisect
+import re
+from array import array
+
+from elftools.elf.relocation import RelocationSection
+from elftools.elf.sections import SymbolTableSection
+
+from profiling import span
+
+PLT_SECTIONS = (".plt", ".plt.sec", ".plt.got")
+PLT_ENTRY_SIZE = 16
+_JMP_RIP = b"\xff\x25"  # jmp qword ptr [rip + disp32]
+_RIP_OPERAND = re.compile(r"\[rip ([+-]) (0x[0-9a-f]+)\]")
+
+
 def extract_symbols(elf):
+    with span("extract_symbols") as s:
+        symbols = _read_symbols(elf)
+        s.count(symbols=len(symbols))
+    return symbols
+
+
+def _read_symbols(elf):
     symbols = []
 
     ELF_TYPE_MAP = {
@@ -12,7 +34,8 @@ def extract_symbols(elf):
     }
 
     for section in elf.iter_sections():
-        if not hasattr(section, 'iter_symbols'):
+        # .gnu.version also has iter_symbols() but holds version entries only
+        if not isinstance(section, SymbolTableSection):
             continue
 
         for symbol in section.iter_symbols():
@@ -25,9 +48,15 @@ def extract_symbols(elf):
                 sym_addr = 0
 
            
+            sym_size = symbol['st_size']
+
             try:
                 sym_type_code = symbol['st_info']['type']
-                sym_type = ELF_TYPE_MAP.get(sym_type_code, f"TYPE_{sym_type_code}")
+                if isinstance(sym_type_code, str):
+                    # pyelftools already decodes known types ('STT_FUNC', ...)
+                    sym_type = sym_type_code.replace("STT_", "", 1)
+                else:
+                    sym_type = ELF_TYPE_MAP.get(sym_type_code, f"TYPE_{sym_type_code}")
             except Exception:
                 sym_type = "UNKNOWN"
 
@@ -35,7 +64,233 @@ def extract_symbols(elf):
                 symbols.append({
                     'name': sym_name,
                     'addr': sym_addr,
-                    'type': sym_type
+                    'type': sym_type,
+                    'size': sym_size
                 })
 
     return symbols
+
+
+def import_symbols(binary):
+    # PLT stubs ("puts@plt") and GOT slots ("puts@got") named after the
+    # dynamic relocations that fill the slots. Stubs are matched to slots
+    # through their `jmp [rip + disp32]`, which covers .plt, .plt.sec (IBT)
+    # and .plt.got alike.
+    elf = binary.elf
+    slots = {}
+    for section in elf.iter_sections():
+        if not isinstance(section, RelocationSection) or not section['sh_link']:
+            continue
+        symtab = elf.get_section(section['sh_link'])
+        if not isinstance(symtab, SymbolTableSection):
+            continue
+        for rel in section.iter_relocations():
+            index = rel['r_info_sym']
+            if index:
+                name = symtab.get_symbol(index).name
+                if name:
+                    slots[rel['r_offset']] = name
+
+    imports = []
+    for addr, name in slots.items():
+        imports.append({'name': f"{name}@got", 'addr': addr, 'type': "OBJECT", 'size': 8})
+    for section_name in PLT_SECTIONS:
+        region = binary.section(section_name)
+        if region is None or not region.vaddr:
+            continue
+        data = bytes(region.data)
+        for offset in range(0, len(data) - PLT_ENTRY_SIZE + 1, PLT_ENTRY_SIZE):
+            pos = data.find(_JMP_RIP, offset, offset + PLT_ENTRY_SIZE - 5)
+            if pos < 0:
+                continue
+            disp = int.from_bytes(data[pos + 2:pos + 6], "little", signed=True)
+            name = slots.get(region.vaddr + pos + 6 + disp)
+            if name is not None:
+                imports.append({'name': f"{name}@plt", 'addr': region.vaddr + offset,
+                                'type': "FUNC", 'size': PLT_ENTRY_SIZE})
+    return imports
+
+
+def function_regions(binary):
+    # [start, end) of every mapped section with contents, or of the PT_LOAD
+    # segments without section headers
+    regions = [(s.vaddr, s.vaddr + s.size) for s in binary.sections() if s.vaddr and s.size]
+    if not regions:
+        regions = [(s.vaddr, s.vaddr + s.size) for s in binary.segments() if s.size]
+    return sorted(regions)
+
+
+class SymbolIndex:
+    # Every symbol of a binary, deduplicated across .symtab and .dynsym, plus
+    # PLT/GOT names. Functions are also kept as sorted parallel columns so
+    # address -> containing function is a bisect, and labels are memoized
+    # per address for the disassembly printers. regions: sorted [start, end)
+    # address ranges of the sections (or segments) that bound functions.
+    def __init__(self, symbols, regions=()):
+        unique = {}
+        for sym in symbols:
+            # .symtab spells imports "puts@GLIBC_2.2.5", .dynsym just "puts"
+            key = (sym['name'].partition('@')[0] if not sym['addr'] else sym['name'], sym['addr'])
+            prev = unique.get(key)
+            if prev is None or (not prev['size'] and sym['size']) or (
+                    bool(prev['size']) == bool(sym['size']) and len(sym['name']) > len(prev['name'])):
+                unique[key] = sym
+        self.symbols = sorted(unique.values(), key=lambda s: (s['addr'], s['name']))
+
+        self.by_name = {}
+        self.by_addr = {}
+        for sym in self.symbols:
+            # Versioned imports are also found by their bare name ("puts")
+            base, at, version = sym['name'].partition('@')
+            for name in (sym['name'], base) if at and version not in ("plt", "got") else (sym['name'],):
+                prev = self.by_name.get(name)
+                if prev is None or (not prev['addr'] and sym['addr']):
+                    self.by_name[name] = sym
+            if sym['addr'] and sym['type'] in ("FUNC", "OBJECT"):
+                self.by_addr.setdefault(sym['addr'], sym['name'])
+
+        # One name per function start; sizeless ones end at the next start
+        # or at the end of their section, whichever comes first
+        functions = {}
+        for sym in self.symbols:
+            if sym['type'] == "FUNC" and sym['addr']:
+                prev = functions.get(sym['addr'])
+                if prev is None or (not prev['size'] and sym['size']):
+                    functions[sym['addr']] = sym
+        ordered = sorted(functions.items())
+        self.starts = array('Q', (addr for addr, _ in ordered))
+        self.ends = array('Q')
+        self.names = [sym['name'] for _, sym in ordered]
+        self.regions = sorted(regions)
+        region_starts = [start for start, _ in self.regions]
+        for i, (addr, sym) in enumerate(ordered):
+            if sym['size']:
+                self.ends.append(addr + sym['size'])
+                continue
+            end = ordered[i + 1][0] if i + 1 < len(ordered) else None
+            r = bisect.bisect_right(region_starts, addr) - 1
+            if r >= 0 and addr < self.regions[r][1]:
+                end = self.regions[r][1] if end is None else min(end, self.regions[r][1])
+            self.ends.append(addr + 1 if end is None else end)
+        self._labels = {}
+        self._objects = None
+
+    @classmethod
+    def build(cls, binary, symbols=None):
+        with span("symbol_index") as s:
+            if symbols is None:
+                symbols = extract_symbols(binary.elf)
+            index = cls(list(symbols) + import_symbols(binary), function_regions(binary))
+            s.count(symbols=len(index), functions=len(index.starts))
+        return index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def address_of(self, spec):
+        # Address for a number or symbol name, or None; an import is found at
+        # its PLT stub, or its GOT slot without one
+        try:
+            return int(spec, 0)
+        except ValueError:
+            pass
+        for name in (spec, f"{spec}@plt", f"{spec}@got"):
+            sym = self.by_name.get(name)
+            if sym is not None and sym['addr']:
+                return sym['addr']
+        return None
+
+    def function_at(self, addr):
+        # (start, end, name) of the function containing `addr`, or None
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            return self.starts[i], self.ends[i], self.names[i]
+        return None
+
+    def functions(self):
+        return list(zip(self.starts, self.ends, self.names))
+
+    def label(self, addr):
+        # "func" or "func+0x1c" for an address inside a function, else None
+        label = self._labels.get(addr, False)
+        if label is False:
+            found = self.function_at(addr)
+            if found is None:
+                label = None
+            else:
+                start, _, name = found
+                label = name if addr == start else f"{name}+0x{addr - start:x}"
+            self._labels[addr] = label
+        return label
+
+    def object_at(self, addr):
+        # (start, end, name) of the sized data object containing `addr`, or
+        # None; the columns are built on first use
+        if self._objects is None:
+            objects = sorted({
+                (sym['addr'], sym['addr'] + sym['size'], sym['name']) for sym in self.symbols
+                if sym['type'] == "OBJECT" and sym['addr'] and sym['size']
+            })
+            self._objects = (array('Q', (o[0] for o in objects)), [o[1] for o in objects], [o[2] for o in objects])
+        starts, ends, names = self._objects
+        i = bisect.bisect_right(starts, addr) - 1
+        if i >= 0 and addr < ends[i]:
+            return starts[i], ends[i], names[i]
+        return None
+
+    def symbol_label(self, addr):
+        # label(), falling back to "object" / "object+0x10" for data
+        label = self.label(addr)
+        if label is None:
+            found = self.object_at(addr)
+            if found is not None:
+                start, _, name = found
+                label = name if addr == start else f"{name}+0x{addr - start:x}"
+        return label
+
+    def name_at(self, addr):
+        # Exact symbol (e.g. a GOT slot) first, then the containing function
+        return self.by_addr.get(addr) or self.label(addr)
+
+    def annotations(self, table):
+        # {row: "  <func+0x1c>"} for the direct and [rip + disp] calls/jumps
+        # of an InstructionTable that land on a known symbol. Rows are picked
+        # by interned mnemonic id and direct targets memoized per operand, so
+        # printers only pay a dict lookup per line.
+        branches = {m for m, name in enumerate(table.mnemonics) if name == "call" or name.startswith("j")}
+        op_strs, addresses, sizes = table.op_strs, table.addresses, table.sizes
+        starts, ends, names = self.starts, self.ends, self.names
+        bisect_right = bisect.bisect_right
+        direct = {}
+        notes = {}
+        for i in [i for i, m in enumerate(table.mnemonic_ids) if m in branches]:
+            op_str = op_strs[i]
+            if op_str[:2] == "0x":
+                note = direct.get(op_str)
+                if note is None:
+                    note = ""
+                    try:
+                        target = int(op_str, 16)
+                    except ValueError:
+                        target = -1
+                    f = bisect_right(starts, target) - 1
+                    if f >= 0 and target < ends[f]:
+                        offset = target - starts[f]
+                        note = f"  <{names[f]}+0x{offset:x}>" if offset else f"  <{names[f]}>"
+                    direct[op_str] = note
+            else:
+                rip = _RIP_OPERAND.search(op_str)
+                if rip is None:
+                    continue
+                disp = int(rip.group(2), 16)
+                label = self.name_at(addresses[i] + sizes[i] + (disp if rip.group(1) == "+" else -disp))
+                note = f"  <{label}>" if label else ""
+            if note:
+                notes[i] = note
+        return notes
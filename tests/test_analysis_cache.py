@@ -0,0 +1,183 @@
+import os
+import zlib
+
+import pytest
+
+from analysis_cache import CODECS, MAGIC, AnalysisCache, evict
+from bench.synth_elf import build_elf
+from binary_loader import Binary
+from disassembler import InstructionTable, disassemble
+from graph.cfg_builder import build_cfg
+from graph.discovery import discover
+from graph.rodata_extractor import extract_rodata
+from string_extractor import iter_strings
+from symbol_extractor import SymbolIndex, extract_symbols
+from xref_analyzer import XrefIndex
+
+
+@pytest.fixture(scope="module")
+def artifacts(tmp_path_factory):
+    # One real value of every cached kind, from a synthetic binary
+    path = tmp_path_factory.mktemp("synth") / "cache.elf"
+    path.write_bytes(build_elf(functions=30, text_size=8 << 10, rodata_size=2 << 10, seed=4, extras=True))
+    with Binary(str(path)) as binary:
+        text = binary.section(".text")
+        symbols = extract_symbols(binary.elf)
+        index = SymbolIndex.build(binary, symbols)
+        instructions = disassemble(text.data, text.vaddr)
+        values = {
+            'symbols': symbols,
+            'symindex': index,
+            'instructions': instructions,
+            'cfg': build_cfg(instructions, text.data, text.vaddr),
+            'xrefs': XrefIndex.build(instructions, text.data, text.vaddr, binary.address_ranges()),
+            'discovery': discover(binary, index),
+            'strings': list(iter_strings(binary, "all")),
+            'rodata': extract_rodata(binary),
+            'layout': {n: (n * 1.5, -n / 3, 80.0 + n, 24.25) for n in range(50)},
+        }
+    yield str(path), values
+
+
+def plain(kind, value):
+    # Comparable form of a decoded artifact
+    if kind == 'symindex':
+        return value.symbols, [tuple(r) for r in value.regions]
+    if kind == 'instructions':
+        return list(value.rows())
+    if kind == 'cfg':
+        return (list(value.rows), list(value.counts), list(value.edges()), value.entries,
+                plain('instructions', value.instructions))
+    if kind == 'xrefs':
+        return list(value.targets), list(value.sites), list(value.kinds)
+    if kind == 'discovery':
+        return (plain('instructions', value.instructions), list(value.block_ids), value.edges,
+                {e: list(b) for e, b in value.functions.items()}, value.jump_tables,
+                value.unresolved, value.unreached, value.seeds)
+    return value
+
+
+def test_every_kind_is_tested(artifacts):
+    assert set(artifacts[1]) == set(CODECS)
+
+
+@pytest.mark.parametrize("kind", sorted(CODECS))
+def test_round_trip_through_disk(tmp_path, artifacts, kind):
+    path, values = artifacts
+    value = values[kind]
+    assert plain(kind, value)  # not vacuous
+    AnalysisCache(path, root=str(tmp_path)).put(kind, value)
+    # A fresh cache has nothing memoized: this reads the file
+    ctx = {'instructions': values['instructions']} if kind == 'cfg' else {}
+    loaded = AnalysisCache(path, root=str(tmp_path)).lookup(kind, **ctx)
+    assert loaded is not None and loaded is not value
+    assert plain(kind, loaded) == plain(kind, value)
+
+
+@pytest.mark.parametrize("kind, empty", [
+    ('symbols', []), ('instructions', InstructionTable()), ('strings', []), ('rodata', []), ('layout', {}),
+])
+def test_empty_round_trip(kind, empty):
+    encode, decode = CODECS[kind]
+    assert plain(kind, decode(encode(empty))) == plain(kind, empty)
+
+
+def cache_file(tmp_path, path, kind):
+    cache = AnalysisCache(path, root=str(tmp_path))
+    cache.put(kind, ["a", "b"])
+    return cache._artifact_path(kind)
+
+
+def test_magic_mismatch_is_a_miss(tmp_path, artifacts):
+    path = artifacts[0]
+    artifact = cache_file(tmp_path, path, 'rodata')
+    with open(artifact, 'r+b') as f:
+        f.write(b"CHC\x01")
+    assert AnalysisCache(path, root=str(tmp_path)).lookup('rodata', "miss") == "miss"
+    assert MAGIC != b"CHC\x01"
+
+
+@pytest.mark.parametrize("damage", [
+    lambda raw: raw[:len(raw) // 2],
+    lambda raw: MAGIC + b"not zlib at all",
+    lambda raw: MAGIC + zlib.compress(b"not a pickle"),
+    lambda raw: b"",
+], ids=["truncated", "not zlib", "not pickle", "empty"])
+def test_corrupt_file_is_a_miss(tmp_path, artifacts, damage):
+    path = artifacts[0]
+    artifact = cache_file(tmp_path, path, 'rodata')
+    with open(artifact, 'rb') as f:
+        raw = f.read()
+    with open(artifact, 'wb') as f:
+        f.write(damage(raw))
+    computed = []
+    cache = AnalysisCache(path, root=str(tmp_path))
+    assert cache.get('rodata', lambda: computed.append(1) or ["fresh"]) == ["fresh"]
+    assert computed == [1]
+    # ... and the rewritten file is good again
+    assert AnalysisCache(path, root=str(tmp_path)).lookup('rodata') == ["fresh"]
+
+
+def make_entry(root, name, size, age):
+    entry = root / name
+    entry.mkdir()
+    (entry / "x.bin").write_bytes(b"\0" * size)
+    os.utime(entry, (age, age))
+    return str(entry)
+
+
+def test_evict_removes_the_oldest_entries_but_keeps_keep(tmp_path):
+    old = make_entry(tmp_path, "old", 400, 1000)
+    kept = make_entry(tmp_path, "kept", 400, 2000)
+    middle = make_entry(tmp_path, "middle", 400, 3000)
+    young = make_entry(tmp_path, "young", 400, 4000)
+    (tmp_path / "stray.txt").write_text("not an entry")
+    evict(str(tmp_path), max_bytes=800, keep=kept)
+    assert sorted(os.listdir(tmp_path)) == ["kept", "stray.txt", "young"]
+    assert not os.path.exists(old) and not os.path.exists(middle) and os.path.exists(young)
+
+
+def test_evict_within_budget_keeps_everything(tmp_path):
+    make_entry(tmp_path, "a", 100, 1000)
+    make_entry(tmp_path, "b", 100, 2000)
+    evict(str(tmp_path), max_bytes=200)
+    assert sorted(os.listdir(tmp_path)) == ["a", "b"]
+    evict(str(tmp_path / "missing"), max_bytes=0)
+
+
+def test_store_evicts_other_entries(tmp_path, artifacts):
+    path = artifacts[0]
+    stale = make_entry(tmp_path, "stale", 1000, 1000)
+    cache = AnalysisCache(path, root=str(tmp_path), max_bytes=500)
+    cache.put('rodata', ["x"])
+    assert not os.path.exists(stale) and os.path.exists(cache._artifact_path('rodata'))
+
+
+def test_cache_directories_are_private(tmp_path, artifacts):
+    root = tmp_path / "root"
+    cache = AnalysisCache(artifacts[0], root=str(root))
+    cache.put('rodata', ["x"])
+    assert os.stat(root).st_mode & 0o077 == 0
+    assert os.stat(cache.entry_dir).st_mode & 0o077 == 0
+
+
+def test_cache_writable_by_others_is_ignored(tmp_path, artifacts, capsys):
+    path = artifacts[0]
+    cache_file(tmp_path, path, 'rodata')
+    os.chmod(tmp_path, 0o777)
+    cache = AnalysisCache(path, root=str(tmp_path))
+    assert cache.lookup('rodata', "miss") == "miss"
+    assert "writable by other users" in capsys.readouterr().err
+    cache.put('rodata', ["not written"])
+    os.chmod(tmp_path, 0o700)
+    assert AnalysisCache(path, root=str(tmp_path)).lookup('rodata') == ["a", "b"]
+
+
+def test_disabled_and_rebuild(tmp_path, artifacts):
+    path = artifacts[0]
+    cache_file(tmp_path, path, 'rodata')
+    assert AnalysisCache(path, root=str(tmp_path), rebuild=True).lookup('rodata', "miss") == "miss"
+    disabled = AnalysisCache(path, root=str(tmp_path), enabled=False)
+    disabled.put('symbols', [])
+    assert not os.path.exists(disabled._artifact_path('symbols'))
+    assert disabled.lookup('symbols') == []
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+from analysis_db import export_db, format_rows, run_query
+from binary_loader import Binary
+from disassembler import disassemble
+from graph.cfg_builder import build_cfg
+from string_extractor import StringRecord, iter_strings
+from symbol_extractor import SymbolIndex
+from ui.cli import run_cli
+from xref_analyzer import XrefIndex
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+@pytest.fixture(scope="module")
+def test_db(tmp_path_factory):
+    # Exported the way the CLI does it
+    path = str(tmp_path_factory.mktemp("db") / "test.db")
+    argv = sys.argv
+    sys.argv = ["chihiro", TEST_ELF, "--no-cache", "--export-db", path]
+    try:
+        run_cli()
+    finally:
+        sys.argv = argv
+    return path
+
+
+needs_test_elf = pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+
+
+@needs_test_elf
+def test_export_matches_the_analysis(test_db):
+    with Binary(TEST_ELF) as binary:
+        text = binary.section(".text")
+        index = SymbolIndex.build(binary)
+        instructions = disassemble(text.data, text.vaddr)
+        cfg = build_cfg(instructions, text.data, text.vaddr)
+        xrefs = XrefIndex.build(instructions, text.data, text.vaddr, binary.address_ranges())
+        strings = list(iter_strings(binary, "all"))
+    stats = dict(run_query(test_db, "stats")[1])
+    assert stats == {
+        'symbols': len(index.symbols), 'functions': len(index.functions()),
+        'instructions': len(instructions), 'blocks': len(cfg), 'edges': cfg.edge_count,
+        'xrefs': len(xrefs), 'strings': len(strings),
+    }
+    _, rows = run_query(test_db, "sql", "SELECT addr, size, mnemonic, op_str FROM instructions ORDER BY addr")
+    assert rows == [tuple(r) for r in instructions.rows()]
+    _, rows = run_query(test_db, "sql", "SELECT target, site FROM xrefs ORDER BY target, site, kind")
+    assert rows == list(zip(xrefs.targets, xrefs.sites))
+
+
+@needs_test_elf
+@pytest.mark.parametrize("query, arg, expected", [
+    ("callers", "puts", [(0x115b, "main")]),
+    ("callers", "__libc_start_main", [(0x107f, "_start")]),
+    ("callees", "main", [(0x1050, "puts@plt")]),
+    ("xrefs", "main", [(0x1078, "addr", "_start")]),
+    ("function-at", "0x1150", [(0x1149, 0x1167, "main")]),
+    ("string-refs", "Hello", [("main", 0x1151, "Hello from ELF!")]),
+])
+def test_canned_queries(test_db, query, arg, expected):
+    headers, rows = run_query(test_db, query, arg)
+    assert rows == expected
+
+
+@needs_test_elf
+def test_blocks_and_formatting(test_db):
+    headers, rows = run_query(test_db, "blocks", "main")
+    assert [r[0] for r in rows] == [0x1149, 0x1160]
+    lines = list(format_rows(headers, rows))
+    assert lines[0] == "block\tinsns\tsuccessors"
+    assert lines[1].startswith("0x1149\t")
+    with pytest.raises(KeyError, match="Unknown symbol"):
+        run_query(test_db, "callers", "no_such_function")
+
+
+def test_addresses_above_2_63(tmp_path):
+    # A kernel-style image: every address is >= 2**63
+    base = 0xffffffff81000000
+    code = bytes.fromhex(
+        "e8 0b000000"       # base+0x0  call base+0x10
+        "488d05 f4ffffff"   # base+0x5  lea rax, [rip - 0xc]  -> base
+        "c3"                # base+0xc  ret
+        "90 90 90"
+        "31c0"              # base+0x10 xor eax, eax
+        "c3"                # base+0x12 ret
+    )
+    instructions = disassemble(code, base)
+    cfg = build_cfg(instructions, code, base)
+    xrefs = XrefIndex.build(instructions, code, base, [(base, base + len(code))])
+    symbols = [
+        {'name': "start_kernel", 'addr': base, 'type': "FUNC", 'size': 0xd},
+        {'name': "helper", 'addr': base + 0x10, 'type': "FUNC", 'size': 3},
+    ]
+    strings = [StringRecord(0x40, base + 0x100, ".rodata", "ascii", "banner")]
+    path = str(tmp_path / "kernel.db")
+    export_db(path, symbols, instructions, cfg, xrefs, strings)
+
+    assert run_query(path, "callers", "helper")[1] == [(base, "start_kernel")]
+    assert run_query(path, "callees", "start_kernel")[1] == [(base + 0x10, "helper")]
+    assert run_query(path, "xrefs", hex(base))[1] == [(base + 5, "addr", "start_kernel")]
+    assert run_query(path, "function-at", hex(base + 0x11))[1] == [(base + 0x10, base + 0x13, "helper")]
+    assert run_query(path, "strings", "banner")[1] == [(0x40, base + 0x100, ".rodata", "ascii", "banner")]
+    headers, rows = run_query(path, "blocks", "start_kernel")
+    assert rows[0][0] == base
+    assert list(format_rows(headers, rows))[1].startswith(f"0x{base:x}\t")
+    # Stored within SQLite's signed range
+    db = sqlite3.connect(path)
+    assert db.execute("SELECT min(addr) FROM instructions").fetchone()[0] == base - (1 << 64)
+    db.close()
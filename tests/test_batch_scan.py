@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import shutil
+import signal
+import time
+
+import pytest
+
+import batch_scan
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+
+
+def fake_analyze(path, min_len=4):
+    # Stands in for the real analysis: slow enough that several files are in
+    # flight, and fatal for the worker on the "bomb" samples
+    time.sleep(0.05)
+    if "bomb" in os.path.basename(path):
+        time.sleep(0.1)
+        os.kill(os.getpid(), signal.SIGKILL)
+    return {"path": path}
+
+
+@pytest.fixture
+def samples(tmp_path):
+    root = tmp_path / "samples"
+    root.mkdir()
+    for i in range(16):
+        shutil.copy(TEST_ELF, root / f"sample{i:02d}")
+    return root
+
+
+def run(root, checkpoint, jobs=2):
+    out = io.StringIO()
+    stats = batch_scan.scan([str(root)], out=out, jobs=jobs, timeout=0, memory_mb=0, checkpoint=str(checkpoint))
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    return stats, records
+
+
+@pytest.mark.parametrize("bombs", [["sample03"], ["sample03", "sample04"], ["sample00", "sample15"]])
+def test_a_killed_worker_only_loses_its_own_file(samples, tmp_path, monkeypatch, bombs):
+    monkeypatch.setattr(batch_scan, "analyze_file", fake_analyze)
+    for name in bombs:
+        (samples / name).rename(samples / f"{name}-bomb")
+    checkpoint = tmp_path / "scan.ckpt"
+
+    stats, records = run(samples, checkpoint)
+    by_path = {}
+    for r in records:
+        assert r["path"] not in by_path
+        by_path[r["path"]] = r
+    crashed = sorted(os.path.basename(p) for p, r in by_path.items() if "error" in r)
+    assert crashed == sorted(f"{name}-bomb" for name in bombs)
+    assert all(r.get("error") in (None, "worker crashed") for r in records)
+    assert len(by_path) == 16 and stats == {"ok": 16 - len(bombs), "error": len(bombs)}
+    assert sorted(checkpoint.read_text().split()) == sorted(by_path)
+
+    # Nothing is left for a resumed scan
+    stats, records = run(samples, checkpoint)
+    assert records == [] and not stats
+
+
+def test_an_interrupted_scan_resumes_the_rest(samples, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_scan, "analyze_file", fake_analyze)
+    checkpoint = tmp_path / "scan.ckpt"
+    paths = sorted(str(p) for p in samples.iterdir())
+    checkpoint.write_text("\n".join(paths[:5]) + "\n")
+
+    stats, records = run(samples, checkpoint)
+    assert sorted(r["path"] for r in records) == paths[5:]
+    assert sorted(checkpoint.read_text().split()) == paths
+
+
+def test_real_analysis_record(samples, tmp_path):
+    stats, records = run(samples / "sample00", tmp_path / "ckpt", jobs=1)
+    (record,) = records
+    assert record["info"]["class"] == "ELF64" and record["functions"] > 0 and not record["stripped"]
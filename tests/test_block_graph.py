@@ -0,0 +1,59 @@
+import random
+from types import SimpleNamespace
+
+import networkx as nx
+import pytest
+
+from graph.block_graph import BlockGraph, DominatorTree, natural_loops
+
+
+def make_graph(count, edges, entries=()):
+    # One single-instruction block per id, at address == id
+    table = SimpleNamespace(addresses=list(range(count)), sizes=[1] * count)
+    edges = sorted(set(edges))
+    return BlockGraph(
+        table, range(count), [1] * count,
+        [s for s, _ in edges], [d for _, d in edges], entries,
+    )
+
+
+def expected_idom(count, edges, roots):
+    # networkx with an explicit virtual root; -1 where it is the dominator
+    virtual = count
+    g = nx.DiGraph()
+    g.add_nodes_from(range(count + 1))
+    g.add_edges_from(edges)
+    g.add_edges_from((virtual, r) for r in roots)
+    idom = nx.immediate_dominators(g, virtual)
+    return [-1 if idom.get(b, virtual) == virtual else idom[b] for b in range(count)]
+
+
+def test_multi_root_repro():
+    g = make_graph(4, [(0, 2), (1, 2), (2, 3), (3, 2)], entries=(0, 1))
+    tree = DominatorTree(g)
+    assert list(tree.idom) == [-1, -1, -1, 2]
+    assert tree.dominates(2, 2) and tree.dominates(2, 3)
+    assert natural_loops(g) == [(2, [3], [2, 3])]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_dominators_match_networkx_with_several_roots(seed):
+    rng = random.Random(seed)
+    count = rng.randint(2, 30)
+    edges = [(rng.randrange(count), rng.randrange(count)) for _ in range(rng.randint(0, 3 * count))]
+    roots = sorted(rng.sample(range(count), rng.randint(1, min(4, count))))
+    tree = DominatorTree(make_graph(count, edges), roots)
+    assert list(tree.idom) == expected_idom(count, edges, roots)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_loop_bodies_only_hold_reachable_blocks(seed):
+    rng = random.Random(seed)
+    count = rng.randint(2, 30)
+    edges = [(rng.randrange(count), rng.randrange(count)) for _ in range(rng.randint(0, 3 * count))]
+    g = make_graph(count, edges, entries=(0,))
+    tree = DominatorTree(g)
+    reached = set(tree.order)
+    for loop in natural_loops(g, tree):
+        assert set(loop.blocks) <= reached
+        assert all(tree.dominates(loop.header, b) for b in loop.blocks)
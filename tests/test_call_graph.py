@@ -0,0 +1,124 @@
+import os
+import random
+import sys
+
+import pytest
+
+from bench.synth_elf import build_elf_layout
+from binary_loader import Binary
+from graph.call_graph import KIND_IMPORT, CallGraph, build_call_graph, refresh_functions
+from graph.discovery import discover
+from symbol_extractor import SymbolIndex
+from ui.cli import run_cli
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+def closure(callees):
+    # Transitive callees of every node, by plain DFS
+    reach = []
+    for start in range(len(callees)):
+        seen = set()
+        stack = list(callees[start])
+        while stack:
+            n = stack.pop()
+            if n not in seen:
+                seen.add(n)
+                stack.extend(callees[n])
+        reach.append(seen)
+    return reach
+
+
+def random_graph(rng, count, degree):
+    graph = CallGraph()
+    for n in range(count):
+        graph.add_function(0x1000 + n * 0x10, f"f{n}")
+    edges = [set(rng.sample(range(count), rng.randint(0, degree))) for _ in range(count)]
+    for n, callees in enumerate(edges):
+        graph._link(n, callees)
+    graph.close()
+    return graph, edges
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_update_function_matches_a_rebuild(seed):
+    rng = random.Random(seed)
+    count = rng.randint(2, 40)
+    graph, edges = random_graph(rng, count, 3)
+    for _ in range(30):
+        node = rng.randrange(count)
+        callees = set(edges[node])
+        if callees and rng.random() < 0.5:
+            callees.discard(rng.choice(sorted(callees)))
+        else:
+            callees.update(rng.sample(range(count), rng.randint(1, 2)))
+        edges[node] = callees
+        graph.update_function(graph.summaries[node].entry, callees, blocks=len(callees))
+        assert [set(graph.reachable(n)) for n in range(count)] == closure(edges)
+        assert graph.callers == [{c for c in range(count) if n in edges[c]} for n in range(count)]
+    assert graph.summaries[node].blocks == len(edges[node])
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    data, layout = build_elf_layout(functions=60, text_size=16 << 10, rodata_size=1 << 10, seed=5, extras=True)
+    path = tmp_path_factory.mktemp("synth") / "calls.elf"
+    path.write_bytes(data)
+    with Binary(str(path)) as binary:
+        index = SymbolIndex.build(binary)
+        yield discover(binary, index), index
+
+
+def test_refresh_functions_matches_a_rebuild(synthetic):
+    discovery, index = synthetic
+    graph = build_call_graph(discovery, index)
+    fresh = build_call_graph(discovery, index)
+    rng = random.Random(1)
+    entries = rng.sample(sorted(discovery.functions), 20)
+    for entry in entries:
+        # Forget what the function calls, as an older discovery would have
+        graph.update_function(entry, set(), size=0, blocks=0, instructions=0)
+    refresh_functions(graph, discovery, index, entries)
+    assert graph.summaries == fresh.summaries
+    assert graph.callees == fresh.callees and graph.callers == fresh.callers
+    assert graph.reach == fresh.reach
+
+
+def test_synthetic_calls(synthetic):
+    discovery, index = synthetic
+    graph = build_call_graph(discovery, index)
+    fatal, abort = graph.node("fatal_path"), graph.node("abort")
+    assert graph.callees[fatal] == {abort}
+    assert [set(graph.reachable(n)) for n in range(len(graph))] == closure(graph.callees)
+    assert graph.roots() == [n for n in range(len(graph)) if not graph.ancestors(n)]
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_test_elf_call_graph():
+    with Binary(TEST_ELF) as binary:
+        index = SymbolIndex.build(binary)
+        graph = build_call_graph(discovery := discover(binary, index), index)
+    main, start, puts = graph.node("main"), graph.node("_start"), graph.node("puts")
+    assert graph.callees[main] == {puts}
+    assert graph.summaries[puts].kind == KIND_IMPORT and graph.location(puts) == "extern"
+    libc_start_main = graph.node("__libc_start_main")
+    assert graph.callees[start] == {libc_start_main}
+    # The PLT stub and the GOT slot both name the import
+    assert graph.node(index.address_of("puts@plt")) == puts
+    assert graph.node(0x3fd8) == libc_start_main
+    order = graph.order()
+    kinds = [graph.summaries[n].kind for n in order]
+    assert kinds == sorted(kinds, key=lambda k: k == KIND_IMPORT)
+    assert len(discovery.functions) == sum(k != KIND_IMPORT for k in kinds)
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_cli_callers_of_and_reachable_from(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["chihiro", TEST_ELF, "--no-cache", "--callgraph",
+                                      "--callers-of", "puts", "--reachable-from", "_start"])
+    run_cli()
+    out = capsys.readouterr().out
+    assert "[+] Transitive callers of puts: 1\n  0x00001149  direct    main\n" in out
+    assert "[+] Functions reachable from _start: 1\n  extern      direct    __libc_start_main\n" in out
+    assert "0x00003fd8" not in out
+    assert "  extern            0       0        0        1       0  puts (import)\n" in out
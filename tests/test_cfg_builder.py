@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from binary_loader import Binary
+from graph.cfg_builder import FunctionGraphs
+from symbol_extractor import SymbolIndex
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+@pytest.fixture(scope="module")
+def test_elf():
+    if not os.path.exists(TEST_ELF):
+        pytest.skip("test.elf not present")
+    with Binary(TEST_ELF) as binary:
+        yield binary, FunctionGraphs(binary, SymbolIndex.build(binary))
+
+
+@pytest.mark.parametrize("spec, section", [
+    ("main", ".text"), ("_start", ".text"), ("_init", ".init"), ("_fini", ".fini"), ("0x1050", ".plt.sec"),
+])
+def test_functions_are_decoded_from_their_section(test_elf, spec, section):
+    binary, graphs = test_elf
+    region = binary.section(section)
+    cfg = graphs.get(spec)
+    assert cfg is not None and len(cfg) > 0
+    entry = graphs.resolve(spec)[0]
+    assert cfg.starts[0] == entry
+    assert all(region.vaddr <= a < region.vaddr + region.size for a in cfg.starts)
+    assert graphs.get(spec) is cfg
+
+
+def test_main_blocks(test_elf):
+    assert list(test_elf[1].get("main").starts) == [0x1149, 0x1160]
+
+
+def test_addresses_outside_the_code_have_no_graph(test_elf):
+    binary, graphs = test_elf
+    assert graphs.get(hex(binary.section(".bss").vaddr)) is None
+    assert graphs.get("0x10") is None
+    assert graphs.get("no_such_function") is None
@@ -0,0 +1,38 @@
+import pytest
+
+import disassembler
+from bench.synth_elf import build_elf
+from binary_loader import Binary
+from disassembler import disassemble, plan_shards
+from symbol_extractor import SymbolIndex
+
+
+@pytest.fixture(scope="module", params=[0, 1, 2])
+def text(request, tmp_path_factory):
+    # Code with int3 padding and, from extras, inline data after a noreturn call
+    path = tmp_path_factory.mktemp("synth") / f"seed{request.param}.elf"
+    path.write_bytes(build_elf(functions=40, text_size=12 << 10, rodata_size=1 << 10,
+                               seed=request.param, extras=True))
+    with Binary(str(path)) as binary:
+        section = binary.section(".text")
+        yield bytes(section.data), section.vaddr, SymbolIndex.build(binary).starts
+
+
+@pytest.mark.parametrize("jobs", [2, 3])
+@pytest.mark.parametrize("use_boundaries", [False, True], ids=["blind cuts", "function starts"])
+def test_parallel_sweep_matches_serial(monkeypatch, text, jobs, use_boundaries):
+    code, addr, starts = text
+    # Small shards, so cuts land inside instructions and inline data
+    monkeypatch.setattr(disassembler, "MIN_SHARD_SIZE", 97)
+    boundaries = starts if use_boundaries else ()
+    assert len(plan_shards(addr, len(code), jobs, boundaries)) > jobs
+
+    serial = disassemble(code, addr)
+    parallel = disassemble(code, addr, jobs=jobs, boundaries=boundaries)
+    assert list(parallel.rows()) == list(serial.rows())
+
+
+def test_shards_cover_the_code_once():
+    shards = plan_shards(0x1000, 0x10000, 4, boundaries=[0x800, 0x1400, 0x1401, 0x9000, 0x20000])
+    assert shards[0][0] == 0x1000 and shards[-1][1] == 0x11000
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
@@ -0,0 +1,82 @@
+import bisect
+import os
+
+import pytest
+
+from bench.synth_elf import build_elf_layout
+from binary_loader import Binary
+from graph.discovery import discover
+from symbol_extractor import SymbolIndex
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    data, layout = build_elf_layout(functions=20, text_size=8 << 10, rodata_size=1 << 10, seed=3, extras=True)
+    path = tmp_path_factory.mktemp("synth") / "extras.elf"
+    path.write_bytes(data)
+    with Binary(str(path)) as binary:
+        yield discover(binary, SymbolIndex.build(binary)), layout
+
+
+def gap_at(result, address):
+    return next(kind for lo, hi, kind in result.unreached if lo <= address < hi)
+
+
+def test_instructions_never_overlap(synthetic):
+    result, layout = synthetic
+    addresses, sizes = result.instructions.addresses, result.instructions.sizes
+    assert all(addresses[i] + sizes[i] <= addresses[i + 1] for i in range(len(addresses) - 1))
+    # The jmp back into the mov's immediate decodes nothing new
+    assert layout["overlap_target"] not in set(addresses)
+
+
+def test_jump_tables_are_followed(synthetic):
+    result, layout = synthetic
+    assert result.jump_tables[layout["relative_jmp"]] == layout["relative_cases"]
+    assert result.jump_tables[layout["absolute_jmp"]] == layout["absolute_cases"]
+    assert not result.unresolved
+    edges = set(result.edges)
+    for jmp in ("relative", "absolute"):
+        blocks = result.block_addrs
+        source = blocks[bisect.bisect_right(blocks, layout[jmp + "_jmp"]) - 1]
+        for case in layout[jmp + "_cases"]:
+            assert (source, case) in edges
+
+
+def test_bytes_after_noreturn_call_are_not_code(synthetic):
+    result, layout = synthetic
+    addresses = set(result.instructions.addresses)
+    call = layout["noreturn_call"]
+    assert call in addresses
+    lo, hi = layout["inline_data"]
+    assert not addresses & set(range(lo, hi))
+    assert gap_at(result, lo) == "unknown"
+    assert not any(src <= call < dst == lo for src, dst in result.edges)
+
+
+def test_init_array_and_eh_frame_seed_functions(synthetic):
+    result, layout = synthetic
+    assert result.seeds["init_array"] == 1
+    assert result.seeds["eh_frame"] == 1
+    for name in ("init_array_function", "eh_frame_function"):
+        assert layout[name] in result.functions
+        assert layout[name] in set(result.instructions.addresses)
+
+
+def test_unreached_padding(synthetic):
+    result, layout = synthetic
+    assert gap_at(result, layout["nop_padding"]) == "padding"
+    # int3 filler between the generated functions
+    functions = layout["functions"]
+    kinds = {kind for lo, hi, kind in result.unreached if functions[0] <= lo < layout["noreturn_call"]}
+    assert kinds <= {"padding"}
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_test_elf_has_no_overlapping_instructions():
+    with Binary(TEST_ELF) as binary:
+        result = discover(binary, SymbolIndex.build(binary))
+    addresses, sizes = result.instructions.addresses, result.instructions.sizes
+    assert all(addresses[i] + sizes[i] <= addresses[i + 1] for i in range(len(addresses) - 1))
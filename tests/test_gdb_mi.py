@@ -0,0 +1,174 @@
+import asyncio
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from gdb_mi import GDBMIController, MIError, PageCache, parse_record
+
+# A scripted stand-in for `gdb --interpreter=mi3`: it logs every command to
+# the file given as the "binary", answers from a fixed script and, on
+# -exec-run, writes to the tty set by -inferior-tty-set like a real inferior.
+FAKE_GDB = r'''
+import re
+import sys
+
+log = open(sys.argv[-1], "a")
+tty = None
+registers = {"0": "0x1", "1": "0x2", "2": "0x401136"}
+memory = bytes(range(256)) * 32
+
+
+def reply(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+reply("(gdb)")
+for line in sys.stdin:
+    log.write(line)
+    log.flush()
+    m = re.match(r"(\d*)(\S+)\s*(.*)", line.strip())
+    token, op, rest = m.groups()
+    args = rest.split()
+    if op == "-inferior-tty-set":
+        tty = args[0]
+        reply(token + "^done")
+    elif op == "-exec-run":
+        with open(tty, "w") as t:
+            t.write("hello from the inferior\n")
+        reply(token + "^running")
+        reply('*running,thread-id="all"')
+        registers["2"] = "0x401140"
+        reply('*stopped,reason="breakpoint-hit",thread-id="1",'
+              'frame={addr="0x401140",func="main",args=[]}')
+    elif op == "-break-insert":
+        reply(token + '^done,bkpt={number="1",type="breakpoint",enabled="y",'
+              'addr="0x401136",func="main",file="t.c",fullname="/t.c",line="3",times="0"}')
+    elif op == "-data-list-register-names":
+        reply(token + '^done,register-names=["rax","rbx","rip"]')
+    elif op == "-data-list-changed-registers":
+        reply(token + '^done,changed-registers=["2"]')
+    elif op == "-data-list-register-values":
+        numbers = args[1:] or sorted(registers)
+        values = ",".join('{number="%s",value="%s"}' % (n, registers[n]) for n in numbers)
+        reply(token + "^done,register-values=[" + values + "]")
+    elif op == "-data-read-memory-bytes":
+        address, size = int(args[0], 0), int(args[1])
+        if address + size > 0x2000:
+            reply(token + '^error,msg="Cannot access memory at address 0x2000"')
+        else:
+            data = memory[address:address + size].hex()
+            reply(token + '^done,memory=[{begin="%s",offset="0x0",end="%s",contents="%s"}]'
+                  % (hex(address), hex(address + size), data))
+    elif op == "-interpreter-exec":
+        reply('~"console says \\"hi\\"\\n"')
+        reply(token + "^done")
+    elif op == "-gdb-exit":
+        reply(token + "^exit")
+        break
+    else:
+        reply(token + '^error,msg="Undefined MI command: %s"' % op[1:])
+'''
+
+
+@pytest.fixture
+def fake_gdb(tmp_path):
+    script = tmp_path / "gdb"
+    script.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_GDB))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script), tmp_path / "commands.log"
+
+
+def commands(log):
+    return [line.split()[0].lstrip("0123456789") for line in log.read_text().splitlines()]
+
+
+async def started(fake_gdb, **callbacks):
+    path, log = fake_gdb
+    return await GDBMIController(path, **callbacks).start(str(log))
+
+
+def test_parse_records():
+    record = parse_record('12^done,bkpt={number="1",addr="0x10"},list=["a",{x="1"}],res=[n="2"]\n')
+    assert record.token == 12 and record.kind == "result" and record.cls == "done"
+    assert record.results == {"bkpt": {"number": "1", "addr": "0x10"}, "list": ["a", {"x": "1"}], "res": ["2"]}
+    assert parse_record('~"tab\\there \\"quoted\\"\\n\\101"').results == 'tab\there "quoted"\nA'
+    assert parse_record("(gdb) ").kind == "prompt"
+    assert parse_record("plain program output") is None
+
+
+def test_inferior_output_comes_through_its_own_tty(fake_gdb):
+    streams = []
+    stops = []
+
+    async def session():
+        gdb = await started(fake_gdb, on_stream=lambda kind, text: streams.append((kind, text)),
+                            on_stop=stops.append)
+        tty = os.ttyname(gdb._tty[1])
+        await gdb.run()
+        await gdb.wait_for_stop(5)
+        await gdb.close()
+        return tty
+
+    tty = asyncio.run(session())
+    path, log = fake_gdb
+    assert log.read_text().splitlines()[0] == f"1-inferior-tty-set {tty}"
+    assert "".join(text for kind, text in streams if kind == "target") == "hello from the inferior\n"
+    assert [(s.reason, s.addr, s.func) for s in stops] == [("breakpoint-hit", 0x401140, "main")]
+
+
+def test_registers_refetch_only_changed(fake_gdb):
+    async def session():
+        gdb = await started(fake_gdb)
+        first = await gdb.registers()
+        await gdb.run()
+        await gdb.wait_for_stop(5)
+        second = await gdb.registers()
+        third = await gdb.registers()
+        await gdb.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(session())
+    assert first == {"rax": 1, "rbx": 2, "rip": 0x401136}
+    assert second == third == {"rax": 1, "rbx": 2, "rip": 0x401140}
+    path, log = fake_gdb
+    values = [line for line in log.read_text().splitlines() if "-data-list-register-values" in line]
+    assert [line.split(None, 1)[1] for line in values] == ["x", "x 2"]
+    assert commands(log).count("-data-list-changed-registers") == 1
+
+
+def test_breakpoints_console_and_errors(fake_gdb):
+    streams = []
+
+    async def session():
+        gdb = await started(fake_gdb, on_stream=lambda kind, text: streams.append((kind, text)))
+        bp = await gdb.break_insert("main")
+        await gdb.console("info frame")
+        with pytest.raises(MIError, match="Undefined MI command"):
+            await gdb.command("-no-such-thing")
+        await gdb.close()
+        with pytest.raises(MIError, match="not running"):
+            await gdb.command("-exec-run")
+        return bp
+
+    bp = asyncio.run(session())
+    assert bp.number == 1 and bp.addr == 0x401136 and bp.func == "main" and bp.line == 3
+    assert ("console", 'console says "hi"\n') in streams
+
+
+def test_page_cache_reads_and_marks_unreadable_pages(fake_gdb):
+    async def session():
+        gdb = await started(fake_gdb)
+        cache = PageCache(gdb, page_size=0x800)
+        data = await cache.read(0x1f00, 0x400)
+        again = await cache.read(0x100, 0x10)
+        await gdb.close()
+        return cache, data, again
+
+    cache, data, again = asyncio.run(session())
+    assert data == (bytes(range(256)) * 32)[0x1f00:0x2000]
+    assert again == bytes(range(0x10))
+    assert cache.pages[0x2000 // 0x800] is None
@@ -0,0 +1,50 @@
+import time
+
+import networkx as nx
+import pytest
+
+from graph.layout import _layout, submit_layout
+
+
+def unit_size(cfg, node):
+    return 100, 40
+
+
+def slow_size(cfg, node):
+    time.sleep(60)
+    return 100, 40
+
+
+def failing_size(cfg, node):
+    raise ValueError("no size")
+
+
+def chain(count):
+    cfg = nx.DiGraph()
+    cfg.add_edges_from((i, i + 1) for i in range(count - 1))
+    cfg.add_edge(count - 1, 0)
+    return cfg
+
+
+def test_worker_result_matches_in_process_layout():
+    cfg = chain(20)
+    job = submit_layout(cfg, unit_size, "layered")
+    assert job.result(timeout=60) == _layout(cfg, unit_size, "layered")
+    assert job.done() and not job.process.is_alive()
+
+
+def test_cancel_terminates_a_running_worker():
+    job = submit_layout(chain(3), slow_size, "layered")
+    started = time.perf_counter()
+    assert job.cancel()
+    assert not job.process.is_alive()
+    assert time.perf_counter() - started < 30
+    assert job.done()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        job.result()
+
+
+def test_worker_errors_reach_the_caller():
+    job = submit_layout(chain(3), failing_size, "layered")
+    with pytest.raises(RuntimeError, match="ValueError: no size"):
+        job.result(timeout=60)
@@ -0,0 +1,180 @@
+import threading
+from collections import Counter
+from concurrent.futures import CancelledError
+
+import pytest
+
+from analysis_pipeline import Pipeline, Stage
+
+
+class FakeBinary:
+    def sections(self):
+        return []
+
+    def segments(self):
+        return []
+
+
+class RecordingCache:
+    # AnalysisCache.get's contract, kept in memory
+    def __init__(self):
+        self.values = {}
+        self.inputs = {}
+
+    def get(self, kind, compute, **inputs):
+        self.inputs[kind] = inputs
+        if kind not in self.values:
+            self.values[kind] = compute()
+        return self.values[kind]
+
+
+def counting_stages(calls, **extra):
+    def stage(name, *inputs, cached=False):
+        def compute(p, *values):
+            calls[name] += 1
+            return (name,) + values
+        return Stage(inputs, compute, cached, False)
+
+    stages = {
+        'a': stage('a'),
+        'b': stage('b', 'a'),
+        'c': stage('c', 'a', 'b', cached=True),
+    }
+    stages.update(extra)
+    return stages
+
+
+@pytest.fixture
+def make_pipeline():
+    pipelines = []
+
+    def make(stages, cache=None, **kwargs):
+        pipeline = Pipeline(FakeBinary(), cache, stages=stages, **kwargs)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.close()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_outputs_are_memoized_across_requests(make_pipeline, jobs):
+    calls = Counter()
+    pipeline = make_pipeline(counting_stages(calls), jobs=jobs)
+    assert pipeline.get('c') == ('c', ('a',), ('b', ('a',)))
+    assert pipeline.get('b') == ('b', ('a',))
+    assert pipeline.get('c') is pipeline.get('c')
+    assert calls == {'a': 1, 'b': 1, 'c': 1}
+    assert 'a' in pipeline and pipeline.lookup('c') == pipeline.get('c')
+
+
+def test_cached_stages_go_through_the_cache(make_pipeline):
+    calls = Counter()
+    cache = RecordingCache()
+    cache.values['c'] = "from disk"
+    pipeline = make_pipeline(counting_stages(calls), cache)
+    assert pipeline.get('c') == "from disk"
+    # Decoders get the inputs by name
+    assert cache.inputs['c'] == {'a': ('a',), 'b': ('b', ('a',))}
+    assert calls['c'] == 0
+
+
+def test_cached_stages_without_a_cache(make_pipeline):
+    calls = Counter()
+    pipeline = make_pipeline(counting_stages(calls), None)
+    assert pipeline.get('c')[0] == 'c'
+    assert calls['c'] == 1
+
+
+def test_independent_stages_run_concurrently(make_pipeline):
+    # Each stage waits for the other to start: run one at a time they
+    # would both time out
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(p):
+        barrier.wait()
+        return threading.current_thread().name
+
+    stages = {
+        'x': Stage((), meet, False, False),
+        'y': Stage((), meet, False, False),
+        'both': Stage(('x', 'y'), lambda p, x, y: {x, y}, False, False),
+    }
+    pipeline = make_pipeline(stages, workers=2)
+    threads = pipeline.get('both')
+    assert len(threads) == 2 and all(t.startswith("chihiro-stage") for t in threads)
+
+
+def test_with_jobs_stages_run_on_the_calling_thread(make_pipeline):
+    seen = []
+    stages = {
+        'a': Stage((), lambda p: seen.append(threading.current_thread()), False, False),
+        'b': Stage(('a',), lambda p, a: seen.append(threading.current_thread()), False, False),
+    }
+    pipeline = make_pipeline(stages, jobs=4)
+    pipeline.prefetch('b')
+    assert seen == []
+    pipeline.get('b')
+    assert seen == [threading.main_thread()] * 2
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_failures_propagate_and_are_not_memoized(make_pipeline, jobs):
+    calls = Counter()
+    attempts = []
+
+    def flaky(p):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise KeyError(".text section not found in binary.")
+        return "a"
+
+    stages = counting_stages(calls, a=Stage((), flaky, False, False))
+    pipeline = make_pipeline(stages, jobs=jobs)
+    with pytest.raises(KeyError, match=".text section"):
+        pipeline.get('c')
+    # The dependents failed with the same error without running
+    assert calls == {}
+    assert 'a' not in pipeline and pipeline.lookup('b', "missing") == "missing"
+    # The next request runs the stage (and its dependents) again
+    assert pipeline.get('c') == ('c', "a", ('b', "a"))
+    assert len(attempts) == 2 and calls == {'b': 1, 'c': 1}
+
+
+def test_unknown_output(make_pipeline):
+    pipeline = make_pipeline(counting_stages(Counter()))
+    with pytest.raises(KeyError, match="Unknown analysis output: nope"):
+        pipeline.get('nope')
+
+
+def test_stage_waiting_on_inputs_is_cancelled_after_close(make_pipeline):
+    release = threading.Event()
+    started = threading.Event()
+    calls = Counter()
+
+    def slow(p):
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    stages = {
+        'slow': Stage((), slow, False, False),
+        'after': Stage(('slow',), lambda p, value: calls.update(['after']), False, False),
+    }
+    pipeline = make_pipeline(stages, workers=2)
+    pipeline.prefetch('after')
+    assert started.wait(5)
+    pipeline.close(block=False)
+    release.set()
+    assert pipeline.get('slow') == "slow"
+    with pytest.raises(CancelledError):
+        pipeline.get('after')
+    assert not calls
+
+
+def test_inline_stages_are_cancelled_after_close(make_pipeline):
+    pipeline = make_pipeline(counting_stages(Counter()), jobs=2)
+    pipeline.close()
+    with pytest.raises(CancelledError):
+        pipeline.get('a')
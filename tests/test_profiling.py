@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import profiling
+from analysis_pipeline import Pipeline, Stage
+from profiling import attached, current_span, span
+
+
+@pytest.fixture
+def profiler():
+    profiler = profiling.enable()
+    yield profiler
+    profiling.disable()
+
+
+def rows(profiler):
+    return [(depth, name, calls) for depth, name, calls, *_ in profiler.summary()]
+
+
+def test_summary_nests_rows_under_their_parent(profiler):
+    with span("run"):
+        for _ in range(2):
+            with span("a"):
+                with span("leaf"):
+                    pass
+        with span("b"):
+            with span("leaf"):
+                pass
+    assert rows(profiler) == [
+        (0, "run", 1), (1, "a", 2), (2, "leaf", 2), (1, "b", 1), (2, "leaf", 1),
+    ]
+
+
+def test_spans_on_other_threads_keep_the_submitting_parent(profiler):
+    def work(parent):
+        with attached(parent):
+            with span("worker"):
+                with span("inner"):
+                    pass
+        with span("detached"):
+            pass
+
+    with span("run"):
+        with span("submit"):
+            thread = threading.Thread(target=work, args=(current_span(),))
+            thread.start()
+            thread.join()
+        with span("after"):
+            pass
+    assert rows(profiler) == [
+        (0, "run", 1), (1, "submit", 1), (2, "worker", 1), (3, "inner", 1),
+        (1, "after", 1), (0, "detached", 1),
+    ]
+
+
+def test_open_ancestors_get_a_row(profiler):
+    with span("run"):
+        with span("child"):
+            pass
+        assert rows(profiler) == [(0, "run", 0), (1, "child", 1)]
+
+
+def test_pipeline_stages_nest_under_the_caller(profiler):
+    def leaf(p):
+        with span("leaf work"):
+            return 1
+
+    def top(p, value):
+        return value + 1
+
+    binary = SimpleNamespace(sections=list, segments=list)
+    stages = {'leaf': Stage((), leaf, False, False), 'top': Stage(('leaf',), top, False, False)}
+    pipeline = Pipeline(binary, None, workers=2, stages=stages)
+    try:
+        with span("run"):
+            assert pipeline.get('top') == 2
+    finally:
+        pipeline.close()
+    assert rows(profiler) == [(0, "run", 1), (1, "stage leaf", 1), (2, "leaf work", 1), (1, "stage top", 1)]
+
+
+def test_without_a_profiler_nothing_is_attached():
+    assert profiling.active() is None
+    assert current_span() is None
+    with attached(None):
+        with span("ignored"):
+            pass
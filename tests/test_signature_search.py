@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import signature_search
+from signature_search import SignatureSet, load_signatures, parse_signature
+
+# A few byte values so that random signatures actually hit
+ALPHABET = bytes((0x00, 0x41, 0x48, 0x4f, 0x8b, 0xe8, 0xf4))
+
+
+def brute_force(buf, signatures, start=0, end=None):
+    end = len(buf) if end is None else end
+    return sorted(
+        (offset, index)
+        for index, sig in enumerate(signatures)
+        for offset in range(start, end - sig.size + 1)
+        if int.from_bytes(buf[offset:offset + sig.size], "big") & sig.mask == sig.value
+    )
+
+
+def random_signature(rng):
+    digits = []
+    for _ in range(rng.randint(1, 7)):
+        byte = f"{rng.choice(ALPHABET):02x}"
+        pick = rng.random()
+        if pick < 0.15:
+            byte = "??"
+        elif pick < 0.25:
+            byte = byte[0] + "?"
+        elif pick < 0.35:
+            byte = "?" + byte[1]
+        digits.append(byte)
+    text = " ".join(digits)
+    return parse_signature(text) if text.replace("?", "").strip() else random_signature(rng)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_matches_brute_force(monkeypatch, seed):
+    rng = random.Random(seed)
+    # Small chunks: the automaton state has to carry across them
+    monkeypatch.setattr(signature_search, "CHUNK_SIZE", rng.choice((7, 64, 1 << 20)))
+    buf = bytes(rng.choice(ALPHABET) for _ in range(3000))
+    signatures = [random_signature(rng) for _ in range(rng.randint(1, 40))]
+    # Prefixes of others and exact duplicates
+    for sig in signatures[:5]:
+        prefix = " ".join(sig.text.split()[:rng.randint(1, sig.size)])
+        if prefix.replace("?", "").strip():
+            signatures.append(parse_signature(prefix))
+    signatures += signatures[:2]
+    found = SignatureSet(signatures).scan(buf)
+    assert found == brute_force(buf, signatures)
+    assert found  # not vacuous
+    start, end = rng.randrange(100), len(buf) - rng.randrange(100)
+    assert SignatureSet(signatures).scan(buf, start, end) == brute_force(buf, signatures, start, end)
+
+
+def test_overlapping_matches():
+    buf = b"\xaa" * 6 + b"\xab\xab\xab"
+    signatures = [parse_signature("aa aa"), parse_signature("ab ?? ab"), parse_signature("a? a?")]
+    assert SignatureSet(signatures).scan(buf) == brute_force(buf, signatures)
+    assert [o for o, i in SignatureSet(signatures[:1]).scan(buf)] == [0, 1, 2, 3, 4]
+    assert [o for o, i in SignatureSet(signatures[2:]).scan(buf)] == list(range(8))
+
+
+def test_prefix_patterns_all_match():
+    buf = b"\x90\xe8\x12\x34\x56\x78\xc3"
+    signatures = [parse_signature(t) for t in ("e8", "e8 12", "e8 12 34 56", "e8 ?? 34", "12 34", "e8 12 34 56 78 c3 00")]
+    assert SignatureSet(signatures).scan(buf) == [(1, 0), (1, 1), (1, 2), (1, 3), (2, 4)]
+
+
+def test_matches_stay_inside_the_range():
+    buf = b"\xe8\x00\x00\x00\x00\xe8"
+    sig = [parse_signature("e8 ?? ?? ?? ??")]
+    assert SignatureSet(sig).scan(buf) == [(0, 0)]
+    assert SignatureSet(sig).scan(buf, 1) == []
+    assert SignatureSet(sig).scan(buf, 0, 4) == []
+
+
+@pytest.mark.parametrize("text, error", [
+    ("", "whole bytes"), ("e", "whole bytes"), ("?? ??", "no fixed bits"), ("zz", "Bad hex digit"),
+])
+def test_bad_signatures(text, error):
+    with pytest.raises(ValueError, match=error):
+        parse_signature(text)
+
+
+def test_load_signatures(tmp_path):
+    path = tmp_path / "sigs.txt"
+    path.write_text("# comment\nprologue = 55 48 89 e5\n\ne8 ?? ?? ?? ??  # call\n")
+    signatures = load_signatures(str(path))
+    assert [s.name for s in signatures] == ["prologue", "e8 ?? ?? ?? ??"]
+    path.write_text("ok = 90\nbad = 9\n")
+    with pytest.raises(ValueError, match="sigs.txt:2"):
+        load_signatures(str(path))
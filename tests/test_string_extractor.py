@@ -0,0 +1,144 @@
+import functools
+import os
+import random
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import string_extractor
+from bench.synth_elf import build_elf
+from binary_loader import Binary
+from graph.rodata_extractor import extract_rodata
+from string_extractor import _windows, extract_ascii_strings, iter_strings, scan_buffer
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+def reference(buf, min_len=4, encodings=("ascii", "utf-16le")):
+    # Whole-buffer regexes, sorted like scan_buffer's output
+    patterns = {
+        "ascii": rb"[\x20-\x7E]{%d,}" % min_len,
+        "utf-16le": rb"(?:[\x20-\x7E]\x00){%d,}" % min_len,
+    }
+    found = [
+        (m.start(), e, m.group())
+        for e in encodings for m in re.finditer(patterns[e], buf)
+    ]
+    order = {e: i for i, e in enumerate(encodings)}
+    return sorted(found, key=lambda r: (r[0], order[r[1]], r[2]))
+
+
+def random_buffer(seed, size=20000):
+    # Printable runs of every length, UTF-16LE runs, NUL padding and noise
+    rng = random.Random(seed)
+    out = bytearray()
+    while len(out) < size:
+        pick = rng.random()
+        if pick < 0.4:
+            out += bytes(rng.randrange(0x20, 0x7f) for _ in range(rng.randint(1, 40)))
+        elif pick < 0.6:
+            out += "".join(chr(rng.randrange(0x20, 0x7f)) for _ in range(rng.randint(1, 20))).encode("utf-16-le")
+        elif pick < 0.8:
+            out += b"\0" * rng.randint(1, 8)
+        else:
+            out += bytes(rng.randrange(256) for _ in range(rng.randint(1, 8)))
+    return bytes(out)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_len", [1, 4, 9])
+def test_scan_buffer_matches_whole_buffer_regexes(seed, min_len):
+    buf = random_buffer(seed)
+    assert list(scan_buffer(buf, min_len=min_len)) == reference(buf, min_len)
+    assert extract_ascii_strings(buf, min_len) == [raw for _, _, raw in reference(buf, min_len, ("ascii",))]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_windows_never_cut_a_string(monkeypatch, chunk_size):
+    buf = random_buffer(11)
+    windows = list(_windows(buf, 0, len(buf), chunk_size))
+    assert windows[0][0] == 0 and windows[-1][1] == len(buf)
+    assert all(a[1] == b[0] for a, b in zip(windows, windows[1:]))
+    assert len(windows) > 10
+    # Small windows everywhere: each string still comes out whole
+    monkeypatch.setattr(string_extractor, "_windows", functools.partial(_windows, chunk_size=chunk_size))
+    assert list(scan_buffer(buf)) == reference(buf)
+
+
+def test_string_longer_than_a_window():
+    buf = b"\xff" + b"A" * 5000 + b"\0" + "wide string".encode("utf-16-le") + b"\xff"
+    windows = list(_windows(buf, 0, len(buf), 16))
+    assert list(scan_buffer(buf)) == reference(buf)
+    assert any(lo <= 1 and hi >= 5001 for lo, hi in windows)
+
+
+def test_parallel_scan_matches_serial(monkeypatch):
+    buf = random_buffer(3, 200000)
+    monkeypatch.setattr(string_extractor, "PARALLEL_THRESHOLD", 0)
+    monkeypatch.setattr(string_extractor, "_windows", functools.partial(_windows, chunk_size=4096))
+    assert list(scan_buffer(buf, 100, len(buf) - 100, jobs=2)) == list(scan_buffer(buf, 100, len(buf) - 100))
+
+
+def test_utf16le_strings():
+    buf = b"\x01" + "Hello".encode("utf-16-le") + b"\xfe\xff" + "ab".encode("utf-16-le") + b"ASCII!"
+    found = list(scan_buffer(buf))
+    assert (1, "utf-16le", "Hello".encode("utf-16-le")) in found
+    assert not any(raw == "ab".encode("utf-16-le") for _, _, raw in found)
+    assert (17, "ascii", b"ASCII!") in found
+    assert [(o, e) for o, e, _ in scan_buffer(buf, encodings=("utf-16le",))] == [(1, "utf-16le")]
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    path = tmp_path_factory.mktemp("synth") / "strings.elf"
+    path.write_bytes(build_elf(functions=10, text_size=4 << 10, rodata_size=4 << 10, seed=2))
+    with Binary(str(path)) as binary:
+        yield binary
+
+
+def test_records_map_offsets_to_vaddrs(synthetic):
+    binary = synthetic
+    rodata = binary.section(".rodata")
+    records = list(iter_strings(binary, ".rodata"))
+    assert len(records) > 10
+    for r in records:
+        assert r.section == ".rodata"
+        assert r.vaddr == rodata.vaddr + r.offset - rodata.offset
+        raw = r.text.encode("ascii" if r.encoding == "ascii" else "utf-16-le")
+        assert binary.read(r.vaddr, len(raw)) == raw
+    # The raw file gives the same strings, mapped through the segments
+    whole = {(r.offset, r.text): r for r in iter_strings(binary, "file")}
+    for r in records:
+        assert whole[r.offset, r.text].vaddr == r.vaddr
+        assert whole[r.offset, r.text].section == ".rodata"
+
+
+def test_extract_rodata(synthetic, capsys):
+    assert extract_rodata(synthetic) == [r.text for r in iter_strings(synthetic, ".rodata") if r.encoding == "ascii"]
+    # No .rodata: nothing, and nothing printed from inside the stage
+    assert extract_rodata(SimpleNamespace(section=lambda name: None)) == []
+    assert capsys.readouterr().out == ""
+
+
+def test_strings_outside_sections_have_no_vaddr(synthetic):
+    binary = synthetic
+    for r in iter_strings(binary, "file"):
+        if r.section is None:
+            assert r.vaddr is None or binary.offset_to_vaddr(r.offset) == r.vaddr
+        elif binary.section(r.section).vaddr == 0:
+            # .strtab and friends are not loaded
+            assert r.vaddr is None
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_test_elf_strings():
+    with Binary(TEST_ELF) as binary:
+        rodata = {r.text: r for r in iter_strings(binary, ".rodata")}
+        everything = list(iter_strings(binary, "all"))
+        assert extract_ascii_strings(bytes(binary.view)) == [
+            raw for _, _, raw in reference(bytes(binary.view), 4, ("ascii",))
+        ]
+    hello = next(r for text, r in rodata.items() if text.startswith("Hello"))
+    assert hello.vaddr == 0x2004 and hello.encoding == "ascii"
+    assert any(r.section == ".strtab" and r.text == "main" and r.vaddr is None for r in everything)
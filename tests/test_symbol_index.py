@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from analysis_cache import CODECS
+from binary_loader import Binary
+from symbol_extractor import SymbolIndex
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+
+def func(name, addr, size=0):
+    return {'name': name, 'addr': addr, 'type': "FUNC", 'size': size}
+
+
+def test_sizeless_functions_stop_at_their_section():
+    symbols = [func("a", 0x100), func("b", 0x180, 0x10), func("c", 0x200), func("d", 0x300)]
+    index = SymbolIndex(symbols, [(0x100, 0x1f0), (0x200, 0x280), (0x300, 0x340)])
+    assert index.functions() == [
+        (0x100, 0x180, "a"), (0x180, 0x190, "b"), (0x200, 0x280, "c"), (0x300, 0x340, "d"),
+    ]
+    assert index.label(0x27f) == "c+0x7f" and index.label(0x280) is None
+    assert index.label(0x33f) == "d+0x3f"
+
+
+def test_without_regions_sizeless_functions_run_to_the_next_start():
+    index = SymbolIndex([func("a", 0x100), func("b", 0x200)])
+    assert index.functions() == [(0x100, 0x200, "a"), (0x200, 0x201, "b")]
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_init_and_fini_keep_to_their_sections():
+    with Binary(TEST_ELF) as binary:
+        index = SymbolIndex.build(binary)
+        init, plt, fini = binary.section(".init"), binary.section(".plt"), binary.section(".fini")
+        assert index.function_at(init.vaddr)[1] == init.vaddr + init.size
+        assert index.label(plt.vaddr + 0x10) is None
+        assert index.label(fini.vaddr + 4) == "_fini+0x4"
+
+        encode, decode = CODECS['symindex']
+        assert decode(encode(index)).functions() == index.functions()
+
+
+def test_versioned_imports_are_found_by_bare_name():
+    symbols = [
+        {'name': "puts@GLIBC_2.2.5", 'addr': 0, 'type': "FUNC", 'size': 0},
+        {'name': "puts", 'addr': 0, 'type': "FUNC", 'size': 0},
+        {'name': "puts@plt", 'addr': 0x1050, 'type': "FUNC", 'size': 16},
+        {'name': "puts@got", 'addr': 0x3fd0, 'type': "OBJECT", 'size': 8},
+        {'name': "free@GLIBC_2.2.5", 'addr': 0, 'type': "FUNC", 'size': 0},
+        {'name': "free@got", 'addr': 0x3fd8, 'type': "OBJECT", 'size': 8},
+    ]
+    index = SymbolIndex(symbols)
+    assert index.get("puts") is not None and index.get("puts@GLIBC_2.2.5") is not None
+    assert index.address_of("puts") == 0x1050
+    assert index.address_of("puts@plt") == 0x1050
+    assert index.address_of("free") == 0x3fd8     # -fno-plt: only the slot
+    assert index.address_of("missing") is None
+    assert index.get("plt") is None
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_imports_resolve_by_bare_name_in_test_elf():
+    with Binary(TEST_ELF) as binary:
+        index = SymbolIndex.build(binary)
+        plt = index.address_of("puts@plt")
+        assert plt is not None and index.address_of("puts") == plt
+        assert index.get("puts")['addr'] == 0
+        assert index.address_of("__libc_start_main") == index.address_of("__libc_start_main@got")
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from binary_loader import Binary
+from disassembler import disassemble
+from xref_analyzer import REF_ADDR, REF_CALL, REF_JUMP, REF_READ, REF_WRITE, XrefIndex
+
+TEST_ELF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.elf")
+
+BASE = 0x1000
+CODE = bytes.fromhex(
+    "488d3d f9000000"   # 0x1000 lea rdi, [rip + 0xf9]       -> 0x1100
+    "488b05 f2000000"   # 0x1007 mov rax, qword ptr [rip + 0xf2] -> 0x1100
+    "8905 ec000000"     # 0x100e mov dword ptr [rip + 0xec], eax -> 0x1100
+    "bf 00110000"       # 0x1014 mov edi, 0x1100
+    "e8 e2000000"       # 0x1019 call 0x1100
+    "c3"                # 0x101e ret
+)
+
+
+def test_lea_and_immediates_take_the_address():
+    table = disassemble(CODE, BASE)
+    index = XrefIndex.build(table, CODE, BASE, [(BASE, 0x2000)])
+    assert sorted(index.refs_to(0x1100)) == [
+        (0x1000, REF_ADDR), (0x1007, REF_READ), (0x100E, REF_WRITE),
+        (0x1014, REF_ADDR), (0x1019, REF_CALL),
+    ]
+
+
+def test_branches_through_memory_also_read_the_slot():
+    code = bytes.fromhex(
+        "ff15 fa000000"     # 0x1000 call qword ptr [rip + 0xfa]  -> 0x1100
+        "ff25 f4000000"     # 0x1006 jmp qword ptr [rip + 0xf4]   -> 0x1100
+    )
+    table = disassemble(code, BASE)
+    index = XrefIndex.build(table, code, BASE, [(BASE, 0x2000)])
+    assert sorted(index.refs_to(0x1100)) == [
+        (0x1000, REF_CALL), (0x1000, REF_READ), (0x1006, REF_JUMP), (0x1006, REF_READ),
+    ]
+
+
+def section_index(binary, name):
+    section = binary.section(name)
+    table = disassemble(section.data, section.vaddr)
+    return XrefIndex.build(table, section.data, section.vaddr, binary.address_ranges())
+
+
+@pytest.mark.skipif(not os.path.exists(TEST_ELF), reason="test.elf not present")
+def test_kinds_in_test_elf():
+    with Binary(TEST_ELF) as binary:
+        text = section_index(binary, ".text")
+        plt = section_index(binary, ".plt.sec")
+    # _start: call qword ptr [rip + 0x2f53] through __libc_start_main's GOT slot
+    assert sorted(text.refs_to(0x3fd8)) == [(0x107f, REF_CALL), (0x107f, REF_READ)]
+    # main: call puts@plt; lea rax, [rip + 0xeac] ("Hello...")
+    assert text.refs_to(0x1050) == [(0x115b, REF_CALL)]
+    assert text.refs_to(0x2004) == [(0x1151, REF_ADDR)]
+    # _start: lea rdi, [rip + main]
+    assert text.refs_to(0x1149) == [(0x1078, REF_ADDR)]
+    # __do_global_dtors_aux: completed.0 is tested, then set
+    assert (0x1104, REF_READ) in text.refs_to(0x4010)
+    assert (0x112c, REF_WRITE) in text.refs_to(0x4010)
+    # deregister_tm_clones: je to its ret
+    assert text.refs_to(0x10b8) == [(0x10a1, REF_JUMP), (0x10ad, REF_JUMP)]
+    # puts@plt: jmp qword ptr [rip + 0x2f76] through puts' GOT slot
+    assert sorted(plt.refs_to(0x3fd0)) == [(0x1054, REF_JUMP), (0x1054, REF_READ)]
@@ -0,0 +1,121 @@
+import tkinter as tk
+
+BG_COLOR = "#1e1e1e"
+FG_COLOR = "#c8f2c8"
+HIGHLIGHT_COLOR = "#444"
+
+
+class CallGraphView(tk.Frame):
+    # Function list of a graph.call_graph.CallGraph with, for the selected
+    # function, its summary and its callees, callers and transitive reach.
+    # Double-clicking any related function selects it; open_function(entry),
+    # if given, is called by the "Open CFG" button.
+    def __init__(self, master, graph, open_function=None):
+        super().__init__(master, bg=BG_COLOR)
+        self.graph = graph
+        self.open_function = open_function
+        self.order = graph.order()
+        self.shown = []
+        self.related = {}
+        self.current = None
+
+        bar = tk.Frame(self, bg=BG_COLOR)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 2))
+        tk.Label(bar, text="Filter:", fg=FG_COLOR, bg=BG_COLOR).pack(side=tk.LEFT)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *_: self.apply_filter())
+        tk.Entry(bar, textvariable=self.filter_var, bg=BG_COLOR, fg=FG_COLOR,
+                 insertbackground=FG_COLOR, width=30).pack(side=tk.LEFT, padx=5)
+        if open_function is not None:
+            tk.Button(bar, text="Open CFG", bg="#333", fg=FG_COLOR, activebackground=HIGHLIGHT_COLOR,
+                      command=self.open_current).pack(side=tk.RIGHT)
+
+        body = tk.Frame(self, bg=BG_COLOR)
+        body.pack(fill=tk.BOTH, expand=True, padx=10, pady=(2, 10))
+        self.functions = self._listbox(body, "Functions", width=40)
+        self.functions.bind("<<ListboxSelect>>", lambda e: self._on_select())
+
+        right = tk.Frame(body, bg=BG_COLOR)
+        right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.summary = tk.Label(right, anchor="w", justify=tk.LEFT, font=("Courier", 10),
+                                fg=FG_COLOR, bg=BG_COLOR)
+        self.summary.pack(fill=tk.X)
+        lists = tk.Frame(right, bg=BG_COLOR)
+        lists.pack(fill=tk.BOTH, expand=True)
+        for key, title in (("callees", "Callees"), ("callers", "Callers"), ("reachable", "Reachable")):
+            box = self._listbox(lists, title, width=30)
+            box.bind("<Double-Button-1>", lambda e, k=key: self._follow(k))
+            self.related[key] = (box, [])
+
+        self.apply_filter()
+
+    def _listbox(self, parent, title, width):
+        frame = tk.Frame(parent, bg=BG_COLOR)
+        frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        tk.Label(frame, text=title, anchor="w", fg=FG_COLOR, bg=BG_COLOR).pack(fill=tk.X)
+        box = tk.Listbox(frame, width=width, height=30, font=("Courier", 10), bg=BG_COLOR, fg=FG_COLOR,
+                         selectbackground=HIGHLIGHT_COLOR, exportselection=False)
+        scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL, command=box.yview)
+        box.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        box.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        return box
+
+    def _line(self, n):
+        return f"{self.graph.location(n):<10}  {self.graph.name(n)}"
+
+    def apply_filter(self):
+        needle = self.filter_var.get().strip().lower()
+        self.shown = [n for n in self.order if needle in self._line(n).lower()]
+        self.functions.delete(0, tk.END)
+        self.functions.insert(tk.END, *map(self._line, self.shown))
+        if self.current in self.shown:
+            self._highlight(self.current)
+
+    def select(self, node):
+        if node not in self.shown:
+            self.filter_var.set("")  # re-fills the list through apply_filter
+        self._highlight(node)
+        self._show(node)
+
+    def _highlight(self, node):
+        i = self.shown.index(node)
+        self.functions.selection_clear(0, tk.END)
+        self.functions.selection_set(i)
+        self.functions.see(i)
+
+    def _on_select(self):
+        selection = self.functions.curselection()
+        if selection:
+            self._show(self.shown[selection[0]])
+
+    def _show(self, node):
+        graph = self.graph
+        self.current = node
+        s = graph.summaries[node]
+        self.summary.configure(text=(
+            f"{s.name}  ({s.kind})\n"
+            f"entry {graph.location(node)}  size {s.size}  blocks {s.blocks}  instructions {s.instructions}\n"
+            f"{len(graph.callees[node])} callees, {len(graph.callers[node])} callers, "
+            f"{len(graph.reachable(node))} reachable, {len(graph.ancestors(node))} transitive callers"
+        ))
+        for key, nodes in (
+            ("callees", graph.callees[node]),
+            ("callers", graph.callers[node]),
+            ("reachable", graph.reachable(node)),
+        ):
+            box, _ = self.related[key]
+            nodes = graph.order(nodes)
+            self.related[key] = (box, nodes)
+            box.delete(0, tk.END)
+            box.insert(tk.END, *map(self._line, nodes))
+
+    def _follow(self, key):
+        box, nodes = self.related[key]
+        selection = box.curselection()
+        if selection:
+            self.select(nodes[selection[0]])
+
+    def open_current(self):
+        if self.current is not None and self.graph.summaries[self.current].kind != "import":
+            self.open_function(self.graph.summaries[self.current].entry)
@@ -1,91 +1,409 @@
 import argparse
+import os
 import sys
 from binary_loader import load_binary
-from disassembler import disassemble
-from string_extractor import extract_ascii_strings
-from symbol_extractor import extract_symbols
-from binary_info import print_binary_info
-from utils.helpers import hex_dump
+from string_extractor import ENCODINGS
+from utils.helpers import write_hex_dump
+from analysis_cache import AnalysisCache
+from analysis_pipeline import Pipeline, strings_output
+from profiling import enable, enable_from_env, finish, span
 
-from graph.rodata_extractor import extract_rodata
-from graph.cfg_builder import build_cfg
-from graph.cfg_visualizer import visualize_cfg
+# Analyses are requested by name from analysis_pipeline, which imports
+# capstone (disassembler, xref_analyzer), the graph modules and the process
+# pools only inside the stages that need them. networkx (graph.layout, the
+# viewer), tkinter (graph.cfg_visualizer), sqlite3 (analysis_db) and
+# batch_scan are imported inside the branch that needs them, so a plain
+# --info or --symbols run starts without them. bench/startup.py checks this.
+
+def print_call_graph(graph):
+    edges = sum(len(c) for c in graph.callees)
+    print(f"\n[+] Call graph: {len(graph)} functions, {edges} call edges, {len(graph.roots())} roots")
+    print(f"  {'entry':<10}  {'size':>7}  {'blocks':>6}  {'callees':>7}  {'callers':>7}  {'reach':>6}  name")
+    for n in graph.order():
+        s = graph.summaries[n]
+        print(f"  {graph.location(n):<10}  {s.size:>7}  {s.blocks:>6}  {len(graph.callees[n]):>7}  "
+              f"{len(graph.callers[n]):>7}  {len(graph.reachable(n)):>6}  {s.name}"
+              f"{' (import)' if s.kind == 'import' else ''}")
+
+def print_discovery(result, names):
+    seeds = ", ".join(f"{kind} {n}" for kind, n in result.seeds.items())
+    print(f"\n[+] Recursive descent: {len(result)} instructions, {len(result.block_ids)} blocks, "
+          f"{len(result.functions)} functions (seeds: {seeds})")
+    print("\n[+] Functions:")
+    for sym in result.symbols(names):
+        blocks = len(result.functions[sym['addr']])
+        print(f"  0x{sym['addr']:08x}-0x{sym['addr'] + sym['size']:08x}  {blocks:>5} blocks  {sym['name']}")
+    if result.jump_tables:
+        print("\n[+] Jump tables:")
+        for site, targets in sorted(result.jump_tables.items()):
+            print(f"  0x{site:08x}  {len(targets):>5} targets  {names.label(site) or '-'}")
+    if result.unresolved:
+        print("\n[+] Unresolved indirect jumps:")
+        for site in result.unresolved:
+            print(f"  0x{site:08x}  {names.label(site) or '-'}")
+    padding = [(lo, hi) for lo, hi, kind in result.unreached if kind == "padding"]
+    unknown = [(lo, hi) for lo, hi, kind in result.unreached if kind != "padding"]
+    print(f"\n[+] Unreached ranges: {len(padding)} padding ({sum(hi - lo for lo, hi in padding)} bytes), "
+          f"{len(unknown)} other ({sum(hi - lo for lo, hi in unknown)} bytes)")
+    for lo, hi in unknown:
+        print(f"  0x{lo:08x}-0x{hi:08x}  {hi - lo:>7} bytes  {names.label(lo) or '-'}")
+
+def hex_source(binary, args):
+    # (view, base address label, description) for --hex
+    if args.vaddr is not None:
+        view = binary.read(args.vaddr, args.length)
+        if view is None:
+            raise KeyError(f"Address 0x{args.vaddr:x} is not backed by the file")
+        return view, args.vaddr, f"0x{args.vaddr:x}"
+
+    if args.section == "file":
+        view, base = binary.view, 0
+    else:
+        region = binary.section(args.section) or next(
+            (s for s in binary.segments() if s.name == args.section), None
+        )
+        if region is None:
+            raise KeyError(f"No section or segment named {args.section}")
+        view, base = region.data, region.vaddr or region.offset
+
+    start = args.offset or 0
+    end = len(view) if args.length is None else start + args.length
+    return view[start:end], base + start, args.section
+
+def run_scan(argv):
+    from batch_scan import DEFAULT_MEMORY_MB, DEFAULT_TIMEOUT, scan
+
+    parser = argparse.ArgumentParser(prog="chihiro scan", description="Chihiro - analyze every ELF file under directories, one JSON line per file")
+    parser.add_argument("paths", nargs="+", help="Directories or files to scan")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Per-file time limit in seconds (0 disables)")
+    parser.add_argument("--memory-limit", type=int, default=DEFAULT_MEMORY_MB, help="Per-worker address space limit in MiB (0 disables)")
+    parser.add_argument("--output", "-o", help="Write NDJSON here instead of stdout")
+    parser.add_argument("--checkpoint", help="File of finished paths; existing entries are skipped so a scan can resume")
+    parser.add_argument("--min-len", type=int, default=4, help="Minimum string length counted")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        stats = scan(args.paths, out, args.jobs, args.timeout, args.memory_limit, args.checkpoint, args.min_len)
+    except KeyboardInterrupt:
+        print("[!] Interrupted; rerun with the same --checkpoint to resume.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if args.output:
+            out.close()
+    print(f"[+] Scanned {stats['ok'] + stats['error']} files ({stats['error']} errors)", file=sys.stderr)
+
+def run_query_command(argv):
+    import sqlite3
+    from analysis_db import QUERIES, format_rows, run_query
+
+    names = ", ".join(list(QUERIES) + ["sql"])
+    parser = argparse.ArgumentParser(prog="chihiro query", description="Chihiro - canned queries over an --export-db database")
+    parser.add_argument("db", help="SQLite file written by --export-db")
+    parser.add_argument("query", choices=list(QUERIES) + ["sql"], metavar="QUERY", help=f"One of: {names}")
+    parser.add_argument("arg", nargs="?", help="Function, address, text or SQL, depending on the query")
+    args = parser.parse_args(argv)
+
+    needs = QUERIES[args.query][0] if args.query != "sql" else "SQL"
+    if needs and args.arg is None:
+        parser.error(f"{args.query} needs an argument: {needs}")
+    try:
+        headers, rows = run_query(args.db, args.query, args.arg)
+    except KeyError as e:
+        print(f"[!] {e.args[0]}")
+        sys.exit(1)
+    except sqlite3.Error as e:
+        print(f"[!] {e}")
+        sys.exit(1)
+    for line in format_rows(headers, rows):
+        print(line)
+
+SUBCOMMANDS = {"scan": run_scan, "query": run_query_command}
 
 def run_cli():
+    command = SUBCOMMANDS.get(sys.argv[1] if len(sys.argv) > 1 else None)
+    if command is not None:
+        return command(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description="Chihiro - Binary Reverse Engineering CLI")
     parser.add_argument("binary", help="Path to binary file (ELF)")
     parser.add_argument("--disasm", action="store_true", help="Disassemble the .text section")
-    parser.add_argument("--strings", action="store_true", help="Extract ASCII strings from .text")
-    parser.add_argument("--hex", action="store_true", help="Show hex dump of the .text section")
+    parser.add_argument("--strings", action="store_true", help="Extract ASCII/UTF-16LE strings (from .text unless --section is given)")
+    parser.add_argument("--section", default=".text", help="Section or segment for --strings/--hex; 'file' for the raw file, 'all' (strings only) for every section")
+    parser.add_argument("--encoding", choices=ENCODINGS + ("all",), default="all", help="String encoding for --strings")
+    parser.add_argument("--min-len", type=int, default=4, help="Minimum string length for --strings")
+    parser.add_argument("--hex", action="store_true", help="Show hex dump of the .text section (or --section / --vaddr)")
+    parser.add_argument("--offset", type=lambda x: int(x, 0), help="Start offset inside the --hex source")
+    parser.add_argument("--length", type=lambda x: int(x, 0), help="Number of bytes to dump with --hex")
+    parser.add_argument("--vaddr", type=lambda x: int(x, 0), help="Dump from this virtual address instead of a section")
+    parser.add_argument("--no-collapse", action="store_true", help="Print identical --hex lines instead of '*'")
     parser.add_argument("--info", action="store_true", help="Show ELF binary metadata")
     parser.add_argument("--symbols", action="store_true", help="Show symbol table (functions, objects, etc.)")
     parser.add_argument("--funcs-only", action="store_true", help="Show only function symbols")
     parser.add_argument("--rodata", action="store_true", help="Extract strings from .rodata section")
-    parser.add_argument("--cfg", action="store_true", help="Visualize the control flow graph of .text")
+    parser.add_argument("--cfg", action="store_true", help="Visualize the control flow graph of a function")
+    parser.add_argument("--function", metavar="NAME|ADDR", help="Function for --cfg (default: main or the entry point; 'all' for all code reachable in .text)")
+    parser.add_argument("--loops", action="store_true", help="List the natural loops of --function (dominator-based)")
+    parser.add_argument("--discover", action="store_true", help="Find functions by recursive descent (works on stripped binaries) and report unreached bytes")
+    parser.add_argument("--callgraph", action="store_true", help="Summarize every discovered function with its callers, callees and transitive reach")
+    parser.add_argument("--callgraph-export", metavar="PATH", help="Write the call graph as Graphviz (.dot) or JSON (.json)")
+    parser.add_argument("--reachable-from", metavar="NAME|ADDR", help="List the functions transitively called from a function")
+    parser.add_argument("--callers-of", metavar="NAME|ADDR", help="List the functions that transitively call a function")
+    parser.add_argument("--search", action="append", metavar="HEX|@FILE", help="Find byte signatures in every section, e.g. '48 8b ?? ?? 4?' ('??' any byte, '4?'/'?f' half bytes); @FILE reads 'name = pattern' lines; repeatable")
+    parser.add_argument("--xrefs", metavar="ADDR|SYMBOL[,...]", help="List references to addresses or symbols from .text")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N", help="Disassemble .text with N worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the on-disk analysis cache")
+    parser.add_argument("--rebuild-cache", action="store_true", help="Recompute every analysis and refresh the cache")
+    parser.add_argument("--export-db", metavar="PATH", help="Write symbols, instructions, blocks, edges, xrefs and strings to a SQLite file (see 'chihiro query')")
+    parser.add_argument("--profile", nargs="?", const=True, metavar="TRACE.json", help="Print per-stage timings to stderr; with a path, also write a Chrome trace (or set CHIHIRO_PROFILE)")
+    parser.add_argument("--profile-memory", action="store_true", help="With --profile, record peak memory per stage (slow)")
 
     args = parser.parse_args()
 
+    if args.profile or args.profile_memory:
+        enable(memory=args.profile_memory)
+        trace = args.profile if isinstance(args.profile, str) else None
+    else:
+        _, trace = enable_from_env()
     try:
-        elf, file_obj = load_binary(args.binary)
+        with span("chihiro"):
+            run_analysis(args)
+    finally:
+        finish(trace)
+
+def wanted_outputs(args):
+    # Every pipeline output the flags will print, so independent ones can be
+    # computed side by side before the first result is needed
+    wanted = []
+    if args.info:
+        wanted.append('info')
+    if args.symbols or args.disasm or args.xrefs or args.search:
+        wanted.append('symindex')
+    if args.strings:
+        encodings = ENCODINGS if args.encoding == "all" else (args.encoding,)
+        wanted.append(strings_output(args.section, encodings, args.min_len))
+    if args.disasm or args.xrefs or args.export_db:
+        wanted.append('instructions')
+    if args.cfg or args.loops:
+        wanted.append('discovery' if args.function == "all" else 'function_graphs')
+    if args.export_db:
+        wanted += ['cfg', 'xrefs', strings_output()]
+    if args.xrefs:
+        wanted.append('xrefs')
+    if args.discover:
+        wanted.append('discovery')
+    if args.callgraph or args.callgraph_export or args.reachable_from or args.callers_of:
+        wanted.append('call_graph')
+    if args.rodata:
+        wanted.append('rodata')
+    return wanted
+
+def run_analysis(args):
+    try:
+        binary = load_binary(args.binary)
     except Exception as e:
         print(f"[!] Failed to load binary: {e}")
         sys.exit(1)
 
+    cache = AnalysisCache(args.binary, enabled=not args.no_cache, rebuild=args.rebuild_cache)
+    pipeline = Pipeline(binary, cache, jobs=args.jobs)
+    pipeline.prefetch(*wanted_outputs(args))
+
+    elf = binary.elf
+
     try:
         
         if args.info:
-            print_binary_info(elf)
+            for line in pipeline.get('info'):
+                print(line)
 
         
         if args.symbols:
             print("\n[+] Symbol Table:")
-            symbols = extract_symbols(elf)
-            for sym in symbols:
+            for sym in pipeline.get('symindex'):
                 if args.funcs_only and sym['type'] != "FUNC":
                     continue
                 print(f"  0x{sym['addr']:08x}  {sym['type']:<15}  {sym['name']}")
 
-        if args.disasm or args.strings or args.hex or args.cfg:
-            text = elf.get_section_by_name('.text')
-            if not text:
-                print("[!] .text section not found in binary.")
+        if args.strings:
+            encodings = ENCODINGS if args.encoding == "all" else (args.encoding,)
+            try:
+                with span("extract_strings") as s:
+                    strings = pipeline.get(strings_output(args.section, encodings, args.min_len))
+                    s.count(strings=len(strings))
+            except KeyError as e:
+                print(f"[!] {e.args[0]}")
                 sys.exit(1)
 
-            code = text.data()
-            addr = text['sh_addr']
+            print(f"\n[+] Strings from {args.section}:")
+            for r in strings:
+                vaddr = f"0x{r.vaddr:08x}" if r.vaddr is not None else "-"
+                print(f"  0x{r.offset:08x}  {vaddr:>10}  {r.section or '-':<14}  {r.encoding:<8}  {r.text}")
+
+        if args.hex:
+            try:
+                view, base, label = hex_source(binary, args)
+            except KeyError as e:
+                print(f"[!] {e.args[0]}")
+                sys.exit(1)
+            print(f"\n[+] Hex Dump of {label}:")
+            with span("hex_dump", bytes=len(view)):
+                write_hex_dump(view, base=base, collapse=not args.no_collapse)
+
+        if args.disasm or args.cfg or args.loops or args.xrefs or args.export_db:
+            try:
+                pipeline.get('text')
+            except KeyError as e:
+                print(f"[!] {e.args[0]}")
+                sys.exit(1)
 
             if args.disasm:
                 print("\n[+] Disassembly of .text:")
-                for instr in disassemble(code, addr):
-                    print(f"0x{instr['address']:x}: {instr['mnemonic']} {instr['op_str']}")
-
-            if args.strings:
-                print("\n[+] Extracted ASCII Strings from .text:")
-                strings = extract_ascii_strings(code)
-                for s in strings:
-                    try:
-                        print(s.decode('utf-8', errors='ignore'))
-                    except Exception:
-                        continue
+                instructions = pipeline.get('instructions')
+                notes = pipeline.get('symindex').annotations(instructions)
+                with span("print_disassembly", lines=len(instructions), annotated=len(notes)):
+                    for i, (address, _, mnemonic, op_str) in enumerate(instructions.rows()):
+                        print(f"0x{address:x}: {mnemonic} {op_str}{notes.get(i, '')}")
+
+            def function_graph():
+                # (label, BlockGraph) for --function
+                if args.function == "all":
+                    return "the reachable code in .text", pipeline.get('discovery').graph()
+                graphs = pipeline.get('function_graphs')
+                spec = args.function or ("main" if "main" in graphs.functions else hex(elf.header['e_entry']))
+                cfg = graphs.get(spec)
+                if cfg is None:
+                    print(f"[!] Unknown function: {spec}")
+                    sys.exit(1)
+                return spec, cfg
 
-            if args.hex:
-                print("\n[+] Hex Dump of .text section:")
-                print(hex_dump(code))
+            if args.loops:
+                from graph.block_graph import natural_loops
+
+                label, cfg = function_graph()
+                names = pipeline.get('symindex')
+                loops = natural_loops(cfg)
+                print(f"\n[+] Natural loops of {label}: {len(loops)}")
+                for loop in loops:
+                    header = cfg.starts[loop.header]
+                    latches = ", ".join(f"0x{cfg.starts[b]:x}" for b in loop.latches)
+                    print(f"  0x{header:08x}  {names.label(header) or '-':<28}  {len(loop.blocks):>5} blocks  latches {latches}")
 
             if args.cfg:
-                print("\n[+] Visualizing Control Flow Graph...")
-                instructions = disassemble(code, addr)
-                cfg = build_cfg(instructions)
-                visualize_cfg(cfg)
+                from graph.cfg_visualizer import visualize_cfg
+
+                label, cfg = function_graph()
+                print(f"\n[+] Visualizing Control Flow Graph of {label}...")
+                visualize_cfg(cfg, cache=cache)
+
+            if args.export_db:
+                from analysis_db import export_db
+
+                with span("extract_strings") as s:
+                    strings = pipeline.get(strings_output())
+                    s.count(strings=len(strings))
+                export_db(
+                    args.export_db, pipeline.get('symindex'), pipeline.get('instructions'),
+                    pipeline.get('cfg'), pipeline.get('xrefs'), strings,
+                    meta=[("path", os.path.abspath(args.binary)), ("sha256", cache.digest)],
+                )
+                print(f"\n[+] Analysis database written to {args.export_db}")
+
+            if args.xrefs:
+                from xref_analyzer import REF_NAMES
+
+                names = pipeline.get('symindex')
+                instructions = pipeline.get('instructions')
+                index = pipeline.get('xrefs')
+
+                specs = [spec.strip() for spec in args.xrefs.split(",") if spec.strip()]
+                targets = {spec: names.address_of(spec) for spec in specs}
+                refs = index.lookup_many(t for t in targets.values() if t is not None)
+
+                for spec, target in targets.items():
+                    if target is None:
+                        print(f"[!] Unknown symbol or address: {spec}")
+                        continue
+                    print(f"\n[+] Cross-references to 0x{target:x} ({spec}):")
+                    if not refs[target]:
+                        print("  (none)")
+                    for site, kind in refs[target]:
+                        i = instructions.index_of(site)
+                        text = f"{instructions[i].mnemonic} {instructions[i].op_str}" if i is not None else ""
+                        where = names.label(site) or "-"
+                        print(f"  0x{site:x}  {where:<24}  {REF_NAMES[kind]:<5}  {text}")
+
+        if args.discover:
+            with span("print_discovery"):
+                print_discovery(pipeline.get('discovery'), pipeline.get('symindex'))
+
+        if args.callgraph or args.callgraph_export or args.reachable_from or args.callers_of:
+            graph = pipeline.get('call_graph')
+            if args.callgraph:
+                with span("print_call_graph"):
+                    print_call_graph(graph)
+
+            for spec, label, query in (
+                (args.reachable_from, "Functions reachable from", graph.reachable),
+                (args.callers_of, "Transitive callers of", graph.ancestors),
+            ):
+                if spec is None:
+                    continue
+                node = graph.node(spec)
+                if node is None:
+                    print(f"[!] Unknown function: {spec}")
+                    continue
+                found = graph.order(query(node))
+                print(f"\n[+] {label} {spec}: {len(found)}")
+                for n in found:
+                    direct = n in graph.callees[node] or n in graph.callers[node]
+                    print(f"  {graph.location(n):<10}  {'direct  ' if direct else 'indirect'}  {graph.name(n)}")
+
+            if args.callgraph_export:
+                from graph.call_graph import call_graph_json, write_call_graph_dot
+
+                with open(args.callgraph_export, "w") as out:
+                    if args.callgraph_export.endswith(".json"):
+                        import json
+
+                        json.dump(call_graph_json(graph), out, indent=1)
+                    else:
+                        write_call_graph_dot(graph, out)
+                print(f"\n[+] Call graph written to {args.callgraph_export}")
+
+        if args.search:
+            from signature_search import load_signatures, parse_signature, search_binary
+
+            try:
+                signatures = []
+                for spec in args.search:
+                    if spec.startswith("@"):
+                        signatures += load_signatures(spec[1:])
+                    else:
+                        signatures.append(parse_signature(spec))
+            except (OSError, ValueError) as e:
+                print(f"[!] {e}")
+                sys.exit(1)
+
+            matches = search_binary(binary, signatures)
+            names = pipeline.get('symindex')
+            print(f"\n[+] Signature matches: {len(matches)} ({len(signatures)} signatures)")
+            for m in matches:
+                vaddr = f"0x{m.vaddr:08x}" if m.vaddr is not None else "-"
+                where = names.symbol_label(m.vaddr) if m.vaddr is not None else None
+                print(f"  0x{m.offset:08x}  {vaddr:>10}  {m.section:<14}  {where or '-':<28}  {m.signature.name}")
 
-      
         if args.rodata:
-            print("\n[+] Strings from .rodata:")
-            strings = extract_rodata(elf)
-            for s in strings:
-                print(f"  {s}")
+            if binary.section('.rodata') is None:
+                print("\n[!] .rodata section not found.")
+            else:
+                print("\n[+] Strings from .rodata:")
+                for s in pipeline.get('rodata'):
+                    print(f"  {s}")
 
     finally:
-        file_obj.close()
+        pipeline.close()
+        binary.close()
 if __name__ == "__main__":
     run_cli()
@@ -0,0 +1,184 @@
+import queue
+import tkinter as tk
+
+from gdb_mi import GDBMIController, MIThread
+
+POLL_MS = 50
+MAX_SCROLLBACK = 20000
+
+
+class ConsolePump:
+    # Moves text handed to feed() from any thread into a Text widget without
+    # touching Tk off the main thread (the inferior's pty is read by the
+    # GDB/MI controller and arrives here as "target" stream text). A
+    # fixed-rate after() tick coalesces everything pending into one insert,
+    # highlights the active search term in the new text only, and trims the
+    # widget to `max_lines`, optionally appending trimmed lines to
+    # `spill_path`.
+    def __init__(self, widget, autoscroll=None, max_lines=MAX_SCROLLBACK,
+                 spill_path=None, poll_ms=POLL_MS):
+        self.widget = widget
+        self.autoscroll = autoscroll or (lambda: True)
+        self.max_lines = max_lines
+        self.spill_path = spill_path
+        self.poll_ms = poll_ms
+        self.search = ""
+
+        self._chunks = queue.Queue()
+        self._spill = None
+        self._closed = False
+
+        self.widget.tag_config("found", background="yellow", foreground="black")
+        self.widget.after(self.poll_ms, self._drain)
+
+    def feed(self, text):
+        # Thread-safe; shown on the next tick
+        if text:
+            self._chunks.put(text)
+
+    def _drain(self):
+        chunks = []
+        try:
+            while True:
+                chunks.append(self._chunks.get_nowait())
+        except queue.Empty:
+            pass
+
+        if chunks:
+            self._append("".join(chunks))
+
+        if not self._closed:
+            try:
+                self.widget.after(self.poll_ms, self._drain)
+            except tk.TclError:
+                pass  # window destroyed
+
+    def _append(self, text):
+        w = self.widget
+        start = w.index("end-1c")
+        w.insert(tk.END, text)
+        if self.search:
+            # Back up so a match split across two reads is still found
+            self._highlight(f"{start}-{len(self.search) - 1}c")
+        self._trim()
+        if self.autoscroll():
+            w.see(tk.END)
+
+    def _trim(self):
+        lines = int(self.widget.index("end-1c").split(".")[0])
+        excess = lines - self.max_lines
+        if excess <= 0:
+            return
+        cut = f"{excess + 1}.0"
+        if self.spill_path:
+            if self._spill is None:
+                self._spill = open(self.spill_path, "a", encoding="utf-8")
+            self._spill.write(self.widget.get("1.0", cut))
+            self._spill.flush()
+        self.widget.delete("1.0", cut)
+
+    def _highlight(self, start):
+        w = self.widget
+        term = self.search
+        idx = start
+        while True:
+            idx = w.search(term, idx, nocase=1, stopindex=tk.END)
+            if not idx:
+                break
+            end = f"{idx}+{len(term)}c"
+            w.tag_add("found", idx, end)
+            idx = end
+
+    def find(self, term):
+        # Full scan once per new term; later output is scanned as it arrives
+        self.search = term
+        self.widget.tag_remove("found", "1.0", tk.END)
+        if term:
+            self._highlight("1.0")
+
+    def clear(self):
+        self.widget.delete("1.0", tk.END)
+
+    def close(self):
+        self._closed = True
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+class MIConsole:
+    # A ConsolePump fed by a GDB/MI controller running on its own event loop
+    # thread, with the program's output coming from the controller's inferior
+    # pty. Typed lines starting with "-" are sent as MI commands, anything
+    # else through the CLI interpreter; errors are written to the console.
+    def __init__(self, widget, binary_path, autoscroll=None, max_lines=MAX_SCROLLBACK, spill_path=None):
+        self.pump = ConsolePump(widget, autoscroll, max_lines, spill_path)
+        self.thread = MIThread()
+        self.gdb = GDBMIController(
+            on_stream=lambda kind, text: self.pump.feed(text),
+            on_stop=self._on_stop,
+            on_exit=lambda: self.pump.feed("\n[gdb exited]\n"),
+        )
+        self.call(self.gdb.start(binary_path))
+
+    def call(self, coro, on_result=None):
+        # on_result(value) runs on the loop thread and may only feed() text
+        future = self.thread.submit(coro)
+
+        def finished(f):
+            try:
+                value = f.result()
+            except Exception as e:
+                self.pump.feed(f"[!] {e}\n")
+                return
+            if on_result is not None:
+                on_result(value)
+
+        future.add_done_callback(finished)
+        return future
+
+    def send(self, line):
+        line = line.strip()
+        if not line:
+            return
+        self.pump.feed(f"(gdb) {line}\n")
+        if line.startswith("-"):
+            operation, *args = line.split()
+            self.call(self.gdb.command(operation, *args), lambda r: self.pump.feed(f"^done {r}\n"))
+        else:
+            self.call(self.gdb.console(line))
+
+    def _on_stop(self, event):
+        where = f" at 0x{event.addr:x}" if isinstance(event.addr, int) else ""
+        func = f" in {event.func}" if event.func else ""
+        self.pump.feed(f"[*] Stopped ({event.reason or 'signal'}){where}{func}\n")
+
+    def show_registers(self):
+        def render(registers):
+            lines = [
+                f"  {name:<8} 0x{value:016x}  {value}"
+                for name, value in registers.items() if isinstance(value, int)
+            ]
+            self.pump.feed("\n".join(lines) + "\n")
+
+        self.call(self.gdb.registers(), render)
+
+    def show_breakpoints(self):
+        def render(breakpoints):
+            if not breakpoints:
+                self.pump.feed("No breakpoints.\n")
+                return
+            lines = []
+            for bp in breakpoints:
+                addr = hex(bp.addr) if isinstance(bp.addr, int) else bp.addr or "-"
+                where = f" at {bp.file}:{bp.line}" if bp.file else ""
+                enabled = "y" if bp.enabled else "n"
+                lines.append(f"  {bp.number:<4} {enabled}  {addr:<18}  {bp.func or '-'}{where}  hits={bp.hits}")
+            self.pump.feed("\n".join(lines) + "\n")
+
+        self.call(self.gdb.breakpoints(), render)
+
+    def close(self):
+        future = self.thread.submit(self.gdb.close())
+        future.add_done_callback(lambda f: self.thread.stop())
+        self.pump.close()
@@ -1,11 +1,11 @@
 import tkinter as tk
 from tkinter import scrolledtext
-import pty
-import os
-import threading
+
+from ui.console import MAX_SCROLLBACK, MIConsole
+from ui.memory_view import MemoryView
 
 class GDBConsole(tk.Frame):
-    def __init__(self, master, binary_path):
+    def __init__(self, master, binary_path, scrollback=MAX_SCROLLBACK, spill_path=None):
         super().__init__(master)
         self.master = master
         self.binary_path = binary_path
@@ -38,7 +38,7 @@ class GDBConsole(tk.Frame):
 
         def make_btn(text, cmd):
             if isinstance(cmd, str):
-                return tk.Button(btns, text=text, command=lambda: self.run_cmd(cmd),
+                return tk.Button(btns, text=text, command=lambda: self.console.send(cmd),
                                  bg=self.button_color, fg=self.fg_color, activebackground=self.highlight_color)
             else:
                 return tk.Button(btns, text=text, command=cmd,
@@ -49,11 +49,13 @@ class GDBConsole(tk.Frame):
         make_btn(" Continue", "continue").pack(side=tk.LEFT, padx=2)
         make_btn(" Next", "next").pack(side=tk.LEFT, padx=2)
         make_btn("↪ Step", "step").pack(side=tk.LEFT, padx=2)
-        make_btn(" Registers", "info registers").pack(side=tk.LEFT, padx=2)
-        make_btn(" Breakpoints", "info breakpoints").pack(side=tk.LEFT, padx=2)
+        make_btn(" Registers", lambda: self.console.show_registers()).pack(side=tk.LEFT, padx=2)
+        make_btn(" Breakpoints", lambda: self.console.show_breakpoints()).pack(side=tk.LEFT, padx=2)
         make_btn(" Del BPs", "delete breakpoints").pack(side=tk.LEFT, padx=2)
         make_btn(" x/i $rip", "x/i $rip").pack(side=tk.LEFT, padx=2)
-        make_btn(" Layout Src", "layout src").pack(side=tk.LEFT, padx=2)
+        # The TUI ("layout src") does not exist under MI; list the source at $pc
+        make_btn(" Source", "list *$pc").pack(side=tk.LEFT, padx=2)
+        make_btn(" Memory", self.open_memory).pack(side=tk.LEFT, padx=2)
         make_btn(" Clear", self.clear_output).pack(side=tk.LEFT, padx=2)
 
         self.scroll_btn = tk.Button(btns, text=" Auto-scroll ON", command=self.toggle_scroll,
@@ -72,13 +74,12 @@ class GDBConsole(tk.Frame):
         tk.Button(search_frame, text="Find", command=self.find_text,
                   bg=self.button_color, fg=self.fg_color).pack(side=tk.LEFT)
 
-        # Start GDB
-        self.pid, self.fd = pty.fork()
-        if self.pid == 0:
-            os.execvp("gdb", ["gdb", binary_path])
-
-        self.reader_thread = threading.Thread(target=self.read_from_gdb, daemon=True)
-        self.reader_thread.start()
+        # Start GDB (GDB/MI; console commands go through -interpreter-exec)
+        self.console = MIConsole(self.text_area, binary_path, autoscroll=lambda: self.scroll_enabled,
+                                 max_lines=scrollback, spill_path=spill_path)
+        self.pump = self.console.pump
+        self.gdb = self.console.gdb
+        self.bind("<Destroy>", lambda e: self.console.close() if e.widget is self else None)
 
     def send_command(self, event=None):
         cmd = self.entry.get()
@@ -86,17 +87,14 @@ class GDBConsole(tk.Frame):
         self.run_cmd(cmd)
 
     def run_cmd(self, cmd):
-        os.write(self.fd, (cmd + "\n").encode())
-
-    def read_from_gdb(self):
-        while True:
-            try:
-                output = os.read(self.fd, 1024).decode(errors='ignore')
-                self.text_area.insert(tk.END, output)
-                if self.scroll_enabled:
-                    self.text_area.see(tk.END)
-            except OSError:
-                break
+        self.console.send(cmd)
+
+    def open_memory(self):
+        window = tk.Toplevel(self)
+        window.title("Memory")
+        stop = self.gdb.last_stop
+        address = stop.addr if stop and isinstance(stop.addr, int) else 0
+        MemoryView(window, self.console, address).pack(fill=tk.BOTH, expand=True)
 
     def toggle_scroll(self):
         self.scroll_enabled = not self.scroll_enabled
@@ -104,18 +102,7 @@ class GDBConsole(tk.Frame):
         self.scroll_btn.config(text=f" Auto-scroll {state}")
 
     def clear_output(self):
-        self.text_area.delete("1.0", tk.END)
+        self.pump.clear()
 
     def find_text(self):
-        self.text_area.tag_remove('found', '1.0', tk.END)
-        search = self.search_var.get()
-        if search:
-            idx = '1.0'
-            while True:
-                idx = self.text_area.search(search, idx, nocase=1, stopindex=tk.END)
-                if not idx:
-                    break
-                lastidx = f"{idx}+{len(search)}c"
-                self.text_area.tag_add('found', idx, lastidx)
-                idx = lastidx
-            self.text_area.tag_config('found', background='yellow', foreground='black')
+        self.pump.find(self.search_var.get())
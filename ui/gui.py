@@ -1,23 +1,25 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, PhotoImage
-import io
+from tkinter import filedialog, messagebox, simpledialog, PhotoImage
 import contextlib
+import queue
+import sys
 
 from binary_loader import load_binary
-from disassembler import disassemble
-from string_extractor import extract_ascii_strings
-from symbol_extractor import extract_symbols
-from binary_info import print_binary_info
-from graph.cfg_builder import build_cfg
-from graph.cfg_visualizer import visualize_cfg
+from graph.cfg_visualizer import CFGViewer
+from ui.call_graph_view import CallGraphView
 from ui.gdb_guy import GDBConsole
+from ui.listing import VirtualListView
+from ui.tasks import Cancelled, TaskRunner
+from analysis_cache import AnalysisCache
+from analysis_pipeline import Pipeline, strings_output
+from profiling import enable, enable_from_env, finish
 
 # ---------------- Contexte global ----------------
 current_elf = None
-current_file = None
+current_binary = None
 current_path = None
-current_code = None
-current_addr = None
+current_cache = None
+current_pipeline = None
 
 # ---------------- Thème sombre ----------------
 BG_COLOR = "#1e1e1e"
@@ -25,79 +27,197 @@ FG_COLOR = "#c8f2c8"
 BTN_COLOR = "#333"
 HIGHLIGHT_COLOR = "#444"
 
+# ---------------- Profilage (--profile ou CHIHIRO_PROFILE) ----------------
+profiler, profile_trace = enable_from_env()
+if profiler is None and "--profile" in sys.argv[1:]:
+    profiler = enable()
+finished_spans = queue.Queue()
+recent_spans = []
+PROFILE_SPANS_SHOWN = 3
+
 # ---------------- Fonctions UI ----------------
-def open_binary():
-    global current_elf, current_file, current_path, current_code, current_addr
+def stage_progress(done, total):
+    # Stages report to whichever task is waiting on the pipeline now
+    task = runner.current
+    if task is not None:
+        with contextlib.suppress(Cancelled):
+            task.report(done, total)
+
+def show_rows(header, count, row):
+    # Header lines followed by `count` rows rendered on demand by row(i)
+    header = list(header)
+    n = len(header)
+    listing.set_rows(n + count, lambda i: header[i] if i < n else row(i - n))
+
+def show_progress(task, value):
+    if task is None:
+        status_var.set("Ready")
+        cancel_btn.configure(state=tk.DISABLED)
+        return
+    done, total = value or (None, None)
+    percent = f" {100 * done // total}%" if total else ""
+    status_var.set(f"{task.label}...{percent}")
+    cancel_btn.configure(state=tk.NORMAL)
 
+def on_span(span):
+    # Called from worker threads; only top-level stages go to the status bar
+    if span.depth == 0:
+        finished_spans.put(span)
+
+def show_spans():
+    try:
+        while True:
+            recent_spans.append(finished_spans.get_nowait().describe())
+    except queue.Empty:
+        pass
+    del recent_spans[:-PROFILE_SPANS_SHOWN]
+    profile_var.set("  ·  ".join(recent_spans))
+    root.after(200, show_spans)
+
+def show_error(title):
+    return lambda e: messagebox.showerror("Error", f"{title}:\n{e}")
+
+def open_binary():
     filepath = filedialog.askopenfilename(filetypes=[("ELF files", "*.elf"), ("All files", "*.*")])
     if not filepath:
         return
 
-    try:
-        if current_file:
-            current_file.close()
+    def work(task):
+        binary = load_binary(filepath)
+        cache = AnalysisCache(filepath)
+        try:
+            task.check()
+            cache.digest  # hash the file here rather than on the first lookup
+            pipeline = Pipeline(binary, cache, progress=stage_progress)
+            # Symbols feed nearly every view; start them before the first press
+            pipeline.prefetch('symindex')
+            return binary, cache, pipeline, pipeline.get('info', task)
+        except Exception:
+            binary.close()
+            raise
 
-        elf, f = load_binary(filepath)
-        text_section = elf.get_section_by_name('.text')
-        code = text_section.data() if text_section else None
-        addr = text_section['sh_addr'] if text_section else None
+    def done(result):
+        global current_elf, current_binary, current_path, current_cache, current_pipeline
 
-        current_elf, current_file = elf, f
-        current_path, current_code, current_addr = filepath, code, addr
+        binary, cache, pipeline, info = result
+        if current_pipeline:
+            current_pipeline.close(block=False)
+        if current_binary:
+            current_binary.close()
 
-        info_box.delete("1.0", tk.END)
-        info_box.insert(tk.END, f"[+] Loaded binary: {filepath}\n\n")
+        current_elf, current_binary = binary.elf, binary
+        current_path = filepath
+        current_cache = cache
+        current_pipeline = pipeline
 
-        with io.StringIO() as buf:
-            with contextlib.redirect_stdout(buf):
-                print_binary_info(elf)
-            info_box.insert(tk.END, buf.getvalue())
+        listing.set_lines([f"[+] Loaded binary: {filepath}", ""] + info)
 
-    except Exception as e:
-        messagebox.showerror("Error", f"Could not load binary:\n{e}")
+    runner.submit("Loading binary", work, done, show_error("Could not load binary"))
 
 def show_symbols():
     if not current_elf:
         return messagebox.showwarning("Warning", "No binary loaded.")
-    
-    info_box.delete("1.0", tk.END)
-    info_box.insert(tk.END, "[+] Symbol Table:\n\n")
 
-    symbols = extract_symbols(current_elf)
-    for sym in symbols:
-        info_box.insert(tk.END, f"  0x{sym['addr']:08x}  {sym['type']:<7}  {sym['name']}\n")
+    def done(index):
+        symbols = index.symbols
+        show_rows(
+            ["[+] Symbol Table:", ""], len(symbols),
+            lambda i: f"  0x{symbols[i]['addr']:08x}  {symbols[i]['type']:<7}  {symbols[i]['name']}",
+        )
+
+    pipeline = current_pipeline
+    runner.submit(
+        "Extracting symbols",
+        lambda task: pipeline.get('symindex', task),
+        done, show_error("Symbol extraction failed"),
+    )
 
 def show_disasm():
-    if not current_code or not current_addr:
+    if not current_binary or not current_binary.section('.text'):
         return messagebox.showwarning("Warning", "No .text section loaded.")
 
-    info_box.delete("1.0", tk.END)
-    info_box.insert(tk.END, "[+] Disassembly of .text:\n\n")
+    pipeline = current_pipeline
 
-    for instr in disassemble(current_code, current_addr):
-        info_box.insert(tk.END, f"0x{instr['address']:x}: {instr['mnemonic']} {instr['op_str']}\n")
+    def work(task):
+        table = pipeline.get('instructions', task)
+        return table, pipeline.get('symindex', task).annotations(table)
+
+    def done(result):
+        table, notes = result
+        addresses, mnemonic_ids, op_strs = table.addresses, table.mnemonic_ids, table.op_strs
+        mnemonics = table.mnemonics
+        show_rows(
+            ["[+] Disassembly of .text:", ""], len(table),
+            lambda i: f"0x{addresses[i]:x}: {mnemonics[mnemonic_ids[i]]} {op_strs[i]}{notes.get(i, '')}",
+        )
+
+    runner.submit("Disassembling .text", work, done, show_error("Disassembly failed"))
 
 def show_strings():
-    if not current_code:
-        return messagebox.showwarning("Warning", "No .text section loaded.")
+    if not current_binary:
+        return messagebox.showwarning("Warning", "No binary loaded.")
 
-    info_box.delete("1.0", tk.END)
-    info_box.insert(tk.END, "[+] ASCII Strings in .text:\n\n")
+    pipeline = current_pipeline
 
-    for s in extract_ascii_strings(current_code):
-        try:
-            decoded = s.decode('utf-8', errors='ignore')
-            info_box.insert(tk.END, decoded + '\n')
-        except Exception:
-            continue
+    def done(strings):
+        show_rows(
+            ["[+] Strings in all sections (ASCII / UTF-16LE):", ""], len(strings),
+            lambda i: f"0x{strings[i].offset:08x}  {strings[i].section or '-':<14}  {strings[i].encoding:<8}  {strings[i].text}",
+        )
+
+    runner.submit(
+        "Extracting strings",
+        lambda task: pipeline.get(strings_output(), task),
+        done, show_error("String extraction failed"),
+    )
 
 def show_cfg():
-    if not current_code or not current_addr:
+    if not current_binary or not current_binary.section('.text'):
         return messagebox.showwarning("Warning", "No .text section loaded.")
 
-    instrs = disassemble(current_code, current_addr)
-    cfg = build_cfg(instrs)
-    visualize_cfg(cfg)
+    index = current_pipeline.lookup('symindex')
+    names = index.by_name if index is not None else ()
+    default = "main" if "main" in names else hex(current_elf.header['e_entry'])
+    spec = simpledialog.askstring("Visualize CFG", "Function name or address:", initialvalue=default, parent=root)
+    if not spec:
+        return
+    spec = spec.strip()
+    pipeline, cache = current_pipeline, current_cache
+
+    def work(task):
+        graphs = pipeline.get('function_graphs', task)
+        return graphs, graphs.get(spec)
+
+    def done(result):
+        graphs, cfg = result
+        if cfg is None:
+            return messagebox.showwarning("Warning", f"Unknown function: {spec}")
+        CFGViewer(cfg, f" CFG - {spec} - Chihiro", provider=graphs.get, cache=cache)
+
+    runner.submit(f"Building CFG of {spec}", work, done, show_error("CFG construction failed"))
+
+def show_call_graph():
+    if not current_binary:
+        return messagebox.showwarning("Warning", "No binary loaded.")
+
+    pipeline, cache = current_pipeline, current_cache
+
+    def work(task):
+        return pipeline.get('discovery', task), pipeline.get('call_graph', task)
+
+    def done(result):
+        discovery, graph = result
+
+        def open_function(entry):
+            cfg = discovery.function_graph(entry)
+            if cfg is not None:
+                CFGViewer(cfg, f" CFG - {graph.name(graph.ids[entry])} - Chihiro", cache=cache)
+
+        window = tk.Toplevel(root)
+        window.title("Call Graph - Chihiro")
+        CallGraphView(window, graph, open_function).pack(fill=tk.BOTH, expand=True)
+
+    runner.submit("Building call graph", work, done, show_error("Call graph construction failed"))
 
 def launch_debugger():
     if not current_path:
@@ -110,9 +230,14 @@ def launch_debugger():
     gdb_ui.pack(fill="both", expand=True)
 
 def on_quit():
-    if current_file:
-        current_file.close()
+    runner.shutdown()
+    if current_pipeline:
+        current_pipeline.close(block=False)
+    if current_binary:
+        current_binary.close()
     root.destroy()
+    if profiler is not None:
+        finish(profile_trace)
 
 # ---------------- Interface Graphique ----------------
 root = tk.Tk()
@@ -145,6 +270,7 @@ buttons = [
     ("📜 Disassembly", show_disasm),
     ("🔤 Extract Strings", show_strings),
     ("🧠 Visualize CFG", show_cfg),
+    ("📞 Call Graph", show_call_graph),
     ("🐞 Debug Binary", launch_debugger),
 ]
 
@@ -152,11 +278,27 @@ for label, command in buttons:
     tk.Button(btn_frame, text=label, width=25, command=command,
               bg=BTN_COLOR, fg=FG_COLOR, activebackground=HIGHLIGHT_COLOR).pack(pady=2)
 
+# Barre d'état : progression et annulation des analyses en arrière-plan
+status_frame = tk.Frame(root, bg=BG_COLOR)
+status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+status_var = tk.StringVar(value="Ready")
+tk.Label(status_frame, textvariable=status_var, anchor="w", bg=BG_COLOR, fg=FG_COLOR).pack(side=tk.LEFT, fill=tk.X, expand=True)
+cancel_btn = tk.Button(status_frame, text="Cancel", state=tk.DISABLED, bg=BTN_COLOR, fg=FG_COLOR,
+                       activebackground=HIGHLIGHT_COLOR, command=lambda: runner.cancel())
+cancel_btn.pack(side=tk.RIGHT)
+profile_var = tk.StringVar()
+if profiler is not None:
+    tk.Label(root, textvariable=profile_var, anchor="w", bg=BG_COLOR, fg="#888",
+             font=("Courier", 9)).pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+    profiler.add_listener(on_span)
+    root.after(200, show_spans)
+
 # Zone d'affichage
-info_box = scrolledtext.ScrolledText(root, height=30, width=100, font=("Courier", 10),
-                                     bg=BG_COLOR, fg=FG_COLOR, insertbackground=FG_COLOR,
-                                     selectbackground=HIGHLIGHT_COLOR)
-info_box.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+listing = VirtualListView(root, font=("Courier", 10), bg=BG_COLOR, fg=FG_COLOR,
+                          selectbackground=HIGHLIGHT_COLOR)
+listing.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+
+runner = TaskRunner(root, on_progress=show_progress)
 
 root.protocol("WM_DELETE_WINDOW", on_quit)
 root.mainloop()
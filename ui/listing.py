@@ -0,0 +1,89 @@
+import tkinter as tk
+
+
+class VirtualListView(tk.Frame):
+    # Read-only listing over `count` rows produced on demand by row(i). Only
+    # the rows that fit in the window are ever inserted into the Text widget,
+    # so a table with millions of instructions costs the same as a short one.
+    def __init__(self, master, font=("Courier", 10), bg=None, fg=None, selectbackground=None, **kwargs):
+        super().__init__(master, bg=bg, **kwargs)
+        self.text = tk.Text(
+            self, wrap="none", font=font, bg=bg, fg=fg, insertbackground=fg,
+            selectbackground=selectbackground, height=30, width=100,
+        )
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.count = 0
+        self.row = None
+        self.first = 0
+
+        self.text.bind("<Configure>", lambda e: self.refresh())
+        self.text.bind("<MouseWheel>", self._on_wheel)
+        self.text.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll(3))
+        for key, delta in (("<Up>", -1), ("<Down>", 1), ("<Prior>", None), ("<Next>", None)):
+            self.text.bind(key, lambda e, d=delta, k=key: self._on_key(k, d))
+        self.text.bind("<Home>", lambda e: self.goto(0) or "break")
+        self.text.bind("<End>", lambda e: self.goto(self.count) or "break")
+
+    def set_rows(self, count, row):
+        # row(i) -> str for 0 <= i < count
+        self.count = count
+        self.row = row
+        self.first = 0
+        self.refresh()
+
+    def set_lines(self, lines):
+        lines = list(lines)
+        self.set_rows(len(lines), lines.__getitem__)
+
+    def clear(self):
+        self.set_rows(0, None)
+
+    @property
+    def visible_rows(self):
+        line_height = self.text.tk.call("font", "metrics", self.text.cget("font"), "-linespace")
+        return max(1, self.text.winfo_height() // max(1, int(line_height)))
+
+    def refresh(self):
+        rows = self.visible_rows
+        self.first = max(0, min(self.first, self.count - rows))
+        last = min(self.count, self.first + rows)
+        text = "\n".join(self.row(i) for i in range(self.first, last))
+
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+        self.text.configure(state=tk.DISABLED)
+
+        if self.count:
+            self.scrollbar.set(self.first / self.count, last / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def goto(self, index):
+        self.first = index
+        self.refresh()
+
+    def scroll(self, rows):
+        self.goto(self.first + rows)
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.goto(int(float(args[1]) * self.count))
+        elif args[0] == "scroll":
+            n = int(args[1])
+            self.scroll(n * self.visible_rows if args[2] == "pages" else n)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def _on_key(self, key, delta):
+        if delta is None:
+            delta = self.visible_rows if key == "<Next>" else -self.visible_rows
+        self.scroll(delta)
+        return "break"
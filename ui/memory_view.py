@@ -0,0 +1,141 @@
+import re
+import tkinter as tk
+
+from disassembler import disassemble
+from gdb_mi import PageCache
+from utils.helpers import hex_dump
+
+BYTES_PER_LINE = 16
+POLL_MS = 30
+# First address in a GDB value: "0x401136", "(void *) 0x7ffe...",
+# "{int (void)} 0x401136 <main>"
+_ADDRESS = re.compile(r"0x[0-9a-fA-F]+")
+
+
+class MemoryView(tk.Frame):
+    # Hex or disassembly window over live inferior memory. Reads go through
+    # a PageCache on the MI loop thread; results are picked up by an after()
+    # poll, and the view re-reads itself whenever the inferior stops.
+    def __init__(self, master, console, address=0):
+        super().__init__(master)
+        self.console = console
+        self.gdb = console.gdb
+        self.cache = PageCache(self.gdb)
+        self.address = address
+        self.mode = tk.StringVar(value="hex")
+        self._pending = None
+        self._stop_count = self.gdb.stop_count
+        self._first_sizes = []
+
+        bg, fg = "#1e1e1e", "#c8f2c8"
+        self.configure(bg=bg)
+
+        bar = tk.Frame(self, bg=bg)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 2))
+        tk.Label(bar, text="Address:", fg=fg, bg=bg).pack(side=tk.LEFT)
+        self.address_box = tk.Entry(bar, bg=bg, fg=fg, insertbackground=fg, width=24)
+        self.address_box.pack(side=tk.LEFT, padx=5)
+        self.address_box.bind("<Return>", lambda e: self.goto_entry())
+        for label, value in (("Hex", "hex"), ("Disasm", "disasm")):
+            tk.Radiobutton(bar, text=label, value=value, variable=self.mode, command=self.refresh,
+                           fg=fg, bg=bg, selectcolor="#333").pack(side=tk.LEFT)
+
+        self.text = tk.Text(self, height=32, width=90, font=("Courier", 10), bg=bg, fg=fg,
+                            wrap="none", state=tk.DISABLED)
+        self.text.pack(fill=tk.BOTH, expand=True, padx=10, pady=(2, 10))
+        self.text.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3) or "break")
+        self.text.bind("<Button-4>", lambda e: self.scroll(-3) or "break")
+        self.text.bind("<Button-5>", lambda e: self.scroll(3) or "break")
+        self.text.bind("<Prior>", lambda e: self.scroll(-self.rows) or "break")
+        self.text.bind("<Next>", lambda e: self.scroll(self.rows) or "break")
+
+        self.refresh()
+        self.after(POLL_MS, self._poll)
+
+    @property
+    def rows(self):
+        return int(self.text.cget("height"))
+
+    def goto_entry(self):
+        spec = self.address_box.get().strip()
+        try:
+            self.address = int(spec, 0)
+        except ValueError:
+            # Let GDB evaluate symbols and expressions such as $rsp+0x20
+            future = self.console.thread.submit(self.gdb.command("-data-evaluate-expression", spec))
+            self._pending = ("goto", future)
+            return
+        self.refresh()
+
+    def scroll(self, lines):
+        if self.mode.get() == "disasm" and lines > 0 and self._first_sizes:
+            # Step over whole instructions going down
+            self.address += sum(self._first_sizes[:lines])
+        else:
+            self.address = max(0, self.address + lines * BYTES_PER_LINE)
+        self.refresh()
+
+    def refresh(self):
+        # Instructions are at most 15 bytes, so rows * 15 always fills the view
+        size = self.rows * (BYTES_PER_LINE if self.mode.get() == "hex" else 15)
+        address = self.address
+        future = self.console.thread.submit(self._read(address, size))
+        self._pending = ("read", future, address)
+
+    async def _read(self, address, size):
+        data = await self.cache.read(address, size)
+        self.cache.prefetch(address, size)
+        return data
+
+    def _poll(self):
+        if not self.winfo_exists():
+            return
+        try:
+            self._check_pending()
+            if self.gdb.stop_count != self._stop_count:
+                self._stop_count = self.gdb.stop_count
+                self.refresh()
+        finally:
+            self.after(POLL_MS, self._poll)
+
+    def _check_pending(self):
+        pending = self._pending
+        if pending is None or not pending[1].done():
+            return
+        self._pending = None
+        try:
+            result = pending[1].result()
+        except Exception as e:
+            self._show(f"[!] {e}")
+            return
+        if pending[0] == "goto":
+            value = result.get("value", "")
+            found = _ADDRESS.search(value)
+            if found is None:
+                self._show(f"[!] Not an address: {value}")
+                return
+            self.address = int(found.group(), 16)
+            self.refresh()
+        elif pending[2] == self.address:
+            self._render(pending[2], result)
+
+    def _render(self, address, data):
+        if not data:
+            self._show(f"Cannot access memory at 0x{address:x}")
+            return
+        if self.mode.get() == "hex":
+            self._show(hex_dump(data[:self.rows * BYTES_PER_LINE], base=address))
+            return
+        table = disassemble(bytearray(data), address)
+        rows = list(table.rows())[:self.rows]
+        self._first_sizes = [size for _, size, _, _ in rows]
+        self._show("\n".join(
+            f"0x{addr:x}:  {bytes(data[addr - address:addr - address + size]).hex(' '):<30}  {mnemonic} {op_str}"
+            for addr, size, mnemonic, op_str in rows
+        ))
+
+    def _show(self, text):
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+        self.text.configure(state=tk.DISABLED)
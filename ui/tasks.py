@@ -0,0 +1,106 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Task:
+    # Handle passed to background work for progress reporting and cancellation
+    def __init__(self, runner, label):
+        self.runner = runner
+        self.label = label
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def report(self, done, total=None):
+        # Safe from any thread; also the cancellation point of long loops
+        self.check()
+        self.runner._events.put(("progress", self, (done, total)))
+
+
+class TaskRunner:
+    # Runs analysis off the Tk thread. Workers never touch widgets: results,
+    # errors and progress go through a queue drained by an after() loop.
+    def __init__(self, root, on_progress=None, poll_ms=50, workers=1):
+        self.root = root
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self.current = None
+        self._events = queue.Queue()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="chihiro-task")
+        self._callbacks = {}
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, label, work, on_done, on_error=None):
+        # work(task) runs in the background; on_done(result) on the Tk thread.
+        # A new task cancels the previous one, whose result is then dropped.
+        if self.current is not None:
+            self.current.cancel()
+        task = self.current = Task(self, label)
+        self._callbacks[task] = (on_done, on_error)
+        self._executor.submit(self._run, task, work)
+        self._progress(task, None)
+        return task
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _run(self, task, work):
+        try:
+            task.check()
+            self._events.put(("done", task, work(task)))
+        except Cancelled:
+            self._events.put(("cancelled", task, None))
+        except Exception as e:
+            self._events.put(("error", task, e))
+
+    def _poll(self):
+        # Only the newest progress event per task matters
+        latest = {}
+        try:
+            while True:
+                kind, task, value = self._events.get_nowait()
+                if kind == "progress":
+                    latest[task] = value
+                    continue
+                latest.pop(task, None)
+                self._finish(kind, task, value)
+        except queue.Empty:
+            pass
+        for task, value in latest.items():
+            if task is self.current:
+                self._progress(task, value)
+        self.root.after(self.poll_ms, self._poll)
+
+    def _finish(self, kind, task, value):
+        on_done, on_error = self._callbacks.pop(task, (None, None))
+        if task is not self.current:
+            return
+        self.current = None
+        self._progress(None, None)
+        if kind == "done":
+            on_done(value)
+        elif kind == "error" and on_error is not None:
+            on_error(value)
+
+    def _progress(self, task, value):
+        if self.on_progress is not None:
+            self.on_progress(task, value)
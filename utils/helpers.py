@@ -1,8 +1,51 @@
-def hex_dump(data, length=16):
-    lines = []
-    for i in range(0, len(data), length):
-        chunk = data[i:i+length]
-        hex_bytes = ' '.join(f"{b:02x}" for b in chunk)
-        ascii_str = ''.join(chr(b) if 32 <= b < 127 else '.' for b in chunk)
-        lines.append(f"{i:08x}  {hex_bytes:<48}  {ascii_str}")
-    return '\n'.join(lines)
+import sys
+
+HEX_BLOCK_SIZE = 64 << 10
+
+_PRINTABLE = bytes(b if 32 <= b < 127 else ord('.') for b in range(256))
+
+
+def iter_hex_dump(data, base=0, length=16, collapse=False, block_size=HEX_BLOCK_SIZE):
+    # Yields the dump as text blocks of whole lines. Each block is formatted
+    # with bulk bytes.hex()/bytes.translate() calls instead of per-byte work.
+    view = memoryview(data)
+    block_size -= block_size % length
+    width = length * 3
+    previous = None
+    skipping = False
+    last_line = None
+
+    for start in range(0, len(view), block_size):
+        block = bytes(view[start:start + block_size])
+        text = block.translate(_PRINTABLE).decode('ascii')
+        lines = []
+        for i in range(0, len(block), length):
+            chunk = block[i:i + length]
+            if collapse and chunk == previous and len(chunk) == length:
+                if not skipping:
+                    lines.append("*")
+                    skipping = True
+                last_line = (base + start + i, chunk, text[i:i + length])
+                continue
+            previous = chunk
+            skipping = False
+            last_line = None
+            lines.append(f"{base + start + i:08x}  {chunk.hex(' '):<{width}}  {text[i:i + length]}")
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    if last_line is not None:
+        # Like hexdump, show the final line of a collapsed run so the end is visible
+        addr, chunk, ascii_str = last_line
+        yield f"{addr:08x}  {chunk.hex(' '):<{width}}  {ascii_str}\n"
+
+
+def write_hex_dump(data, out=None, base=0, length=16, collapse=True):
+    out = out or sys.stdout
+    for block in iter_hex_dump(data, base, length, collapse):
+        out.write(block)
+    out.flush()
+
+
+def hex_dump(data, length=16, base=0, collapse=False):
+    return "".join(iter_hex_dump(data, base, length, collapse)).rstrip("\n")
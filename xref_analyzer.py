@@ -1,6 +1,152 @@
+import bisect
+import re
+from array import array
+
+from capstone import CS_AC_WRITE, CS_GRP_CALL, CS_GRP_JUMP
+from capstone.x86 import X86_INS_LEA, X86_OP_MEM
+
+from disassembler import decode_detailed
+from profiling import span
+
+# REF_ADDR: the address is taken as a value (lea, or an immediate such as
+# `mov edi, 0x402010`) without the instruction touching memory there
+REF_CALL, REF_JUMP, REF_READ, REF_WRITE, REF_ADDR = range(5)
+REF_NAMES = ("call", "jump", "read", "write", "addr")
+
+
+_HEX_TOKEN = re.compile(r"0x[0-9a-f]+")
+_RIP_OPERAND = re.compile(r"\[rip ([+-]) (0x[0-9a-f]+)\]")
+_ABS_OPERAND = re.compile(r"\[(0x[0-9a-f]+)\]")
+_IMM_OPERAND = re.compile(r"0x[0-9a-f]+$")
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+class XrefIndex:
+    def __init__(self, targets=None, sites=None, kinds=None):
+        # Three parallel columns sorted by target address
+        self.targets = targets if targets is not None else array('Q')
+        self.sites = sites if sites is not None else array('Q')
+        self.kinds = kinds if kinds is not None else array('B')
+
+    @classmethod
+    def build(cls, instructions, code, addr, ranges=None):
+        with span("xref_index", instructions=len(instructions)) as s:
+            index = cls._build(instructions, code, addr, ranges)
+            s.count(xrefs=len(index))
+        return index
+
+    @classmethod
+    def _build(cls, instructions, code, addr, ranges):
+        starts = [r[0] for r in ranges] if ranges else None
+
+        def mapped(value):
+            if starts is None:
+                return True
+            i = bisect.bisect_right(starts, value) - 1
+            return i >= 0 and value < ranges[i][1]
+
+        # Branch kind and memory-operand access only depend on the opcode form,
+        # so Capstone's operand details are decoded once per (mnemonic, memory
+        # operand position) and reused for every other instruction of that form.
+        forms = {}
+
+        def form_of(i, mnemonic_id, mem_pos):
+            key = (mnemonic_id, mem_pos)
+            info = forms.get(key)
+            if info is None:
+                insn = decode_detailed(code, addr, addresses[i], sizes[i])
+                branch, access = None, 0
+                if insn is not None:
+                    if insn.group(CS_GRP_CALL):
+                        branch = REF_CALL
+                    elif insn.group(CS_GRP_JUMP):
+                        branch = REF_JUMP
+                    mems = [op for op in insn.operands if op.type == X86_OP_MEM]
+                    if mems:
+                        access = mems[0].access
+                if insn is not None and insn.id == X86_INS_LEA:
+                    kind = REF_ADDR
+                else:
+                    kind = REF_WRITE if access & CS_AC_WRITE else REF_READ
+                info = forms[key] = (branch, kind)
+            return info
+
+        addresses = instructions.addresses
+        sizes = instructions.sizes
+        mnemonic_ids = instructions.mnemonic_ids
+        refs = []
+        add = refs.append
+
+        for i, op_str in enumerate(instructions.op_strs):
+            if "0x" not in op_str:
+                continue
+            operands = op_str.split(", ")
+            for pos, operand in enumerate(operands):
+                if "[" in operand:
+                    rip = _RIP_OPERAND.search(operand)
+                    if rip:
+                        disp = int(rip.group(2), 16)
+                        value = (addresses[i] + sizes[i] + (disp if rip.group(1) == "+" else -disp)) & _MASK64
+                    else:
+                        absolute = _ABS_OPERAND.search(operand)
+                        if not absolute:
+                            continue
+                        value = int(absolute.group(1), 16)
+                        if not mapped(value):
+                            continue
+                    branch, kind = form_of(i, mnemonic_ids[i], pos)
+                    add((value, addresses[i], kind))
+                    if branch is not None:
+                        # call/jmp qword ptr [slot]: reads the slot to branch
+                        # through it
+                        add((value, addresses[i], branch))
+                elif _IMM_OPERAND.match(operand):
+                    value = int(operand, 16)
+                    branch = form_of(i, mnemonic_ids[i], -1)[0]
+                    if branch is not None:
+                        add((value, addresses[i], branch))
+                    elif mapped(value):
+                        add((value, addresses[i], REF_ADDR))
+
+        refs.sort()
+        index = cls()
+        index.targets.extend(r[0] for r in refs)
+        index.sites.extend(r[1] for r in refs)
+        index.kinds.extend(r[2] for r in refs)
+        return index
+
+    def __len__(self):
+        return len(self.targets)
+
+    def refs_to(self, target):
+        lo = bisect.bisect_left(self.targets, target)
+        hi = bisect.bisect_right(self.targets, target, lo)
+        return [(self.sites[i], self.kinds[i]) for i in range(lo, hi)]
+
+    def lookup_many(self, targets):
+        return {target: self.refs_to(target) for target in targets}
+
+    def refs_in_range(self, start, end):
+        lo = bisect.bisect_left(self.targets, start)
+        hi = bisect.bisect_left(self.targets, end, lo)
+        return [(self.targets[i], self.sites[i], self.kinds[i]) for i in range(lo, hi)]
+
+
 def find_xrefs(instructions, target_addr):
+    # Textual fallback for an InstructionTable when the code bytes are not at
+    # hand; matches whole operands only and resolves [rip + disp].
     xrefs = []
-    for instr in instructions:
-        if str(hex(target_addr)) in instr['op_str']:
-            xrefs.append(instr['address'])
+    for address, size, op_str in zip(instructions.addresses, instructions.sizes, instructions.op_strs):
+        if "0x" not in op_str:
+            continue
+        rip = _RIP_OPERAND.search(op_str)
+        if rip:
+            disp = int(rip.group(2), 16)
+            if address + size + (disp if rip.group(1) == "+" else -disp) == target_addr:
+                xrefs.append(address)
+                continue
+            op_str = op_str[:rip.start()] + op_str[rip.end():]
+        if any(int(token, 16) == target_addr for token in _HEX_TOKEN.findall(op_str)):
+            xrefs.append(address)
     return xrefs